@@ -9,6 +9,7 @@
 # separated files
 from utils import * # Import all modules, packages and global variables
 from scripts import * # Import all classes
+record_startup_step('import scripts')
 
 ###############################################################################
 
@@ -69,11 +70,16 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.called = False
     self.called_onLoadSegmentation = False
 
-    # Create a temp file that serves as a flag to determine if output folder
-    # has been selected or not.
-    ConfigPath.create_temp_file()
-    Debug.print(self, '*** temp file created. BE CAREFUL! ***')
+    # The initial configuration file is used until an output folder is
+    # selected.
+    ConfigPath.reset_output_folder_selection()
     self.config_yaml = ConfigPath.open_project_config_file()
+    # Content of the configuration file in use, as written (self.config_yaml
+    # is modified while working, e.g. HU bounds).
+    self.config_file_content = copy.deepcopy(self.config_yaml)
+    # Both follow the changes of the configuration file in use (edited, or
+    # output folder selected) instead of reading it again.
+    ConfigCache.subscribe(self.on_config_file_changed)
     self.DefaultDir = ConfigPath.DEFAULT_VOLUMES_DIRECTORY
 
 
@@ -86,6 +92,7 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     """
     Called when the user opens the module the first time and the widget is initialized.
     """
+    setup_start = time.perf_counter()
     ### Segment editor widget
     self.layout.setContentsMargins(4, 0, 4, 0)
 
@@ -117,6 +124,51 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.saved_selected = False # Flag to load correctly the first case
     self.currentOutputPath = None
     self.currentVolumeFilename = None
+    # Path of the current case relative to the volumes (and output) folder,
+    # without extension (cases may have the same filename in different
+    # subfolders).
+    self.currentCaseRelativePath = None
+    self.WorkFiles = None
+    self.VolumeFolderScanner = None
+    self.volumesFolderScanThread = None
+    self.scannedCasesPaths = deque()
+    self.volumesFolderScanTimer = qt.QTimer()
+    self.volumesFolderScanTimer.setInterval(200)
+    self.volumesFolderScanTimer.timeout.connect(self.add_scanned_cases)
+    # Header information of the cases (sizes, modality...), read in
+    # background.
+    self.VolumeHeaderIndex = VolumeHeaderIndex()
+    self.volumeHeaderIndexThread = None
+    self.indexedCasesPaths = deque()
+    self.volumeHeaderIndexTimer = qt.QTimer()
+    self.volumeHeaderIndexTimer.setInterval(500)
+    self.volumeHeaderIndexTimer.timeout.connect(self.update_case_headers)
+    self.CasePrefetcher = None
+    # Progressive loading: full resolution volume read in background while
+    # its preview is displayed.
+    self.fullResolutionReadThread = None
+    self.fullResolutionVolumes = deque()
+    self.fullResolutionReadStart = None
+    self.fullResolutionTimer = qt.QTimer()
+    self.fullResolutionTimer.setInterval(100)
+    self.fullResolutionTimer.timeout.connect(self.swap_full_resolution_volume)
+    self.SaveQueue = None
+    self.CaseStatusIndex = None
+    self.saveQueueCompletedCount = 0
+    self.saveQueueTimer = qt.QTimer()
+    self.saveQueueTimer.setInterval(500)
+    self.saveQueueTimer.timeout.connect(self.update_save_queue_status)
+    # Durations of the main phases (shown in the Latency metrics panel).
+    self.LatencyMetrics = LatencyMetrics()
+    self.latencyMetricsTimer = qt.QTimer()
+    self.latencyMetricsTimer.setInterval(1000)
+    self.latencyMetricsTimer.timeout.connect(self.update_latency_metrics)
+    self.latencyMetricsTimer.start()
+    # Nodes kept from case to case in scene recycling mode.
+    self.VolumeNode = None
+    self.segmentationNode = None
+    self.recycledCasePath = None
+    self.observedSegmentationDisplayNode = None
     # Define colors to be used in the application
     self.color_active = "yellowgreen"
     self.color_inactive = "indianred"
@@ -132,7 +184,25 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.ui.PauseTimerButton.setText('Pause')
     self.ui.SelectVolumeFolder.connect('clicked(bool)', self.onSelectVolumesFolderButton)
     self.ui.EditConfiguration.connect('clicked(bool)', self.onEditConfiguration)
+    # The case list is a view on a model (rows are created on demand) with
+    # proxy models to filter the cases by modality, then to filter them by
+    # name and sort them.
+    self.CaseListModel = CaseListModel(self.foreground)
+    self.caseListModalityProxyModel = qt.QSortFilterProxyModel()
+    self.caseListModalityProxyModel.setSourceModel(self.CaseListModel)
+    self.caseListModalityProxyModel.setFilterRole(CASE_MODALITY_ROLE)
+    self.caseListProxyModel = qt.QSortFilterProxyModel()
+    self.caseListProxyModel.setSourceModel(self.caseListModalityProxyModel)
+    self.caseListProxyModel.setFilterCaseSensitivity(qt.Qt.CaseInsensitive)
+    self.ui.SlicerDirectoryListView.setModel(self.caseListProxyModel)
+    self.ui.CaseListSortOrder.addItems(list(CASE_LIST_SORT_ORDERS))
+    self.ui.CaseListModalityFilter.addItem(CASE_LIST_ALL_MODALITIES)
+    self.ui.CaseListModalityFilter.setVisible(False)
+    self.ui.CaseListSortOrder.currentIndexChanged.connect(self.onCaseListSortOrderChanged)
+    self.ui.CaseListModalityFilter.currentIndexChanged.connect(self.onCaseListModalityFilterChanged)
     self.ui.SlicerDirectoryListView.clicked.connect(self.getCurrentTableItem)
+    self.ui.CaseListFilter.textChanged.connect(self.onCaseListFilterChanged)
+    self.ui.CaseListFilter.returnPressed.connect(self.onCaseListFilterReturnPressed)
     self.ui.SaveSegmentationButton.connect('clicked(bool)', self.onSaveSegmentationButton)
     self.ui.SelectOutputFolder.connect('clicked(bool)', self.onSelectOutputFolder)
     self.ui.LoadSegmentation.connect('clicked(bool)', self.onLoadSegmentation)
@@ -163,6 +233,10 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.ui.pushButton_undo.connect('clicked(bool)', self.onPushButton_undo)
     self.ui.ShowSegmentVersionLegendButton.connect('clicked(bool)', self.onPush_ShowSegmentVersionLegendButton)
     self.ui.placeMeasurementLine.connect('clicked(bool)', self.onPlacePointsAndConnect)
+    self.ui.NormalizeSegmentationDtypesButton.connect('clicked(bool)', self.onNormalizeSegmentationDtypes)
+    self.ui.ExportSegmentationInformationButton.connect('clicked(bool)', self.onExportSegmentationInformation)
+    self.ui.RetryFailedSavesButton.connect('clicked(bool)', self.onRetryFailedSaves)
+    self.ui.LatencyMetricsCollapsibleButton.connect('contentsCollapsed(bool)', self.onLatencyMetricsCollapsed)
     
     self.ui.ShowSegmentVersionLegendButton.setVisible(False)
 
@@ -176,6 +250,9 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.ui.LoadClassification.setEnabled(False)
     self.ui.SaveClassificationButton.setEnabled(False)
     self.ui.LoadSegmentation.setEnabled(False)
+    self.ui.NormalizeSegmentationDtypesButton.setEnabled(False)
+    self.ui.ExportSegmentationInformationButton.setEnabled(False)
+    self.ui.RetryFailedSavesButton.setVisible(False)
 
     self.ui.ThresholdLabel.setStyleSheet("font-weight: bold")
 
@@ -199,6 +276,18 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     
     self.MostRecentPausedCasePath = ""
 
+    record_startup_step('widget setup', start=setup_start)
+    self.report_startup_times()
+
+  def report_startup_times(self):
+    """
+    Print the duration of the startup steps and add them to the latency
+    metrics.
+    """
+    print(format_startup_times())
+    for name, duration in STARTUP_TIMES.items():
+        self.LatencyMetrics.add(f'startup/{name}', duration)
+
   @enter_function
   def visibilityModifiedCallback(self, caller, event):
       """
@@ -235,6 +324,17 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
       self.ui.pushButton_ToggleVisibility.setChecked(toggle_to_set)
 
+  def on_config_file_changed(self, path, content):
+    """
+    Called by ConfigCache when the content of a configuration file has
+    changed, or when another configuration file is used.
+    """
+    if path == ConfigPath.get_config_file_path():
+        self.config_file_content = content
+        # Updated first by ConfigPath (subscribed before), and written by
+        # ConfigPath.write_config_file.
+        self.config_yaml = ConfigPath.config_yaml
+
   def setup_configuration(self):
     self.config_yaml = ConfigPath.open_project_config_file()
     # Warning: if incorrect config values that have been changed create
@@ -452,6 +552,9 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
   
   #measurement line function set as a segment and paint functionality
   def enableSegmentAndPaintButtons(self):
+    # No editing on the preview of a volume (progressive loading).
+    if self.is_full_resolution_pending():
+        return
     self.ui.pushButton_Paint.setEnabled(True)
     self.ui.LassoPaintButton.setEnabled(True)
     self.ui.pushButton_Erase.setEnabled(True)
@@ -474,9 +577,6 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
                   f'value of UserPath.get_selected_existing_folder: '
                   f'{UserPath.get_selected_existing_folder(self)}')
 
-      self.config_yaml = ConfigPath.open_project_config_file()
-      self.config_yaml = ConfigPath.set_config_values(self.config_yaml)
-
       if UserPath.get_selected_existing_folder(self):
           content = UserPath.get_selected_paths(self)
           for element in content:
@@ -501,28 +601,17 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       if file_structure_valid == False:
           return # don't load any patient cases
 
-      self.CasesPaths = sorted(glob(f'{self.CurrentFolder}{os.sep}**{os.sep}{ConfigPath.INPUT_FILE_EXTENSION}', recursive = True))
+      if self.outputFolder is None:
+          # New project: cases are shown as soon as the scan finds them.
+          self.start_volumes_folder_scan()
+          return
 
-      # Remove the volumes in the folder 'derivatives' (creates issues for
-      # loading cases)
-      self.CasesPaths = [item for item in self.CasesPaths if 'derivatives' not
-                         in item]
+      self.set_cases_paths(self.scan_volumes_folder(rescan=True))
 
       if not self.CasesPaths:
-          message = ('No files found in the selected directory!'
-                     f'\n\nCurrent file extension configuration: '
-                     f'{ConfigPath.INPUT_FILE_EXTENSION}'
-                     "\n\nMake sure the configured extension is "
-                     "in the right format."
-                     "\n\nFor example: check configuration_config.yml file in "
-                     "SlicerCART project or in output folder under _conf "
-                     "folder."
-                     "\n\nThen restart the module.")
-          Dev.show_message_box(self, message, box_title='ATTENTION!')
+          self.show_no_files_found_message()
           return
 
-      self.Cases = sorted([os.path.split(i)[-1] for i in self.CasesPaths])
-
       self.reset_ui()
 
       self.ui.pushButton_Interpolate.setEnabled(True)
@@ -534,10 +623,264 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
                                      self.CurrentFolder)
           self.manage_workflow_and_classification()
 
+  def show_duplicate_filenames_message(self, duplicate_filenames):
+      """
+      Warn that some volumes have the same filename: working and remaining
+      lists identify cases by filename, so these volumes are told apart by
+      their order only.
+      """
+      print('Volumes with the same filename:', duplicate_filenames)
+
+      duplicates = [f'{filename}:\n' + '\n'.join(paths)
+                    for filename, paths in duplicate_filenames.items()]
+      # Limit to 10 filenames the displayed pop-up.
+      listed = '\n\n'.join(duplicates[:10])
+      if len(duplicates) > 10:
+          listed += '\n\n...'
+
+      message = ('Several volumes have the same filename. Cases are '
+                 'identified by filename in the working and remaining lists, '
+                 'so these volumes are matched in the order of their paths.'
+                 f'\n\nPlease double check:\n\n{listed}')
+      Dev.show_message_box(self, message, box_title='ATTENTION!')
+
+  def show_no_files_found_message(self):
+      message = ('No files found in the selected directory!'
+                 f'\n\nCurrent file extension configuration: '
+                 f'{ConfigPath.INPUT_FILE_EXTENSION}'
+                 "\n\nMake sure the configured extension is "
+                 "in the right format."
+                 "\n\nFor example: check configuration_config.yml file in "
+                 "SlicerCART project or in output folder under _conf "
+                 "folder."
+                 "\n\nThen restart the module.")
+      Dev.show_message_box(self, message, box_title='ATTENTION!')
+
+  def get_case_sort_key(self, path):
+      # Cases are sorted by filename (then by path for identical filenames).
+      return os.path.split(path)[-1], path
+
+  def set_cases_paths(self, cases_paths):
+      """
+      Set the cases of the volumes folder, sorted by filename. self.Cases
+      and self.CasesPaths are kept in the same order.
+      """
+      self.CasesPaths = sorted(cases_paths, key=self.get_case_sort_key)
+      self.Cases = [os.path.split(path)[-1] for path in self.CasesPaths]
+
+  @enter_function
+  def scan_volumes_folder(self, rescan=False):
+      """
+      Get the volumes of the volumes folder. The result of a scan is shared
+      by the case list and WorkFiles, and the manifest of the scan is kept in
+      the output folder (when selected) so the next scan only lists the
+      directories that changed.
+      :param rescan: if True, scan again even if the volumes folder has
+      already been scanned.
+      :return: sorted list of volume paths.
+      """
+      # A scan running in background is used once finished.
+      self.wait_for_volumes_folder_scan()
+
+      if (rescan or self.VolumeFolderScanner is None
+              or self.VolumeFolderScanner.cases_paths is None
+              or self.VolumeFolderScanner.volumes_folder != self.CurrentFolder
+              or self.VolumeFolderScanner.pattern
+              != ConfigPath.INPUT_FILE_EXTENSION):
+          scanner = VolumeFolderScanner(self.CurrentFolder,
+                                        ConfigPath.INPUT_FILE_EXTENSION)
+          if self.outputFolder is not None:
+              scanner.load_manifest(self.outputFolder)
+          scanner.scan(max_workers=ConfigPath.SCAN_THREADS,
+                       excluded_folder_names=ConfigPath.EXCLUDED_FOLDER_NAMES)
+          self.VolumeFolderScanner = scanner
+
+      if self.outputFolder is not None:
+          self.VolumeFolderScanner.save_manifest(self.outputFolder)
+      return list(self.VolumeFolderScanner.cases_paths)
+
+  @enter_function
+  def start_volumes_folder_scan(self):
+      """
+      Scan the volumes folder in a background thread. The cases found are
+      added to the case list periodically (see add_scanned_cases), so the
+      first case can be annotated before the end of the scan.
+      """
+      self.stop_volumes_folder_scan()
+      self.stop_volume_header_index()
+
+      self.VolumeFolderScanner = VolumeFolderScanner(
+          self.CurrentFolder, ConfigPath.INPUT_FILE_EXTENSION)
+      self.CasesPaths = []
+      self.Cases = []
+      self.scannedCasesPaths = deque()
+
+      self.volumesFolderScanThread = threading.Thread(
+          target=self.VolumeFolderScanner.scan,
+          kwargs={'max_workers': ConfigPath.SCAN_THREADS,
+                  'excluded_folder_names': ConfigPath.EXCLUDED_FOLDER_NAMES,
+                  'on_paths_found': self.scannedCasesPaths.extend},
+          name='SlicerCARTVolumeFolderScan',
+          daemon=True)
+      self.volumesFolderScanThread.start()
+      self.volumesFolderScanTimer.start()
+
+  def add_scanned_cases(self):
+      """
+      Add to the case list the cases found by the background scan since the
+      last call. Called periodically by volumesFolderScanTimer.
+      """
+      if self.volumesFolderScanThread is None:
+          self.volumesFolderScanTimer.stop()
+          return
+
+      # Checked before reading the found cases: once the thread is finished,
+      # all its cases are in scannedCasesPaths.
+      is_scan_finished = not self.volumesFolderScanThread.is_alive()
+
+      new_paths = []
+      while self.scannedCasesPaths:
+          new_paths.append(self.scannedCasesPaths.popleft())
+
+      if new_paths:
+          is_first_batch = not self.CasesPaths
+          self.set_cases_paths(self.CasesPaths + new_paths)
+          if is_first_batch:
+              self.reset_ui()
+              self.ui.pushButton_Interpolate.setEnabled(True)
+          else:
+              self.CaseListModel.set_cases(self.Cases)
+              self.show_case_headers()
+              self.currentCase_index = self.CasesPaths.index(
+                  self.currentCasePath)
+              self.updateCurrentPatient()
+              self.select_case_in_list(self.currentCase_index)
+
+      if is_scan_finished:
+          self.volumesFolderScanTimer.stop()
+          self.volumesFolderScanThread = None
+          if not self.CasesPaths:
+              self.show_no_files_found_message()
+          else:
+              self.start_volume_header_index()
+
+  def wait_for_volumes_folder_scan(self):
+      """
+      Wait for the end of a background scan and add its last cases.
+      """
+      if self.volumesFolderScanThread is not None:
+          self.volumesFolderScanThread.join()
+          self.add_scanned_cases()
+
+  def stop_volumes_folder_scan(self):
+      """
+      Stop a background scan (e.g. another volumes folder is selected). Its
+      results are discarded.
+      """
+      if self.volumesFolderScanThread is not None:
+          self.VolumeFolderScanner.stop()
+          self.volumesFolderScanTimer.stop()
+          self.volumesFolderScanThread = None
+
+  @enter_function
+  def start_volume_header_index(self):
+      """
+      Read the headers of the cases in a background thread (see
+      VolumeHeaderIndex). The case list is updated periodically with the
+      headers read (see update_case_headers), and the index is saved in the
+      output folder (if selected) once all headers are read.
+      """
+      self.stop_volume_header_index()
+      if self.outputFolder is not None:
+          self.VolumeHeaderIndex.load(self.outputFolder)
+      self.show_case_headers()
+
+      self.indexedCasesPaths = deque()
+      self.volumeHeaderIndexThread = threading.Thread(
+          target=self.VolumeHeaderIndex.index,
+          args=(list(self.CasesPaths),),
+          kwargs={'max_workers': ConfigPath.SCAN_THREADS,
+                  'on_headers_read': self.indexedCasesPaths.extend},
+          name='SlicerCARTVolumeHeaderIndex',
+          daemon=True)
+      self.volumeHeaderIndexThread.start()
+      self.volumeHeaderIndexTimer.start()
+
+  def update_case_headers(self):
+      """
+      Show in the case list the headers read since the last call. Called
+      periodically by volumeHeaderIndexTimer.
+      """
+      if self.volumeHeaderIndexThread is None:
+          self.volumeHeaderIndexTimer.stop()
+          return
+
+      # Checked before reading the indexed cases: once the thread is
+      # finished, all its cases are in indexedCasesPaths.
+      is_index_finished = not self.volumeHeaderIndexThread.is_alive()
+
+      is_updated = bool(self.indexedCasesPaths)
+      self.indexedCasesPaths.clear()
+      if is_updated:
+          self.show_case_headers()
+
+      if is_index_finished:
+          self.volumeHeaderIndexTimer.stop()
+          self.volumeHeaderIndexThread = None
+          if self.outputFolder is not None:
+              self.VolumeHeaderIndex.save(self.outputFolder)
+          if self.CasePrefetcher is not None:
+              # Sizes of the next cases are now known.
+              self.schedule_prefetch()
+
+  def stop_volume_header_index(self):
+      """
+      Stop a background indexing (e.g. the case list is replaced). The
+      headers already read are kept.
+      """
+      if self.volumeHeaderIndexThread is not None:
+          self.VolumeHeaderIndex.stop()
+          self.volumeHeaderIndexTimer.stop()
+          # Waited for so the next indexing is not stopped.
+          self.volumeHeaderIndexThread.join()
+          self.volumeHeaderIndexThread = None
+
+  def show_case_headers(self):
+      """
+      Give the headers of the cases to the case list (tooltips, sorting and
+      modality filter).
+      """
+      self.CaseListModel.set_headers(
+          [self.VolumeHeaderIndex.get(path) for path in self.CasesPaths],
+          [self.VolumeHeaderIndex.describe(path)
+           for path in self.CasesPaths])
+
+      modalities = self.VolumeHeaderIndex.get_modalities(self.CasesPaths)
+      items = [CASE_LIST_ALL_MODALITIES] + modalities
+      modality_filter = self.ui.CaseListModalityFilter
+      if [modality_filter.itemText(i)
+              for i in range(modality_filter.count)] == items:
+          return
+
+      current_modality = modality_filter.currentText
+      was_blocked = modality_filter.blockSignals(True)
+      modality_filter.clear()
+      modality_filter.addItems(items)
+      if current_modality in items:
+          modality_filter.setCurrentIndex(items.index(current_modality))
+      modality_filter.blockSignals(was_blocked)
+      modality_filter.setVisible(bool(modalities))
+      self.onCaseListModalityFilterChanged(modality_filter.currentIndex)
+
   @enter_function
   def reset_ui(self):
-      self.ui.SlicerDirectoryListView.clear()
-      self.ui.SlicerDirectoryListView.addItems(self.Cases)
+      self.ui.CaseListFilter.clear()
+      self.CaseListModel.set_cases(self.Cases)
+      if self.volumesFolderScanThread is None:
+          self.start_volume_header_index()
+      else:
+          # Cases are indexed at the end of the scan.
+          self.show_case_headers()
 
       self.currentCase_index = 0 # THIS IS THE CENTRAL THING THAT HELPS FOR CASE NAVIGATION
       self.update_ui()
@@ -553,8 +896,7 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       Set the patient to be displayed in UI case list and Slicer Viewer from
       filename.
       """
-      index = self.WorkFiles.find_index_from_filename(filename,
-                                              self.Cases)
+      index = self.WorkFiles.get_working_list_index(filename)
       currentCasePath = self.WorkFiles.find_path_from_filename(filename)
 
       self.currentCase = filename
@@ -562,15 +904,19 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       self.currentCasePath = currentCasePath
 
   @enter_function
+  @measure_latency('manage_workflow')
   def manage_workflow(self):
       """
       Allows to work from appropriate working list and remaining list.
       """
 
-      self.config_yaml = ConfigPath.open_project_config_file()
       # Instantiate a WorkFiles class object to facilitate cases lists
       # management.
-      self.WorkFiles = WorkFiles(self.CurrentFolder, self.outputFolder)
+      with self.LatencyMetrics.measure('manage_workflow/scan_volumes_folder'):
+          cases_paths = self.scan_volumes_folder()
+      with self.LatencyMetrics.measure('manage_workflow/work_files'):
+          self.WorkFiles = WorkFiles(self.CurrentFolder, self.outputFolder,
+                                     cases_paths)
 
       # Set up working list appropriateness compared to volumes folder selected.
       if self.WorkFiles.check_working_list() == False:
@@ -590,10 +936,15 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
           Dev.show_message_box(self, message)
           return
 
+      if self.WorkFiles.duplicate_filenames:
+          self.show_duplicate_filenames_message(
+              self.WorkFiles.duplicate_filenames)
+
       # Re-assignation of self.Cases and self.CasesPath based on working list.
       self.Cases = self.WorkFiles.get_working_list_filenames(self)
       self.CasesPaths = self.WorkFiles.get_working_list_filepaths(self.Cases)
-      self.reset_ui()
+      with self.LatencyMetrics.measure('manage_workflow/reset_ui'):
+          self.reset_ui()
 
       # Get the first case of remaining list (considers if empty).
       remaining_list_filenames = (
@@ -615,32 +966,42 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
       self.update_ui()
 
+  @enter_function
   def validateBIDS(self, path):
-        validator = BIDSValidator()
-        is_structure_valid = True
-        class InvalidBIDS(Exception): pass
+        """
+        Check that all volumes of the volumes folder follow the BIDS format
+        (see BidsValidation). The invalid volumes are all reported.
+        :return: True if the file hierarchy is valid.
+        """
+        validation = BidsValidation(path, ConfigPath.INPUT_FILE_EXTENSION)
+        if self.outputFolder is not None:
+            validation.load_cache(self.outputFolder)
 
-        try:
-            for subdir, dirs, files in os.walk(path):
-                for file in files:
-                    if file.endswith(ConfigPath.INPUT_FILE_EXTENSION.split("*")[1]):
-                        try:
-                            path = "/sub" + (subdir + "/" + file).split("/sub", 1)[1]
-                            is_valid = validator.is_bids(path)
-                        except:
-                            raise InvalidBIDS
+        invalid_paths = validation.validate()
+
+        if self.outputFolder is not None:
+            validation.save_cache(self.outputFolder)
 
-                        if is_valid == False:
-                            raise InvalidBIDS
-        except InvalidBIDS:
-            msg_box = qt.QMessageBox()
-            msg_box.setWindowTitle("BIDS Validation")
-            msg_box.setText("File hierarchy not in proper BIDS format. \n\nInformation : https://bids.neuroimaging.io \n\nTool : https://bids-standard.github.io/bids-validator")
-            msg_box.exec()
+        if not invalid_paths:
+            return True
 
-            is_structure_valid = False
+        print('Volumes not in BIDS format:', invalid_paths)
 
-        return is_structure_valid
+        # Limit to 20 the volumes listed in the message (all are in details).
+        listed_paths = '\n'.join(invalid_paths[:20])
+        if len(invalid_paths) > 20:
+            listed_paths += f'\n... and {len(invalid_paths) - 20} more'
+
+        msg_box = qt.QMessageBox()
+        msg_box.setWindowTitle("BIDS Validation")
+        msg_box.setText("File hierarchy not in proper BIDS format. \n\nInformation : https://bids.neuroimaging.io \n\nTool : https://bids-standard.github.io/bids-validator")
+        msg_box.setInformativeText(
+            f'{len(invalid_paths)} volume(s) not in BIDS format:\n\n'
+            f'{listed_paths}')
+        msg_box.setDetailedText('\n'.join(invalid_paths))
+        msg_box.exec()
+
+        return False
 
   @enter_function
   def updateCaseAll(self):
@@ -653,19 +1014,93 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
       self.updateCurrentPatient()
       # Highlight the current case in the list view (when pressing on next o)
-      self.ui.SlicerDirectoryListView.setCurrentItem(
-          self.ui.SlicerDirectoryListView.item(self.currentCase_index))
+      self.select_case_in_list(self.currentCase_index)
       self.update_current_segmentation_status()
 
   @enter_function
   def update_current_segmentation_status(self):
-      current_color = self.ui.SlicerDirectoryListView.currentItem().foreground().color()
-      if current_color == qt.QColor(self.foreground):
+      status = self.CaseListModel.get_status(self.currentCase_index)
+      if status == STATUS_NOT_SEGMENTED:
           self.ui.CurrentStatus.setText('Segmentation Status : Not done')
-      elif current_color == qt.QColor('orange'):
+      elif status == STATUS_SEGMENTED_BY_OTHER_ANNOTATOR:
           self.ui.CurrentStatus.setText('Segmentation Status : Done by another annotator')
-      elif current_color == qt.QColor('green'):
+      elif status == STATUS_SEGMENTED_BY_ANNOTATOR:
           self.ui.CurrentStatus.setText('Segmentation Status : Done by this annotator')
+
+  def get_selected_case_index(self):
+      """
+      Index (in self.Cases) of the case selected in the case list view.
+      """
+      proxy_index = self.ui.SlicerDirectoryListView.currentIndex()
+      modality_proxy_index = self.caseListProxyModel.mapToSource(proxy_index)
+      return self.caseListModalityProxyModel.mapToSource(
+          modality_proxy_index).row()
+
+  def get_case_proxy_index(self, case_index):
+      """
+      Index in the case list view of a case (invalid if filtered out).
+      :param case_index: index of the case in self.Cases.
+      """
+      source_index = self.CaseListModel.index(case_index, 0)
+      return self.caseListProxyModel.mapFromSource(
+          self.caseListModalityProxyModel.mapFromSource(source_index))
+
+  def select_case_in_list(self, case_index):
+      """
+      Select and show a case in the case list view. The filters are cleared
+      if they hide the case.
+      :param case_index: index of the case in self.Cases.
+      """
+      proxy_index = self.get_case_proxy_index(case_index)
+      if not proxy_index.isValid():
+          self.ui.CaseListFilter.clear()
+          proxy_index = self.get_case_proxy_index(case_index)
+      if not proxy_index.isValid():
+          self.ui.CaseListModalityFilter.setCurrentIndex(0)
+          proxy_index = self.get_case_proxy_index(case_index)
+      self.ui.SlicerDirectoryListView.setCurrentIndex(proxy_index)
+      self.ui.SlicerDirectoryListView.scrollTo(proxy_index)
+
+  def onCaseListFilterChanged(self, text):
+      self.caseListProxyModel.setFilterFixedString(text)
+
+  def onCaseListSortOrderChanged(self, index):
+      """
+      Sort the case list view by size or modality (see VolumeHeaderIndex).
+      Previous and Next still follow the order of the cases.
+      """
+      sort_order = CASE_LIST_SORT_ORDERS.get(
+          self.ui.CaseListSortOrder.currentText)
+      if sort_order is None:
+          # Order of the source model.
+          self.caseListProxyModel.sort(-1)
+      else:
+          role, order = sort_order
+          self.caseListProxyModel.setSortRole(role)
+          self.caseListProxyModel.sort(0, order)
+      self.ui.SlicerDirectoryListView.scrollTo(
+          self.ui.SlicerDirectoryListView.currentIndex())
+
+  def onCaseListModalityFilterChanged(self, index):
+      """
+      Show only the cases of the selected modality.
+      """
+      if index <= 0:
+          self.caseListModalityProxyModel.setFilterRegExp('')
+      else:
+          modality = self.ui.CaseListModalityFilter.currentText
+          self.caseListModalityProxyModel.setFilterRegExp(
+              f'^{re.escape(modality)}$')
+
+  def onCaseListFilterReturnPressed(self):
+      """
+      Jump to the first case matching the filter.
+      """
+      if self.caseListProxyModel.rowCount() == 0:
+          return
+      self.ui.SlicerDirectoryListView.setCurrentIndex(
+          self.caseListProxyModel.index(0, 0))
+      self.getCurrentTableItem()
       
   def getCurrentTableItem(self):
       # ----- ANW Addition ----- : Reset timer when change case and uncheck all checkboxes
@@ -674,9 +1109,9 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
       # When an item in SlicerDirectroyListView is selected the case number is printed
       # below we update the case index and we need to pass one parameter to the methods since it takes 2 (1 in addition to self)
-      self.updateCaseIndex(self.ui.SlicerDirectoryListView.currentRow) # Index starts at 0
+      self.updateCaseIndex(self.get_selected_case_index()) # Index starts at 0
       # Update the case index
-      self.currentCase_index = self.ui.SlicerDirectoryListView.currentRow
+      self.currentCase_index = self.get_selected_case_index()
       # Same code in onBrowseFoldersButton, need to update self.currentCase
       # note that updateCaseAll() not implemented here - it is called when a case is selected from the list view or next/previous button is clicked
       self.currentCase = self.Cases[self.currentCase_index]
@@ -700,6 +1135,7 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       self.ui.CurrentPath.setText(self.currentCasePath)
       
   @enter_function
+  @measure_latency('loadPatient')
   def loadPatient(self):
       timer_index = 0
       self.timers = []
@@ -713,14 +1149,45 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       # timer reset if we come back to same case
       self.called = False
 
-      slicer.mrmlScene.Clear()
-      slicer.util.loadVolume(self.currentCasePath)
-      self.VolumeNode = slicer.util.getNodesByClass('vtkMRMLScalarVolumeNode')[0]
-      self.updateCaseAll()
+      with self.LatencyMetrics.measure('loadPatient/prepare_scene_and_volume'):
+          is_preview_displayed = self.prepare_scene_and_volume(
+              allow_preview=True)
+      with self.LatencyMetrics.measure('loadPatient/update_case'):
+          self.updateCaseAll()
+      self.set_volume_display()
+
+      if is_preview_displayed:
+          # Segmentation editing starts once the full resolution volume
+          # is displayed (see swap_full_resolution_volume).
+          self.disableSegmentAndPaintButtons()
+          return
+
+      self.finish_load_patient()
+
+  @enter_function
+  def finish_load_patient(self):
+      """
+      Second part of loadPatient, once the full resolution volume of the
+      case is displayed: new segmentation, latest masks and prefetch.
+      """
+      with self.LatencyMetrics.measure('loadPatient/new_segmentation'):
+          self.newSegmentation()
+
+      self.updateCurrentOutputPathAndCurrentVolumeFilename()
+
+      # If Load latest masks is checked, will load the latest version if
+      # avaialable when loading a new patient
+      if self.ui.ToggleSegmentation.isChecked():
+          self.toggle_segmentation_masks()
+
+      self.schedule_prefetch()
+
+  def set_volume_display(self):
+      """
+      Adjust windowing and interpolation of the volume of the current case.
+      """
       # Adjust windowing (no need to use self. since this is used locally)
       Vol_displayNode = self.VolumeNode.GetDisplayNode()
-      # print('self volumenode get display node', self.VolumeNode.GetDisplayNode())
-      # print(' node', self.VolumeNode)
 
       Vol_displayNode.AutoWindowLevelOff()
       if ConfigPath.MODALITY == 'CT':
@@ -728,16 +1195,386 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
           Vol_displayNode.SetWindow(ConfigPath.CT_WINDOW_WIDTH)
           Vol_displayNode.SetLevel(ConfigPath.CT_WINDOW_LEVEL)
       Vol_displayNode.SetInterpolate(ConfigPath.INTERPOLATE_VALUE)
-      self.newSegmentation()
 
-      self.updateCurrentOutputPathAndCurrentVolumeFilename()
+  @enter_function
+  def get_prefetched_volume(self):
+      """
+      Get the volume of the current case from the prefetch cache.
+      :return: volume dictionary (see VolumeLoader.read_volume) or None.
+      """
+      if self.CasePrefetcher is None:
+          return None
 
-      # If Load latest masks is checked, will load the latest version if
-      # avaialable when loading a new patient
-      if self.ui.ToggleSegmentation.isChecked():
-          self.toggle_segmentation_masks()
+      volume = self.CasePrefetcher.get(self.currentCasePath)
+      if volume is not None:
+          Debug.print(self, f'Volume loaded from prefetch cache: '
+                            f'{self.currentCasePath}')
+      return volume
+
+  @enter_function
+  def get_cached_volume(self):
+      """
+      Get the volume of the current case from the prefetch cache, or from
+      the volume disk cache (uncompressed copy of a volume already opened).
+      :return: volume dictionary (see VolumeLoader.read_volume) or None.
+      """
+      volume = self.get_prefetched_volume()
+      if volume is None:
+          volume = VolumeDiskCache.load(self.currentCasePath, memory_map=True)
+          if volume is not None:
+              Debug.print(self, f'Volume loaded from disk cache: '
+                                f'{self.currentCasePath}')
+      return volume
+
+  @enter_function
+  def read_current_volume(self):
+      """
+      Read the volume of the current case without Slicer readers when it
+      can be done without decompressing it: from the caches (see
+      get_cached_volume), or memory mapped if the file is not compressed
+      (voxels read from disk when displayed, without copy).
+      :return: volume dictionary (see VolumeLoader.read_volume) or None (to
+      load with Slicer readers).
+      """
+      volume = self.get_cached_volume()
+      if (volume is None
+              and VolumeLoader.can_memory_map(self, self.currentCasePath)):
+          try:
+              volume = VolumeLoader.read_volume(self, self.currentCasePath,
+                                                memory_map=True)
+          except Exception as e:
+              print(f'Cannot memory map {self.currentCasePath}: {e}')
+      return volume
+
+  @enter_function
+  def store_volume_in_disk_cache(self, volume_node, stat):
+      """
+      Keep an uncompressed copy of the volume of the current case (loaded by
+      Slicer readers) in the volume disk cache, written in background.
+      :param stat: stat of the volume file taken before it was loaded.
+      """
+      if (not VolumeDiskCache.is_enabled()
+              or not VolumeLoader.is_compressed(self, self.currentCasePath)):
+          return
+
+      array = slicer.util.arrayFromVolume(volume_node)
+      if array is None or array.ndim != 3:
+          return
+      ijk_to_ras = vtk.vtkMatrix4x4()
+      volume_node.GetIJKToRASMatrix(ijk_to_ras)
+      VolumeDiskCache.store_in_background(
+          self.currentCasePath, stat, array,
+          slicer.util.arrayFromVTKMatrix(ijk_to_ras))
+
+  @enter_function
+  def load_current_volume(self):
+      """
+      Load the volume of the current case in the scene, from the prefetch
+      cache, the volume disk cache or memory mapped if possible, otherwise
+      with Slicer readers.
+      :return: volume node of the current case.
+      """
+      volume = self.read_current_volume()
+      if volume is not None:
+          return VolumeLoader.create_volume_node(self, volume)
+
+      stat = os.stat(self.currentCasePath)
+      volume_node = slicer.util.loadVolume(self.currentCasePath)
+      self.store_volume_in_disk_cache(volume_node, stat)
+      return volume_node
+
+  @enter_function
+  def prepare_scene_and_volume(self, allow_preview=False):
+      """
+      Get the scene ready for the current case and display its volume.
+      In scene recycling mode, the volume node of the previous case is kept
+      and only its voxels and geometry are replaced; otherwise the scene is
+      cleared and a new volume node is created.
+      :param allow_preview: if True and progressive loading is requested,
+      the preview of a volume that has to be decompressed is displayed
+      first, and the full resolution volume is read in background.
+      :return: True if the preview is displayed.
+      """
+      VolumeDiskCache.set_settings(ConfigPath.VOLUME_CACHE_DIRECTORY,
+                                   ConfigPath.VOLUME_CACHE_BUDGET_MB)
+      self.stop_full_resolution_read()
+
+      preview = None
+      if allow_preview and ConfigPath.IS_PROGRESSIVE_LOADING_REQUESTED:
+          preview = self.get_volume_preview()
+
+      if self.can_recycle_scene():
+          self.remove_case_nodes()
+          if preview is not None:
+              VolumeLoader.update_volume_node(self, self.VolumeNode, preview)
+              # Segments of the previous case are not shown on the preview.
+              if self.can_reuse_segmentation_node():
+                  self.segmentationNode.GetSegmentation().RemoveAllSegments()
+              self.recycledCasePath = None
+              slicer.util.setSliceViewerLayers(background=self.VolumeNode,
+                                               fit=True)
+          else:
+              self.swap_current_volume()
+      else:
+          slicer.mrmlScene.Clear()
+          if preview is not None:
+              self.VolumeNode = VolumeLoader.create_volume_node(self, preview)
+              self.recycledCasePath = None
+          else:
+              self.VolumeNode = self.load_current_volume()
+              self.recycledCasePath = self.currentCasePath
+
+      if preview is not None:
+          self.start_full_resolution_read()
+      return preview is not None
+
+  @enter_function
+  def get_volume_preview(self):
+      """
+      Get the preview of the volume of the current case (see
+      VolumeDiskCache), only if the volume cannot be displayed quickly
+      (not in the caches and compressed).
+      :return: volume dictionary of the preview, or None.
+      """
+      path = self.currentCasePath
+      if (self.recycledCasePath == path
+              or (self.CasePrefetcher is not None
+                  and self.CasePrefetcher.get(path) is not None)
+              or VolumeDiskCache.contains(path)
+              or VolumeLoader.can_memory_map(self, path)):
+          return None
+      return VolumeDiskCache.load(path, preview=True)
+
+  @enter_function
+  def start_full_resolution_read(self):
+      """
+      Read the full resolution volume of the current case in a background
+      thread (progressive loading). It replaces the preview when read (see
+      swap_full_resolution_volume).
+      """
+      path = self.currentCasePath
+      # The result goes to the deque of this read only: a read finishing
+      # after another case has been loaded is never seen by the read of
+      # that case.
+      volumes = deque()
+      self.fullResolutionVolumes = volumes
+
+      def read():
+          try:
+              volume = VolumeLoader.read_volume(self, path)
+          except Exception as e:
+              print(f'Cannot read {path} in background: {e}')
+              volume = None
+          volumes.append((path, volume))
+
+      self.fullResolutionReadStart = time.perf_counter()
+      self.fullResolutionReadThread = threading.Thread(
+          target=read, name='SlicerCARTFullResolutionRead', daemon=True)
+      self.fullResolutionReadThread.start()
+      self.fullResolutionTimer.start()
+
+  def stop_full_resolution_read(self):
+      """
+      Stop waiting for a full resolution volume (e.g. another case is
+      loaded). The volume being read is discarded.
+      """
+      if self.fullResolutionReadThread is not None:
+          self.fullResolutionTimer.stop()
+          self.fullResolutionReadThread = None
+          self.fullResolutionVolumes = deque()
+
+  def is_full_resolution_pending(self):
+      """
+      Check if the preview of the current case is displayed instead of its
+      full resolution volume.
+      """
+      return self.fullResolutionReadThread is not None
+
+  def swap_full_resolution_volume(self):
+      """
+      Replace the preview by the full resolution volume once read, then
+      finish loading the case (segmentation editing is enabled from then).
+      Called periodically by fullResolutionTimer.
+      """
+      if not self.fullResolutionVolumes:
+          return
+
+      path, volume = self.fullResolutionVolumes.popleft()
+      if path != self.currentCasePath:
+          # Read of another case: the read of the current case goes on.
+          return
+      self.stop_full_resolution_read()
+
+      if volume is not None:
+          VolumeLoader.update_volume_node(self, self.VolumeNode, volume)
+      else:
+          # Volumes that cannot be read outside of Slicer readers.
+          loaded_node = slicer.util.loadVolume(path,
+                                               properties={'show': False})
+          VolumeLoader.copy_volume_node(self, loaded_node, self.VolumeNode,
+                                        path)
+          self.remove_node(loaded_node)
+      self.recycledCasePath = path
+      self.LatencyMetrics.add('loadPatient/full_resolution',
+                              time.perf_counter()
+                              - self.fullResolutionReadStart)
+
+      self.set_volume_display()
+      if (not ConfigPath.IS_DISPLAY_TIMER_REQUESTED
+              or self.ui.PauseTimerButton.isEnabled()):
+          self.enableSegmentAndPaintButtons()
+      self.finish_load_patient()
+
+  @enter_function
+  def can_recycle_scene(self):
+      """
+      Check if scene recycling mode is requested and if the persistent volume
+      node is still in the scene.
+      """
+      return (ConfigPath.IS_SCENE_RECYCLING_REQUESTED
+              and self.VolumeNode is not None
+              and slicer.mrmlScene.IsNodePresent(self.VolumeNode))
+
+  @enter_function
+  def can_reuse_segmentation_node(self):
+      """
+      Check if the persistent segmentation node can be reset and reused
+      (scene recycling mode).
+      """
+      return (ConfigPath.IS_SCENE_RECYCLING_REQUESTED
+              and self.segmentationNode is not None
+              and slicer.mrmlScene.IsNodePresent(self.segmentationNode))
+
+  @enter_function
+  def remove_case_nodes(self):
+      """
+      Remove the nodes created while working on the previous case (e.g.
+      measurement lines, exported labelmaps, loaded segment versions), but
+      keep the persistent volume and segmentation nodes.
+      """
+      persistent_nodes = [self.VolumeNode, self.segmentationNode]
+      for class_name in ['vtkMRMLScalarVolumeNode',
+                         'vtkMRMLSegmentationNode',
+                         'vtkMRMLMarkupsNode']:
+          for node in slicer.util.getNodesByClass(class_name):
+              if any(node is persistent for persistent in persistent_nodes):
+                  continue
+              self.remove_node(node)
+
+  def remove_node(self, node):
+      """
+      Remove a node from the scene, with its display and storage nodes.
+      """
+      display_node = node.GetDisplayNode()
+      if display_node is not None:
+          slicer.mrmlScene.RemoveNode(display_node)
+      storage_node = node.GetStorageNode()
+      if storage_node is not None:
+          slicer.mrmlScene.RemoveNode(storage_node)
+      slicer.mrmlScene.RemoveNode(node)
+
+  @enter_function
+  def swap_current_volume(self):
+      """
+      Scene recycling mode: replace the voxels and geometry of the persistent
+      volume node by the ones of the current case. Nothing is done if the
+      node already displays the current case (e.g. when segment versions are
+      cleared or latest masks are toggled).
+      """
+      if self.recycledCasePath == self.currentCasePath:
+          return
+
+      volume = self.read_current_volume()
+      if volume is not None:
+          VolumeLoader.update_volume_node(self, self.VolumeNode, volume)
+      else:
+          stat = os.stat(self.currentCasePath)
+          loaded_node = slicer.util.loadVolume(self.currentCasePath,
+                                               properties={'show': False})
+          self.store_volume_in_disk_cache(loaded_node, stat)
+          VolumeLoader.copy_volume_node(self, loaded_node, self.VolumeNode,
+                                        self.currentCasePath)
+          self.remove_node(loaded_node)
+
+      self.recycledCasePath = self.currentCasePath
+      slicer.util.setSliceViewerLayers(background=self.VolumeNode, fit=True)
+
+  @enter_function
+  def get_next_cases_paths(self):
+      """
+      Get the paths of the cases the annotator is likely to open next: the
+      cases following the current one in the remaining list (if an output
+      folder is selected), then the following cases of the case list.
+      """
+      number_of_cases = ConfigPath.PREFETCH_NUMBER_OF_CASES
+      next_filenames = []
+
+      if self.WorkFiles is not None:
+          next_filenames = self.WorkFiles.get_next_remaining_filenames(
+              self.currentCase, number_of_cases)
+
+      next_paths = []
+      if next_filenames:
+          next_paths = self.WorkFiles.get_remaining_list_filepaths(
+              next_filenames)
+
+      for path in self.CasesPaths[self.currentCase_index + 1:]:
+          if len(next_paths) >= number_of_cases:
+              break
+          if path not in next_paths:
+              next_paths.append(path)
+
+      return next_paths
+
+  @enter_function
+  def schedule_prefetch(self):
+      """
+      Start reading the next cases in background (see CasePrefetcher).
+      """
+      if (ConfigPath.PREFETCH_NUMBER_OF_CASES <= 0
+              or ConfigPath.PREFETCH_MEMORY_BUDGET_MB <= 0):
+          if self.CasePrefetcher is not None:
+              self.CasePrefetcher.shutdown()
+              self.CasePrefetcher = None
+          return
+
+      if self.CasePrefetcher is None:
+          self.CasePrefetcher = CasePrefetcher(
+              ConfigPath.PREFETCH_NUMBER_OF_CASES,
+              ConfigPath.PREFETCH_MEMORY_BUDGET_MB)
+      else:
+          self.CasePrefetcher.set_settings(
+              ConfigPath.PREFETCH_NUMBER_OF_CASES,
+              ConfigPath.PREFETCH_MEMORY_BUDGET_MB)
+
+      # Sizes known from the headers let the prefetcher skip the cases that
+      # do not fit in the memory budget without reading them.
+      next_cases_paths = self.get_next_cases_paths()
+      self.CasePrefetcher.schedule(
+          next_cases_paths,
+          {path: self.VolumeHeaderIndex.get_nbytes(path)
+           for path in next_cases_paths})
+
+  def cleanup(self):
+      """
+      Called when the application closes and the module widget is destroyed.
+      """
+      self.stop_volumes_folder_scan()
+      self.stop_volume_header_index()
+      self.stop_full_resolution_read()
+      if self.CasePrefetcher is not None:
+          self.CasePrefetcher.shutdown()
+          self.CasePrefetcher = None
+      if self.SaveQueue is not None:
+          # Pending saves stay on disk and are resumed at next start.
+          self.saveQueueTimer.stop()
+          self.SaveQueue.shutdown()
+          self.SaveQueue = None
+      ConfigCache.unsubscribe(self.on_config_file_changed)
+      ConfigPath.reset_output_folder_selection()
+      self.latencyMetricsTimer.stop()
+      self.LatencyMetrics.write_session_summary()
 
-  
   @enter_function
   def updateCurrentOutputPathAndCurrentVolumeFilename(self):
       if (self.currentCasePath == None
@@ -756,6 +1593,9 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
           os.path.split(self.outputFolder + relativePath))[0]
       self.currentVolumeFilename = (
           os.path.split(self.outputFolder + relativePath)[1].split("."))[0]
+      self.currentCaseRelativePath = os.path.relpath(
+          os.path.join(self.currentOutputPath, self.currentVolumeFilename),
+          self.outputFolder).replace(os.sep, '/')
   
 
   # Getter method to get the segmentation node name
@@ -772,8 +1612,11 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       self.newSegments()
 
   def on_annotator_name_changed(self):
+      self.refresh_case_list_status()
+
+  def refresh_case_list_status(self):
       self.update_case_list_colors()
-      self.ui.SlicerDirectoryListView.setCurrentItem(self.ui.SlicerDirectoryListView.item(self.currentCase_index))
+      self.select_case_in_list(self.currentCase_index)
       self.update_current_segmentation_status()
   
   def onPushButton_Interpolate(self):
@@ -815,9 +1658,17 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       # Create segment editor widget and node
       self.segmentEditorWidget = slicer.modules.segmenteditor.widgetRepresentation().self().editor
       self.segmentEditorNode = self.segmentEditorWidget.mrmlSegmentEditorNode()
-      # Create segmentation node (keep it local since we add a new segmentation node)
-      # Not for reference in other methods
-      segmentationNode=slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
+      if self.can_reuse_segmentation_node():
+          # Scene recycling mode: reset the segments of the persistent node.
+          segmentationNode = self.segmentationNode
+          segmentationNode.GetSegmentation().RemoveAllSegments()
+          # Unset the node first so the undo history of the previous case is
+          # not kept.
+          self.segmentEditorWidget.setSegmentationNode(None)
+      else:
+          # Create segmentation node (keep it local since we add a new segmentation node)
+          # Not for reference in other methods
+          segmentationNode=slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
       # Set segmentation node name
       segmentationNode.SetName(self.segmentationNodeName)
       # Set segmentation node to segment editor
@@ -837,9 +1688,12 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       # (which controls the visibility of all segments)
       displayNode = segmentationNode.GetDisplayNode()
 
-      # Add an observer to catch visibility changes
-      displayNode.AddObserver(vtk.vtkCommand.ModifiedEvent,
-                              self.visibilityModifiedCallback)
+      # Add an observer to catch visibility changes (only once if the
+      # display node is kept in scene recycling mode)
+      if displayNode is not self.observedSegmentationDisplayNode:
+          displayNode.AddObserver(vtk.vtkCommand.ModifiedEvent,
+                                  self.visibilityModifiedCallback)
+          self.observedSegmentationDisplayNode = displayNode
 
       # restart the current timer 
       self.timers[self.current_label_index] = Timer(
@@ -979,7 +1833,7 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
   def toggleStartTimerButton(self):
       #allow users to start the timer by clicking on any of the segmentation-related buttons
-      if (self.ui.SlicerDirectoryListView.count > 0):
+      if (self.CaseListModel.rowCount() > 0):
             self.startTimer()
             self.timer_router()
 
@@ -1319,33 +2173,67 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       return info_dict
 
   @enter_function
-  def cast_segmentation_to_uint8(self):
-      for case in self.predictions_paths:
-          # Load the segmentation
-          input_path = os.path.basename(case)
-          if input_path.endswith('.nii') or input_path.endswith('.nii.gz'):
-              segm = nib.load(case)
-              segm_data_dtype = segm.dataobj.dtype
-              print(f'infile: {input_path}, dtype: {segm_data.dtype}')
-              if segm_data_dtype != np.uint8:
-                  segm_data = segm_data.astype(np.uint8)
-                  segm.header.set_data_dtype(np.uint8)
-                  segm_nii = nib.Nifti1Image(segm_data, segm.affine, segm.header)
-                  nib.save(segm_nii, case)
-                  print(f'converted file {input_path} to uint8')
-          elif input_path.endswith('seg.nrrd'):
-              segm_data, header = nrrd.read(case)
-              print(f'infile: {input_path}, dtype: {segm_data.dtype}')
-              if segm_data.dtype != np.uint8:
-                  segm_data = segm_data.astype(np.uint8)
-                  header['type'] = 'unsigned char'
-                  nrrd.write(case, segm_data, header = header)
-                  print(f'converted file {input_path} to uint8')
-          else:
-              raise ValueError('The input segmentation file must be in nii, nii.gz or nrrd format.')
-  
+  def onNormalizeSegmentationDtypes(self):
+      """
+      One-off conversion to uint8 of all masks already saved in the output
+      folder (masks are saved as uint8 since they are written, so this is
+      only needed for folders created by previous versions).
+      """
+      if self.outputFolder is None:
+          return
+
+      qt.QApplication.setOverrideCursor(qt.Qt.WaitCursor)
+      try:
+          converted, failed = SegmentationMasks.normalize_dtypes(
+              self, self.outputFolder)
+      finally:
+          qt.QApplication.restoreOverrideCursor()
+
+      message = f'{len(converted)} mask(s) converted to uint8.'
+      if failed:
+          message += (f'\n\n{len(failed)} mask(s) could not be converted:\n'
+                      + '\n'.join(f'{path}: {error}'
+                                   for path, error in failed.items()))
+      Dev.show_message_box(self, message, box_title='Normalize saved masks')
+
+  @enter_function
+  def onExportSegmentationInformation(self):
+      """
+      Write the _SegmentationInformation.csv file of each case of the output
+      folder from the segmentation information logs (saves are only
+      appended to the logs).
+      """
+      if self.outputFolder is None:
+          return
+
+      # Saves still in the save queue are not in the logs yet.
+      if self.SaveQueue is not None and self.SaveQueue.get_status()[0] > 0:
+          Dev.show_message_box(
+              self, 'Some segmentations are still being saved: the csv '
+              'files will not include them.',
+              box_title='Export segmentation information')
+
+      qt.QApplication.setOverrideCursor(qt.Qt.WaitCursor)
+      try:
+          exported, failed = SegmentationInformation.export_csv_files(
+              self.outputFolder)
+      finally:
+          qt.QApplication.restoreOverrideCursor()
+
+      message = f'{len(exported)} csv file(s) written.'
+      if failed:
+          message += (f'\n\n{len(failed)} file(s) could not be exported:\n'
+                      + '\n'.join(f'{path}: {error}'
+                                   for path, error in failed.items()))
+      Dev.show_message_box(self, message,
+                           box_title='Export segmentation information')
+
   @enter_function
   def onSaveSegmentationButton(self):
+      # Nothing to save while the preview of the volume is displayed
+      # (progressive loading).
+      if self.is_full_resolution_pending():
+          return
       # By default creates a new folder in the volume directory 
       # Stop the timer when the button is pressed
       self.time = self.stopTimer()
@@ -1367,24 +2255,45 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       currentSegmentationVersion = self.getCurrentSegmentationVersion()
 
       # quality control check (number of labels)
-      is_valid = self.qualityControlOfLabels()
+      with self.LatencyMetrics.measure('onSaveSegmentationButton/quality_control'):
+          is_valid = self.qualityControlOfLabels()
       if is_valid == False:
           return
 
       # Save if annotator_name is not empty and timer started:
-      if self.annotator_name and self.time is not None:
+      if (self.annotator_name and self.time is not None
+              and self.can_save_asynchronously(currentSegmentationVersion)):
+          # Written in the background: the status is shown under the save
+          # button instead of a message box.
+          with self.LatencyMetrics.measure('onSaveSegmentationButton/enqueue'):
+              self.enqueue_segmentation_save(currentSegmentationVersion)
 
-          self.saveSegmentationInformation(currentSegmentationVersion)
+      elif self.annotator_name and self.time is not None:
+
+          with self.LatencyMetrics.measure('onSaveSegmentationButton/segmentation_information'):
+              self.saveSegmentationInformation(currentSegmentationVersion)
 
           # If not working, the solution is likely to add here:
           # self.config_yaml = ConfigPath.open_project_config_file() # Get latest/appropriate configuration
           # self.config_yaml = ConfigPath.set_config_value(self.config_yaml) # Set appropriate values for configuration
 
+          is_mask_written = False
           if 'nrrd' in ConfigPath.INPUT_FILE_EXTENSION:
-            self.saveNrrdSegmentation(currentSegmentationVersion)
+            with self.LatencyMetrics.measure('onSaveSegmentationButton/write_nrrd'):
+                is_mask_written |= self.saveNrrdSegmentation(
+                    currentSegmentationVersion)
 
           if 'nii' in ConfigPath.INPUT_FILE_EXTENSION:
-            self.saveNiiSegmentation(currentSegmentationVersion)
+            with self.LatencyMetrics.measure('onSaveSegmentationButton/write_nifti'):
+                is_mask_written |= self.saveNiiSegmentation(
+                    currentSegmentationVersion)
+
+          # The version is only taken if the mask has been written (not
+          # when the replacement of an existing mask is cancelled).
+          if is_mask_written and self.CaseStatusIndex is not None:
+              self.CaseStatusIndex.add_version(
+                  self.currentCaseRelativePath, VERSION_KIND_SEGMENTATION,
+                  self.parse_version_to_int(currentSegmentationVersion))
 
           msg_box = qt.QMessageBox()
           msg_box.setWindowTitle("Success")
@@ -1401,13 +2310,207 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
           elif self.time is None:
               print("Error: timer is not started for some unknown reason.")
 
-      self.cast_segmentation_to_uint8()
-
-      self.update_case_list_colors()
+      with self.LatencyMetrics.measure('onSaveSegmentationButton/case_list_colors'):
+          self.update_case_list_colors()
 
       # One segment has been saved, which allows to load the next case from now.
       self.saved_selected = True
-      self.select_next_remaining_case()
+      with self.LatencyMetrics.measure('onSaveSegmentationButton/select_next_case'):
+          self.select_next_remaining_case()
+
+  @enter_function
+  def get_segmentation_mask_path(self, currentSegmentationVersion):
+      """
+      Path of the mask saved for the current case and the given version.
+      """
+      if 'nrrd' in ConfigPath.INPUT_FILE_EXTENSION:
+          extension = '.seg.nrrd'
+      else:
+          extension = '.nii.gz'
+      return os.path.join(
+          self.currentOutputPath,
+          f'{self.currentVolumeFilename}_{currentSegmentationVersion}'
+          f'{extension}')
+
+  @enter_function
+  def can_save_asynchronously(self, currentSegmentationVersion):
+      """
+      Masks are written in the background if requested in the configuration,
+      except when the mask already exists (the annotator is asked whether it
+      should be replaced).
+      """
+      if (not ConfigPath.IS_ASYNCHRONOUS_SAVE_REQUESTED
+              or self.SaveQueue is None):
+          return False
+      return not os.path.exists(
+          self.get_segmentation_mask_path(currentSegmentationVersion))
+
+  @enter_function
+  def snapshot_segmentation(self):
+      """
+      Copy the voxels, geometry and segments of the current segmentation so
+      that it can be written in the background while the annotator moves on.
+      Must be called from the main thread.
+      :return: labelmap voxels (uint8 numpy array in KJI order), IJK to RAS
+      matrix (4x4 numpy array) and list of segments dictionaries (see
+      SegmentationMasks.write_seg_nrrd).
+      """
+      labelmap_node = slicer.mrmlScene.AddNewNodeByClass(
+          'vtkMRMLLabelMapVolumeNode')
+      segmentation = self.segmentationNode.GetSegmentation()
+      segments = []
+
+      if 'nrrd' in ConfigPath.INPUT_FILE_EXTENSION:
+          # All segments are saved in .seg.nrrd files, as saveNode does.
+          segment_ids = vtk.vtkStringArray()
+          segmentation.GetSegmentIDs(segment_ids)
+          slicer.modules.segmentations.logic().ExportSegmentsToLabelmapNode(
+              self.segmentationNode, segment_ids, labelmap_node,
+              self.VolumeNode)
+          for index in range(segment_ids.GetNumberOfValues()):
+              segment_id = segment_ids.GetValue(index)
+              segment = segmentation.GetSegment(segment_id)
+              segments.append({'id': segment_id,
+                               'name': segment.GetName(),
+                               'color': list(segment.GetColor()),
+                               # Label values follow the exported order.
+                               'label_value': index + 1})
+      else:
+          slicer.modules.segmentations.logic().ExportVisibleSegmentsToLabelmapNode(
+              self.segmentationNode, labelmap_node, self.VolumeNode)
+
+      array = slicer.util.arrayFromVolume(labelmap_node).astype(np.uint8)
+      ijk_to_ras = vtk.vtkMatrix4x4()
+      labelmap_node.GetIJKToRASMatrix(ijk_to_ras)
+      ijk_to_ras = slicer.util.arrayFromVTKMatrix(ijk_to_ras)
+
+      slicer.mrmlScene.RemoveNode(labelmap_node)
+      return array, ijk_to_ras, segments
+
+  @enter_function
+  def write_segmentation_mask(self, path):
+      """
+      Write the current segmentation as a uint8 mask (.seg.nrrd or .nii.gz,
+      from the extension of path), compressed with several threads (see
+      ParallelGzip) instead of the single thread writers of saveNode.
+      """
+      array, ijk_to_ras, segments = self.snapshot_segmentation()
+      if path.endswith('.nrrd'):
+          SegmentationMasks.write_seg_nrrd(self, path, array, ijk_to_ras,
+                                           segments)
+      else:
+          SegmentationMasks.write_nifti(self, path, array, ijk_to_ras)
+
+  @enter_function
+  def enqueue_segmentation_save(self, currentSegmentationVersion):
+      """
+      Queue the save of the current segmentation and its information. The
+      files are written by the SaveQueue background thread.
+      """
+      array, ijk_to_ras, segments = self.snapshot_segmentation()
+      columns, values = self.build_segmentation_information(
+          currentSegmentationVersion)
+
+      mask_path = self.get_segmentation_mask_path(currentSegmentationVersion)
+      self.outputSegmentationInformationFile = (
+          SegmentationInformation.get_log_path(self.currentOutputPath,
+                                               self.currentVolumeFilename))
+
+      job = {'case_path': self.currentCasePath,
+             'mask_path': mask_path,
+             'mask_format': 'nrrd' if mask_path.endswith('.nrrd') else 'nii',
+             'ijk_to_ras': ijk_to_ras.tolist(),
+             'segments': segments,
+             'information_path': self.outputSegmentationInformationFile,
+             'information_columns': columns,
+             'information_values': values,
+             'volume_filename': self.currentCase,
+             'case_relative_path': self.currentCaseRelativePath,
+             'annotator_name': self.annotator_name,
+             'segmentation_version': currentSegmentationVersion}
+      self.SaveQueue.enqueue(job, array)
+      if self.CaseStatusIndex is not None:
+          self.CaseStatusIndex.reserve_version(
+              self.currentCaseRelativePath, VERSION_KIND_SEGMENTATION,
+              self.parse_version_to_int(currentSegmentationVersion))
+      self.update_save_queue_status()
+
+  @enter_function
+  def open_case_status_index(self):
+      """
+      Open the case status index of the output folder (built from the
+      existing segmentation information files the first time).
+      """
+      if (self.CaseStatusIndex is None
+              or self.CaseStatusIndex.outputFolder != self.outputFolder):
+          self.CaseStatusIndex = CaseStatusIndex(self.outputFolder)
+
+  @enter_function
+  def start_save_queue(self):
+      """
+      Start the save queue of the output folder. Saves still pending in the
+      output folder (e.g. after a crash) are resumed.
+      """
+      if (self.SaveQueue is not None
+              and self.SaveQueue.outputFolder == self.outputFolder):
+          return
+
+      if self.SaveQueue is not None:
+          self.SaveQueue.shutdown()
+      self.SaveQueue = SaveQueue(self.outputFolder, self.CaseStatusIndex)
+      self.saveQueueCompletedCount = 0
+      self.update_save_queue_status()
+      self.saveQueueTimer.start()
+
+  def update_save_queue_status(self):
+      """
+      Show the pending and failed saves under the save button and refresh
+      the case list when saves have been written. Called periodically by
+      saveQueueTimer.
+      """
+      if self.SaveQueue is None:
+          return
+
+      pending, failed, completed = self.SaveQueue.get_status()
+      if pending == 0 and failed == 0:
+          self.ui.SaveQueueStatusLabel.setText('All segmentations saved.')
+      else:
+          self.ui.SaveQueueStatusLabel.setText(
+              f'Saving: {pending} pending, {failed} failed.')
+      self.ui.SaveQueueStatusLabel.setToolTip('\n'.join(
+          f'{path}: {error}' for path, error in
+          self.SaveQueue.get_failed_errors().items()))
+      self.ui.RetryFailedSavesButton.setVisible(failed > 0)
+
+      if completed != self.saveQueueCompletedCount:
+          self.saveQueueCompletedCount = completed
+          self.refresh_case_list_status()
+
+  @enter_function
+  def onRetryFailedSaves(self):
+      if self.SaveQueue is not None:
+          self.SaveQueue.retry_failed_jobs()
+          self.update_save_queue_status()
+
+  def update_latency_metrics(self):
+      """
+      Write the durations measured since the last call to the metrics file
+      and refresh the Latency metrics panel if it is open. Called
+      periodically by latencyMetricsTimer (outside of the measured phases).
+      """
+      if not self.LatencyMetrics.is_modified:
+          return
+      self.LatencyMetrics.is_modified = False
+      self.LatencyMetrics.write_pending_records()
+      if not self.ui.LatencyMetricsCollapsibleButton.collapsed:
+          self.ui.LatencyMetricsText.setPlainText(
+              self.LatencyMetrics.format_summary())
+
+  @enter_function
+  def onLatencyMetricsCollapsed(self, collapsed):
+      if not collapsed:
+          self.ui.LatencyMetricsText.setPlainText(
+              self.LatencyMetrics.format_summary())
 
   @enter_function
   def select_next_remaining_case(self):
@@ -1417,11 +2520,7 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       Debug.print(self,
                   f'self.currentCase_index + 1 = {self.currentCase_index + 1}')
 
-      remaining_list_filenames = self.WorkFiles.get_remaining_list_filenames()
-
-      if ((remaining_list_filenames == [])
-          or (remaining_list_filenames == None)
-          or (len(remaining_list_filenames) == 0)):
+      if self.WorkFiles.get_remaining_list_length() == 0:
 
           Debug.print(self, 'Remaining list empty!')
           next_case_name = self.select_next_working_case()
@@ -1432,17 +2531,16 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
           return
 
-      if self.currentCase in remaining_list_filenames:
-          current_case_index = self.WorkFiles.find_index_from_filename(
-              self.currentCase, remaining_list_filenames)
-          next_case_index = current_case_index + 1
+      if self.WorkFiles.is_in_remaining_list(self.currentCase):
+          next_case_names = self.WorkFiles.get_next_remaining_filenames(
+              self.currentCase, 1)
 
-          if next_case_index >= len(remaining_list_filenames):
+          if not next_case_names:
               Debug.print(self, 'This is the last case!')
               next_case_name = self.currentCase #So, remain on the last case.
 
           else:
-              next_case_name = remaining_list_filenames[next_case_index]
+              next_case_name = next_case_names[0]
 
           self.WorkFiles.adjust_remaining_list(self.currentCase)
 
@@ -1461,9 +2559,8 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       Select the next case to be displayed from the working list.
       """
 
-      working_list_filenames = self.WorkFiles.get_working_list_filenames()
-      index_in_working_list = self.WorkFiles.find_index_from_filename(
-          self.currentCase, working_list_filenames)
+      index_in_working_list = self.WorkFiles.get_working_list_index(
+          self.currentCase)
 
       # Means that segmentation have already been saved.
       if self.saved_selected:
@@ -1472,12 +2569,13 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       else:
           next_case_index = index_in_working_list
 
-      if next_case_index >= len(working_list_filenames):
+      if next_case_index >= self.WorkFiles.get_working_list_length():
           Debug.print(self, 'This is the last case of working list.')
           next_case_name = self.currentCase
 
       else:
-          next_case_name = working_list_filenames[next_case_index]
+          next_case_name = self.WorkFiles.get_working_list_filename(
+              next_case_index)
 
       return next_case_name
 
@@ -1507,12 +2605,16 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       return is_valid
   
   def saveNrrdSegmentation(self, currentSegmentationVersion):
-        # Save .seg.nrrd file
+        """
+        Save the .seg.nrrd mask (after confirmation if the file exists).
+        :return: True if the mask has been written.
+        """
         self.outputSegmFile = os.path.join(self.currentOutputPath,
                                                 "{}_{}.seg.nrrd".format(self.currentVolumeFilename, currentSegmentationVersion))
 
         if not os.path.isfile(self.outputSegmFile):
-            slicer.util.saveNode(self.segmentationNode, self.outputSegmFile)
+            self.write_segmentation_mask(self.outputSegmFile)
+            return True
 
         else:
             msg2 = qt.QMessageBox()
@@ -1521,22 +2623,22 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
                 f'The file {self.currentCase}_{self.annotator_name}_{self.revision_step[0]}.seg.nrrd already exists \n Do you want to replace the existing file?')
             msg2.setIcon(qt.QMessageBox.Warning)
             msg2.setStandardButtons(qt.QMessageBox.Ok | qt.QMessageBox.Cancel)
-            msg2.buttonClicked.connect(self.msg2_clicked)
-            msg2.exec()
+            if msg2.exec() != qt.QMessageBox.Ok:
+                return False
+            self.write_segmentation_mask(self.outputSegmFile)
+            return True
   
   def saveNiiSegmentation(self, currentSegmentationVersion):
-        # Export segmentation to a labelmap volume
-        # Note to save to nifti you need to convert to labelmapVolumeNode
-        self.labelmapVolumeNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLLabelMapVolumeNode')
-        slicer.modules.segmentations.logic().ExportVisibleSegmentsToLabelmapNode(self.segmentationNode,
-                                                                                self.labelmapVolumeNode,
-                                                                                self.VolumeNode)
-
+        """
+        Save the .nii.gz mask (after confirmation if the file exists).
+        :return: True if the mask has been written.
+        """
         self.outputSegmFileNifti = os.path.join(self.currentOutputPath,
                                                 "{}_{}.nii.gz".format(self.currentVolumeFilename, currentSegmentationVersion))
 
         if not os.path.isfile(self.outputSegmFileNifti):
-            slicer.util.saveNode(self.labelmapVolumeNode, self.outputSegmFileNifti)
+            self.write_segmentation_mask(self.outputSegmFileNifti)
+            return True
         else:
             msg3 = qt.QMessageBox()
             msg3.setWindowTitle('Save As')
@@ -1544,31 +2646,53 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
                 f'The file {self.currentCase}_{self.annotator_name}_{self.revision_step[0]}.nii.gz already exists \n Do you want to replace the existing file?')
             msg3.setIcon(qt.QMessageBox.Warning)
             msg3.setStandardButtons(qt.QMessageBox.Ok | qt.QMessageBox.Cancel)
-            msg3.buttonClicked.connect(self.msg3_clicked)
-            msg3.exec()
+            if msg3.exec() != qt.QMessageBox.Ok:
+                return False
+            self.write_segmentation_mask(self.outputSegmFileNifti)
+            return True
   
   def saveSegmentationInformation(self, currentSegmentationVersion):
-    # Header row
+    columns, values = self.build_segmentation_information(
+        currentSegmentationVersion)
+
+    self.outputSegmentationInformationFile = SegmentationInformation.get_log_path(
+        self.currentOutputPath, self.currentVolumeFilename)
+
+    SegmentationInformation.append(
+        self.outputSegmentationInformationFile, columns, values)
+    if self.CaseStatusIndex is not None:
+        self.CaseStatusIndex.add_segmentation(
+            self.currentCase, self.annotator_name, currentSegmentationVersion)
+
+  def build_segmentation_information(self, currentSegmentationVersion):
+    """
+    Build the columns and the values of the current save for the
+    segmentation information log of the case.
+    :return: list of column names and list of values.
+    """
     self.previousAction = None
-    tag_str = "Volume filename,Segmentation version,Annotator Name,Annotator degree,Revision step,Date and time,Duration"
+    columns = ["Volume filename", "Segmentation version", "Annotator Name",
+               "Annotator degree", "Revision step", "Date and time",
+               "Duration"]
 
     for label in self.config_yaml["labels"]:
-        tag_str += "," + label["name"] + " duration"
+        columns.append(label["name"] + " duration")
 
-    # Add line detail headers
+    # Add line detail columns
     for line_key in self.lineDetails:
-        tag_str += f",{line_key} ControlPoint1,{line_key} ControlPoint2,{line_key} Length"
+        columns += [f"{line_key} ControlPoint1", f"{line_key} ControlPoint2",
+                    f"{line_key} Length"]
 
-    data_str = self.currentCase
-    data_str += "," + currentSegmentationVersion
-    data_str += "," + self.annotator_name
-    data_str += "," + self.annotator_degree
-    data_str += "," + self.revision_step[0]
-    data_str += "," + datetime.today().strftime('%Y-%m-%d %H:%M:%S')
-    data_str += "," + str(self.ui.lcdNumber.value)
+    values = [self.currentCase,
+              currentSegmentationVersion,
+              self.annotator_name,
+              self.annotator_degree,
+              self.revision_step[0],
+              datetime.today().strftime('%Y-%m-%d %H:%M:%S'),
+              self.ui.lcdNumber.value]
 
     for timer in self.timers:
-        data_str += "," + str(timer.total_time)
+        values.append(timer.total_time)
 
     # Add line details, ensuring control points are kept in one cell
     for line_key, line_data in self.lineDetails.items():
@@ -1576,31 +2700,10 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         control_point2 = ';'.join(map(str, line_data["ControlPoint2"]))  # Join with semicolon
         length = line_data["Length"]  # Length is a number, no need for conversion
 
-        # Add control points and length to the data string
-        data_str += f",{control_point1},{control_point2},{length}"
-        
-    self.outputSegmentationInformationFile = os.path.join(self.currentOutputPath,
-                                                          f'{self.currentVolumeFilename}_SegmentationInformation.csv')
-
-    if os.path.isfile(self.outputSegmentationInformationFile):
-        # Read existing contents
-        with open(self.outputSegmentationInformationFile, 'r') as f:
-            existing_content = f.readlines()
-            existing_content = existing_content[1:] if len(existing_content) > 1 else []
-
-        # Rewrite the file with the new header and existing data
-        with open(self.outputSegmentationInformationFile, 'w') as f:
-            f.write(tag_str + "\n")  # Write the new header
-            f.writelines(existing_content)  # Write the old content
-
-        # Append the new data
-        with open(self.outputSegmentationInformationFile, 'a') as f:
-            f.write(data_str + "\n")
-    else:
-        # If the file doesn't exist, create it and write the header and data
-        with open(self.outputSegmentationInformationFile, 'w') as f:
-            f.write(tag_str + "\n")
-            f.write(data_str + "\n")
+        # Add control points and length to the values
+        values += [control_point1, control_point2, length]
+
+    return columns, values
 
   @enter_function
   def saveClassificationInformation(self, classification_df):
@@ -1615,39 +2718,93 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       classification_df.to_csv(self.outputClassificationInformationFile,
                                index=False)
 
+      if self.CaseStatusIndex is not None:
+          self.CaseStatusIndex.add_version(
+              self.currentCaseRelativePath, VERSION_KIND_CLASSIFICATION,
+              self.parse_version_to_int(
+                  classification_df['Classification version'].iloc[-1]))
+
   def getClassificationInformationVersion(self):
-      version = "v"
+      """
+      Get the version of the next classification save of the current case
+      (from the case status index; the csv file is only read the first time
+      the versions of a case are needed).
+      """
+      if self.CaseStatusIndex is not None:
+          versions = self.CaseStatusIndex.get_versions(
+              self.currentCaseRelativePath, VERSION_KIND_CLASSIFICATION)
+          if versions is not None:
+              return self.parse_version_int_to_str(versions[0])
+
       classificationInformationPath = f'{self.currentOutputPath}{os.sep}{self.currentVolumeFilename}_ClassificationInformation.csv'
 
-      if os.path.exists(classificationInformationPath) == False:
-          version = version + "01"
-      else:
+      latest_version = 0
+      if os.path.exists(classificationInformationPath):
           csv_data = pd.read_csv(classificationInformationPath)
           existing_version_strings = csv_data['Classification version'].to_list()
           existing_version_numbers = [(int)(version_string.split("v")[1]) for version_string in existing_version_strings]
-          next_version_number =  max(existing_version_numbers) + 1
-          version = f'{version}{next_version_number:02d}'
+          latest_version = max(existing_version_numbers, default=0)
 
-      return version 
+      if self.CaseStatusIndex is not None:
+          self.CaseStatusIndex.update_versions(
+              self.currentCaseRelativePath, VERSION_KIND_CLASSIFICATION,
+              latest_version + 1, latest_version)
+      return self.parse_version_int_to_str(latest_version + 1)
 
   @enter_function
   def getCurrentSegmentationVersion(self):
-      # Adjust the version according to each individual file.
-      list_of_segmentation_filenames = glob(
-          f'{self.currentOutputPath}{os.sep}'
-          f'{self.currentVolumeFilename}{ConfigPath.INPUT_FILE_EXTENSION}')
+      """
+      Get the version of the next segmentation save of the current case.
+      """
+      next_version, latest_version = self.get_segmentation_versions()
+      return self.parse_version_int_to_str(next_version)
 
-      version = 'v'
-      if list_of_segmentation_filenames == []:
-          version = version + "01"
-      else:
-          existing_versions = self.look_for_existing_version(
-              list_of_segmentation_filenames)
+  @enter_function
+  def get_segmentation_versions(self):
+      """
+      Get the versions of the current case from the case status index. The
+      output folder is only scanned the first time the versions of a case
+      are needed (e.g. projects created before the index kept versions).
+      :return: next version number and latest saved version number (0 if
+      none).
+      """
+      if self.CaseStatusIndex is not None:
+          versions = self.CaseStatusIndex.get_versions(
+              self.currentCaseRelativePath, VERSION_KIND_SEGMENTATION)
+          if versions is not None:
+              return versions
+
+      versions = self.scan_segmentation_versions()
+      if self.CaseStatusIndex is not None:
+          self.CaseStatusIndex.update_versions(
+              self.currentCaseRelativePath, VERSION_KIND_SEGMENTATION,
+              *versions)
+      return versions
 
-          next_version_number = max(existing_versions) + 1
-          next_version_number = min(next_version_number, 99)  # max 99 versions
-          version = f'{version}{next_version_number:02d}'
-      return version
+  @enter_function
+  def scan_segmentation_versions(self):
+      """
+      Get the versions of the current case from the masks saved in the
+      output folder.
+      :return: next version number and latest saved version number (0 if
+      none).
+      """
+      # Adjust the version according to each individual file.
+      pattern = (f'{self.currentOutputPath}{os.sep}'
+                 f'{self.currentVolumeFilename}'
+                 f'{ConfigPath.INPUT_FILE_EXTENSION}')
+      saved_versions = self.look_for_existing_version(glob(pattern))
+
+      # Versions of saves still in the save queue are already taken.
+      queued_versions = []
+      if self.SaveQueue is not None:
+          queued_versions = self.look_for_existing_version([
+              path for path in self.SaveQueue.get_queued_mask_paths()
+              if fnmatch.fnmatch(path, pattern)])
+
+      next_version = max(saved_versions + queued_versions, default=0) + 1
+      latest_version = max(saved_versions, default=0)
+      return next_version, latest_version
 
   @enter_function
   def look_for_existing_version(self, list_of_segmentation_filenames):
@@ -1674,18 +2831,6 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
               print(f"No version found in filename: {filename}")
       return existing_versions
 
-  def msg2_clicked(self, msg2_button):
-      if msg2_button.text == 'OK':
-          slicer.util.saveNode(self.segmentationNode, self.outputSegmFile)
-      else:
-          return
-
-  def msg3_clicked(self, msg3_button):
-      if msg3_button.text == 'OK':
-          slicer.util.saveNode(self.labelmapVolumeNode, self.outputSegmFileNifti)
-      else:
-          return
-
   def msg4_clicked(self, msg4_button):
       if msg4_button.text == 'OK':
           slicer.util.saveNode(self.VolumeNode, self.outputVolfile)
@@ -1721,7 +2866,7 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       #     self.verify_empty()
 
       ConfigPath.check_existing_configuration()
-      ConfigPath.delete_temp_file()
+      ConfigPath.set_output_folder_selected()
 
       # Robust. If the next output folder selected (from a change) is empty,
       # ensure it will select the correct output folder path
@@ -1762,69 +2907,37 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
           self.ui.SaveSegmentationButton.setEnabled(True)
           self.ui.SaveClassificationButton.setEnabled(True)
+          self.ui.NormalizeSegmentationDtypesButton.setEnabled(True)
+          self.ui.ExportSegmentationInformationButton.setEnabled(True)
+
+          self.open_case_status_index()
+          self.start_save_queue()
+          self.LatencyMetrics.set_output_folder(self.outputFolder)
 
           if self.CurrentFolder is not None:
               self.updateCurrentOutputPathAndCurrentVolumeFilename()
 
               self.update_case_list_colors()
 
-              self.ui.SlicerDirectoryListView.setCurrentItem(
-                  self.ui.SlicerDirectoryListView.item(self.currentCase_index))
+              self.select_case_in_list(self.currentCase_index)
               self.update_current_segmentation_status()
-
-              self.predictions_paths = sorted(glob(
-                  os.path.join(self.outputFolder, f'{ConfigPath.INPUT_FILE_EXTENSION}')))
       else:
           Debug.print(self, 'No output folder selected.')
 
   @enter_function
   def update_case_list_colors(self):
-      if self.outputFolder is None or self.CurrentFolder is None:
+      if (self.outputFolder is None or self.CurrentFolder is None
+              or self.CaseStatusIndex is None):
           return
-      
-      segmentation_information_path = f'{self.currentOutputPath}{os.sep}{self.currentVolumeFilename}_SegmentationInformation.csv'
-      segmentation_information_df = None
-      if os.path.exists(segmentation_information_path):
-          segmentation_information_df = pd.read_csv(segmentation_information_path)
-
-          self.ui.SlicerDirectoryListView.clear()
-          for case in self.Cases:
-            case_id = case.split('.')[0]
-            item = qt.QListWidgetItem(case_id)
- 
-            currentCaseSegmentationStatus = self.get_segmentation_status(case, segmentation_information_df)
-            if currentCaseSegmentationStatus == 0:
-                item.setForeground(qt.QColor(self.foreground))
-            elif currentCaseSegmentationStatus == 1:
-                item.setForeground(qt.QColor('orange'))
-            elif currentCaseSegmentationStatus == 2:
-                item.setForeground(qt.QColor('green'))
-            
-            self.ui.SlicerDirectoryListView.addItem(item)
-      else:
-          return
-  
-  def get_segmentation_status(self, case, segmentation_information_df):
+
       self.annotator_name = self.ui.Annotator_name.text
+      # Status of all cases of the project in one query.
+      statuses = self.CaseStatusIndex.get_statuses(self.annotator_name)
 
-      found_case = 0
-      if self.annotator_name is None:
-            msg = qt.QMessageBox()
-            msg.setIcon(qt.QMessageBox.Warning)
-            msg.setText("No annotator name defined")
-            msg.setInformativeText('The annotator name is empty, therefore, the case list colors are not updated. ')
-            msg.setWindowTitle("No annotator name defined")
-            msg.exec()
+      # Only the rows whose status changed are repainted.
+      self.CaseListModel.set_statuses(
+          [statuses.get(case, STATUS_NOT_SEGMENTED) for case in self.Cases])
 
-      else:
-            for _, row in segmentation_information_df.iterrows():
-                if row['Volume filename'] == case and row['Annotator Name'] == self.annotator_name:
-                    return 2
-                elif row['Volume filename'] == case:
-                    found_case = 1
-          
-      return found_case
-          
   def msg_warnig_delete_segm_node_clicked(self, msg_warnig_delete_segm_node_button):
       if msg_warnig_delete_segm_node_button.text == 'OK':
         srcNode = slicer.util.getNodesByClass('vtkMRMLSegmentationNode')[0]
@@ -1920,6 +3033,7 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
           return
 
   @enter_function
+  @measure_latency('toggle_segmentation_masks')
   def toggle_segmentation_masks(self):
       """
       Load latest version of segmentation from output folder if available.
@@ -1934,7 +3048,8 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
           self.segmentationNode.GetDisplayNode().SetAllSegmentsVisibility(True)
 
-          latest_version_path = self.get_latest_path()
+          with self.LatencyMetrics.measure('toggle_segmentation_masks/get_latest_path'):
+              latest_version_path = self.get_latest_path()
 
           Debug.print(self, f'latest_version_path: {latest_version_path}')
 
@@ -1944,7 +3059,8 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
           # Replace current segments in the segmentation node so they can be
           # edited
-          self.replace_segments(latest_version_path)
+          with self.LatencyMetrics.measure('toggle_segmentation_masks/replace_segments'):
+              self.replace_segments(latest_version_path)
 
       else:
           self.ui.ToggleSegmentation.setStyleSheet(
@@ -1975,13 +3091,8 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       """
       Get the latest version available as a string.
       """
-      version = self.getCurrentSegmentationVersion()
-      version_int = self.parse_version_to_int(version)
-      version_int -= 1
-      if version_int == 0:
-          version = version
-      else:
-         version = self.parse_version_int_to_str(version_int)
+      next_version, latest_version = self.get_segmentation_versions()
+      version = self.parse_version_int_to_str(max(latest_version, 1))
       Debug.print(self, f'version: {version}')
       return version
 
@@ -2002,15 +3113,15 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       return f"v{version_int:02d}"
 
   def openLoadSegmentationWindow(self):
-      segmentationInformationPath = f'{self.currentOutputPath}{os.sep}{self.currentVolumeFilename}_SegmentationInformation.csv'
-      segmentationInformation_df = None
-      if os.path.exists(segmentationInformationPath):
-          segmentationInformation_df = pd.read_csv(segmentationInformationPath)
-      else:
+      segmentationInformationPath = SegmentationInformation.get_log_path(
+          self.currentOutputPath, self.currentVolumeFilename)
+      segmentationInformation_df = SegmentationInformation.read_dataframe(
+          segmentationInformationPath)
+      if segmentationInformation_df is None:
           msg = qt.QMessageBox()
           msg.setIcon(qt.QMessageBox.Information)
           msg.setText("No saved segmentations")
-          msg.setInformativeText('There are no segmentations saved in the SegmentationInformation.csv.')
+          msg.setInformativeText('There are no segmentations saved for this case.')
           msg.setWindowTitle("No saved segmentations")
           msg.exec()
           return
@@ -2019,15 +3130,15 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       loadSegmentationWindow.show()
 
   def openCompareSegmentVersionsWindow(self):
-      segmentationInformationPath = f'{self.currentOutputPath}{os.sep}{self.currentVolumeFilename}_SegmentationInformation.csv'
-      segmentationInformation_df = None
-      if os.path.exists(segmentationInformationPath):
-          segmentationInformation_df = pd.read_csv(segmentationInformationPath)
-      else:
+      segmentationInformationPath = SegmentationInformation.get_log_path(
+          self.currentOutputPath, self.currentVolumeFilename)
+      segmentationInformation_df = SegmentationInformation.read_dataframe(
+          segmentationInformationPath)
+      if segmentationInformation_df is None:
           msg = qt.QMessageBox()
           msg.setIcon(qt.QMessageBox.Information)
           msg.setText("No saved segmentations")
-          msg.setInformativeText('There are no segmentations saved in the SegmentationInformation.csv.')
+          msg.setInformativeText('There are no segmentations saved for this case.')
           msg.setWindowTitle("No saved segmentations")
           msg.exec()
           return
@@ -2036,6 +3147,7 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       compareSegmentVersionsWindow.show()
 
   @enter_function
+  @measure_latency('compareSegmentVersions')
   def compareSegmentVersions(self, selected_label, selected_version_file_paths):
       self.labelOfCompareSegmentVersions = selected_label
       self.colorsSelectedVersionFilePathsForCompareSegmentVersions = {}
@@ -2045,10 +3157,16 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
           if selected_label == label['name']:
               selected_label_value = label['value']
 
-      slicer.mrmlScene.Clear()
-      slicer.util.loadVolume(self.currentCasePath)
-      self.VolumeNode = slicer.util.getNodesByClass('vtkMRMLScalarVolumeNode')[0]
-      
+      with self.LatencyMetrics.measure('compareSegmentVersions/prepare_scene_and_volume'):
+          self.prepare_scene_and_volume()
+      if self.can_reuse_segmentation_node():
+          # Scene recycling mode: the segments of the current case are not
+          # shown with the versions (they are created again when the
+          # comparison is cleared, see onClearCompareSegmentVersions).
+          self.segmentEditorWidget = slicer.modules.segmenteditor.widgetRepresentation().self().editor
+          self.segmentEditorWidget.setSegmentationNode(None)
+          self.segmentationNode.GetSegmentation().RemoveAllSegments()
+
       Vol_displayNode = self.VolumeNode.GetDisplayNode()
       Vol_displayNode.AutoWindowLevelOff()
       if ConfigPath.MODALITY == 'CT':
@@ -2063,13 +3181,16 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       self.resetTimer()
       
       for (segment_name, version_file_path) in selected_version_file_paths.items():
-            if 'nrrd' in ConfigPath.INPUT_FILE_EXTENSION:
-                slicer.util.loadSegmentation(version_file_path)
-                currentSegmentationNode = slicer.util.getNodesByClass('vtkMRMLSegmentationNode')[0]
-            elif 'nii' in ConfigPath.INPUT_FILE_EXTENSION:
-                labelmapVolumeNode = slicer.util.loadLabelVolume(version_file_path)
-                currentSegmentationNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
-                slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(labelmapVolumeNode, currentSegmentationNode)
+            with self.LatencyMetrics.measure('compareSegmentVersions/load_version'):
+                if 'nrrd' in ConfigPath.INPUT_FILE_EXTENSION:
+                    # The node loaded (the persistent segmentation node may
+                    # also be in the scene).
+                    currentSegmentationNode = slicer.util.loadSegmentation(
+                        version_file_path)
+                elif 'nii' in ConfigPath.INPUT_FILE_EXTENSION:
+                    labelmapVolumeNode = slicer.util.loadLabelVolume(version_file_path)
+                    currentSegmentationNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
+                    slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(labelmapVolumeNode, currentSegmentationNode)
 
             self.segmentEditorWidget = slicer.modules.segmenteditor.widgetRepresentation().self().editor
             self.segmentEditorNode =  self.segmentEditorWidget.mrmlSegmentEditorNode()
@@ -2217,27 +3338,25 @@ class SlicerCARTWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         return list_of_segment_names
 
   def onPushDefaultMin(self):
-      fresh_config = ConfigPath.open_project_config_file()
-      self.config_yaml["labels"][self.current_label_index]["lower_bound_HU"] = fresh_config["labels"][self.current_label_index]["lower_bound_HU"]
+      self.config_yaml["labels"][self.current_label_index]["lower_bound_HU"] = self.config_file_content["labels"][self.current_label_index]["lower_bound_HU"]
       self.setUpperAndLowerBoundHU(self.config_yaml["labels"][self.current_label_index]["lower_bound_HU"], self.config_yaml["labels"][self.current_label_index]["upper_bound_HU"])
 
   def onPushDefaultMax(self):
-      fresh_config = ConfigPath.open_project_config_file()
-      self.config_yaml["labels"][self.current_label_index]["upper_bound_HU"] = fresh_config["labels"][self.current_label_index]["upper_bound_HU"]
+      self.config_yaml["labels"][self.current_label_index]["upper_bound_HU"] = self.config_file_content["labels"][self.current_label_index]["upper_bound_HU"]
       self.setUpperAndLowerBoundHU(
           self.config_yaml["labels"][self.current_label_index]["lower_bound_HU"],
           self.config_yaml["labels"][self.current_label_index]["upper_bound_HU"])
 
   def onPush_ShowSegmentVersionLegendButton(self):
-      segmentationInformationPath = f'{self.currentOutputPath}{os.sep}{self.currentVolumeFilename}_SegmentationInformation.csv'
-      segmentationInformation_df = None
-      if os.path.exists(segmentationInformationPath):
-          segmentationInformation_df = pd.read_csv(segmentationInformationPath)
-      else:
+      segmentationInformationPath = SegmentationInformation.get_log_path(
+          self.currentOutputPath, self.currentVolumeFilename)
+      segmentationInformation_df = SegmentationInformation.read_dataframe(
+          segmentationInformationPath)
+      if segmentationInformation_df is None:
           msg = qt.QMessageBox()
           msg.setIcon(qt.QMessageBox.Information)
           msg.setText("No saved segmentations")
-          msg.setInformativeText('There are no segmentations saved in the SegmentationInformation.csv.')
+          msg.setInformativeText('There are no segmentations saved for this case.')
           msg.setWindowTitle("No saved segmentations")
           msg.exec()
           return
@@ -0,0 +1,362 @@
+"""
+Benchmarks of the SlicerCART code that does not need Slicer (case lists,
+volume headers, version discovery, csv files, segmentation information
+logs, case status, mask writing and normalization), run in a plain python
+process on a synthetic dataset (see synthetic_dataset.py).
+
+From the SlicerCART/src folder:
+
+    python benchmarks/run_benchmarks.py --subjects 500 --output results.json
+    python benchmarks/run_benchmarks.py --baseline results.json
+
+Each benchmark is run --repeat times (its setup is not timed); the results
+(min, median, mean and max durations in seconds) are written in json. With
+--baseline, the medians are compared with a previous result file and the
+exit code is 1 if a benchmark is slower than the tolerance allows.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from types import SimpleNamespace
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from benchmarks.synthetic_dataset import generate_dataset, write_masks
+from benchmarks import slicer_stand_in
+
+# Slicer, Qt and VTK are replaced by the stand-ins of slicer_stand_in.py
+# (when not run within Slicer).
+slicer_stand_in.install()
+
+from utils import *
+from scripts import *
+from SlicerCART import SlicerCARTWidget
+
+# Name: function(dataset) returning the function to time.
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def create_widget(dataset):
+    """
+    Widget with only the attributes used by the benchmarked methods.
+    """
+    config = copy.deepcopy(INITIAL_CONFIG_FILE)
+    widget = SlicerCARTWidget.__new__(SlicerCARTWidget)
+    widget.CurrentFolder = dataset['volumes_folder']
+    widget.outputFolder = dataset['output_folder']
+    widget.SaveQueue = None
+    widget.CaseStatusIndex = CaseStatusIndex(dataset['output_folder'])
+    widget.config_yaml = config
+    widget.annotator_name = dataset['annotators'][0]
+    widget.annotator_degree = 'Student'
+    widget.ui = SimpleNamespace(
+        RevisionStep=SimpleNamespace(currentText='Initial annotation'))
+    widget.checkboxWidgets = {
+        name: SimpleNamespace(isChecked=lambda: False)
+        for name in config.get('checkboxes', {})}
+    widget.comboboxWidgets = {
+        name: SimpleNamespace(currentText=list(options.values())[0])
+        for name, options in config.get('comboboxes', {}).items()}
+    widget.freeTextBoxes = {
+        name: SimpleNamespace(text='')
+        for name in config.get('freetextboxes', {})}
+    return widget
+
+
+def set_current_case(widget, path):
+    widget.currentCasePath = path
+    widget.currentCase = os.path.basename(path)
+    widget.updateCurrentOutputPathAndCurrentVolumeFilename()
+
+
+def get_segmented_cases_paths(dataset):
+    segmented = set(dataset['segmented_cases'])
+    return [path for relative_path, path in
+            zip(dataset['cases'], dataset['cases_paths'])
+            if relative_path in segmented]
+
+
+@benchmark('work_files_construction')
+def benchmark_work_files_construction(dataset):
+    def run():
+        WorkFiles(dataset['volumes_folder'], dataset['output_folder'],
+                  dataset['cases_paths'])
+    return run
+
+
+@benchmark('work_files_construction_with_glob')
+def benchmark_work_files_construction_with_glob(dataset):
+    def run():
+        WorkFiles(dataset['volumes_folder'], dataset['output_folder'])
+    return run
+
+
+@benchmark('work_files_check_working_list')
+def benchmark_work_files_check_working_list(dataset):
+    work_files = WorkFiles(dataset['volumes_folder'],
+                           dataset['output_folder'], dataset['cases_paths'])
+
+    def run():
+        # The lists are read from the files at each check.
+        work_files.working_list_filenames = None
+        work_files.remaining_list_filenames = None
+        assert work_files.check_working_list() != False
+    return run
+
+
+@benchmark('volume_folder_scan')
+def benchmark_volume_folder_scan(dataset):
+    def run():
+        VolumeFolderScanner(dataset['volumes_folder'],
+                            dataset['input_file_extension']).scan()
+    return run
+
+
+@benchmark('volume_header_index')
+def benchmark_volume_header_index(dataset):
+    def run():
+        VolumeHeaderIndex().index(dataset['cases_paths'])
+    return run
+
+
+@benchmark('volume_read')
+def benchmark_volume_read(dataset):
+    VolumeDiskCache.set_settings('', 0)
+    paths = get_segmented_cases_paths(dataset)
+
+    def run():
+        for path in paths:
+            VolumeLoader.read_volume(None, path)
+    return run
+
+
+@benchmark('volume_read_from_disk_cache')
+def benchmark_volume_read_from_disk_cache(dataset):
+    VolumeDiskCache.set_settings(
+        os.path.join(os.path.dirname(dataset['volumes_folder']),
+                     'volume_cache'), 10240)
+    paths = get_segmented_cases_paths(dataset)
+    # The cache is filled by a first read (not timed).
+    for path in paths:
+        VolumeLoader.read_volume(None, path)
+
+    def run():
+        for path in paths:
+            VolumeLoader.read_volume(None, path)
+    return run
+
+
+@benchmark('segmentation_version_discovery')
+def benchmark_segmentation_version_discovery(dataset):
+    widget = create_widget(dataset)
+    # The masks of each case are only listed the first time (not timed).
+    for path in dataset['cases_paths']:
+        set_current_case(widget, path)
+        widget.getCurrentSegmentationVersion()
+
+    def run():
+        for path in dataset['cases_paths']:
+            set_current_case(widget, path)
+            widget.getCurrentSegmentationVersion()
+    return run
+
+
+@benchmark('classification_csv_merge')
+def benchmark_classification_csv_merge(dataset):
+    widget = create_widget(dataset)
+    paths = get_segmented_cases_paths(dataset)
+
+    def run():
+        for path in paths:
+            set_current_case(widget, path)
+            widget.getClassificationInformation()
+    return run
+
+
+@benchmark('case_status_index_build')
+def benchmark_case_status_index_build(dataset):
+    index_path = os.path.join(dataset['output_folder'], CONF_FOLDER_NAME,
+                              CASE_STATUS_INDEX_FILENAME)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+    def run():
+        CaseStatusIndex(dataset['output_folder'])
+    return run
+
+
+@benchmark('case_status_query')
+def benchmark_case_status_query(dataset):
+    index = CaseStatusIndex(dataset['output_folder'])
+    cases = [os.path.basename(path) for path in dataset['cases_paths']]
+
+    def run():
+        statuses = index.get_statuses(dataset['annotators'][0])
+        [statuses.get(case, STATUS_NOT_SEGMENTED) for case in cases]
+    return run
+
+
+@benchmark('segmentation_information_append')
+def benchmark_segmentation_information_append(dataset):
+    paths = [SegmentationInformation.get_log_path(
+        os.path.join(dataset['output_folder'], os.path.dirname(case)),
+        os.path.basename(case))
+        for case in dataset['segmented_cases']]
+    # Logs are created from the csv files of the dataset (not timed).
+    schemas = [SegmentationInformation.get_schema(path)[1] for path in paths]
+
+    def run():
+        for path, columns in zip(paths, schemas):
+            SegmentationInformation.append(
+                path, columns, ['' for column in columns])
+    return run
+
+
+@benchmark('mask_write')
+def benchmark_mask_write(dataset):
+    folder = tempfile.mkdtemp(dir=os.path.dirname(dataset['output_folder']))
+    rng = np.random.default_rng(0)
+    array = (rng.random(dataset['shape']) < 0.1).astype(np.uint8)
+    segments = [{'id': 'Segment_1', 'name': 'Segment_1',
+                 'color': [1.0, 0.0, 0.0], 'label_value': 1}]
+
+    def run():
+        # Same writers as the save queue, with the configured compression.
+        for index in range(len(get_segmented_cases_paths(dataset))):
+            path = os.path.join(folder, f'mask_{index}')
+            SegmentationMasks.write_nifti(None, f'{path}.nii.gz', array,
+                                          np.eye(4))
+            SegmentationMasks.write_seg_nrrd(None, f'{path}.seg.nrrd', array,
+                                             np.eye(4), segments)
+    return run
+
+
+@benchmark('dtype_normalization')
+def benchmark_dtype_normalization(dataset):
+    write_masks(dataset, 'float64')
+
+    def run():
+        converted, failed = SegmentationMasks.normalize_dtypes(
+            None, dataset['output_folder'])
+        assert not failed
+    return run
+
+
+def run_benchmarks(dataset, names, repeat):
+    """
+    :return: dictionary of benchmark name: statistics of the durations.
+    """
+    results = {}
+    for name in names:
+        durations = []
+        for _ in range(repeat):
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                run = BENCHMARKS[name](dataset)
+                start = time.perf_counter()
+                run()
+                durations.append(time.perf_counter() - start)
+        results[name] = {'repeat': repeat,
+                         'min': min(durations),
+                         'median': statistics.median(durations),
+                         'mean': statistics.mean(durations),
+                         'max': max(durations)}
+        print(f'{name:<40} median {results[name]["median"] * 1000:10.2f} ms')
+    return results
+
+
+def get_dataset_parameters(dataset):
+    return {key: dataset[key] for key in
+            ['format', 'subjects', 'sessions', 'shape', 'versions']}
+
+
+def compare_with_baseline(results, dataset, baseline_path, tolerance):
+    """
+    :return: names of the benchmarks slower than the baseline by more than
+    the tolerance (fraction of the baseline median).
+    """
+    with open(baseline_path, 'r') as file:
+        content = json.load(file)
+    baseline = content['benchmarks']
+    if content.get('dataset') != get_dataset_parameters(dataset):
+        print(f'Warning: the baseline was run on another dataset '
+              f'({content.get("dataset")}).')
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['median'] / baseline[name]['median']
+        print(f'{name:<40} {ratio:6.2f}x baseline')
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark SlicerCART outside of Slicer.')
+    parser.add_argument('--subjects', type=int, default=200)
+    parser.add_argument('--sessions', type=int, default=1)
+    parser.add_argument('--shape', type=int, nargs=3, default=[32, 32, 16])
+    parser.add_argument('--format', choices=['nifti', 'nrrd'],
+                        default='nifti')
+    parser.add_argument('--versions', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    parser.add_argument('--dataset-folder',
+                        help='Folder of the synthetic dataset (default: '
+                             'temporary folder deleted at the end).')
+    parser.add_argument('--output', help='Json file of the results.')
+    parser.add_argument('--baseline', help='Json file of previous results.')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    folder = args.dataset_folder or tempfile.mkdtemp(prefix='slicercart_')
+    try:
+        print(f'Generating dataset in {folder}')
+        dataset = generate_dataset(folder, args.subjects, args.sessions,
+                                   tuple(args.shape), args.format,
+                                   args.versions)
+        ConfigPath.INPUT_FILE_EXTENSION = dataset['input_file_extension']
+        results = run_benchmarks(dataset, args.benchmarks, args.repeat)
+    finally:
+        if args.dataset_folder is None:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'date': datetime.today().strftime('%Y-%m-%d %H:%M:%S'),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'dataset': get_dataset_parameters(dataset),
+                       'benchmarks': results}, file, indent=2)
+        print(f'Results written in {args.output}')
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, dataset, args.baseline,
+                                            args.tolerance)
+        if regressions:
+            print(f'Slower than baseline: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
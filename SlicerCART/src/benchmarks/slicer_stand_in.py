@@ -0,0 +1,222 @@
+"""
+Stand-ins for the Slicer, Qt and VTK APIs used at import time by SlicerCART
+and by the code the benchmarks run, so that the benchmarks can import
+SlicerCART in a plain python process.
+
+Opt-in: only installed by an explicit call to install() before importing
+SlicerCART (see run_benchmarks.py); SlicerCART never installs them itself.
+
+Only the names listed here exist:
+    - message boxes print their title and text instead of being displayed,
+    and return the negative answer (No) when they ask a question (so the
+    check of the python packages at import only reports missing packages:
+    install them with pip);
+    - node lookups in the scene find no node;
+    - base classes (widgets, list model, scripted module classes) can be
+    subclassed but do nothing.
+Any other attribute of slicer, qt or vtk (or of a stand-in class) raises
+AttributeError, so a code path using the Slicer API outside of what is
+listed here fails instead of silently running on stand-ins.
+"""
+import importlib.util
+import sys
+import types
+
+
+def get_missing_attribute_message(owner, name):
+    return (f'{owner}.{name} is not available outside of Slicer (no '
+            f'stand-in in benchmarks/slicer_stand_in.py)')
+
+
+class StandInType(type):
+    """
+    Metaclass of the stand-in classes: undefined class attributes raise an
+    AttributeError naming the missing stand-in.
+    """
+    def __getattr__(cls, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        raise AttributeError(get_missing_attribute_message(cls.__name__,
+                                                           name))
+
+
+class StandIn(metaclass=StandInType):
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def create_class(name, **constants):
+    """
+    Create an empty stand-in class with the given class constants.
+    """
+    return StandInType(name, (StandIn,), dict(constants))
+
+
+class QMessageBox(StandIn):
+    # Values of the Qt enums (combined with | for the buttons).
+    Ok = 0x00000400
+    Yes = 0x00004000
+    No = 0x00010000
+    Cancel = 0x00400000
+    NoIcon = 0
+    Information = 1
+    Warning = 2
+    Critical = 3
+    Question = 4
+
+    def __init__(self, *args, **kwargs):
+        self.title = ''
+        self.text = ''
+        self.informative_text = ''
+        self.buttons = 0
+
+    def setWindowTitle(self, title):
+        self.title = title
+
+    def setText(self, text):
+        self.text = text
+
+    def setInformativeText(self, text):
+        self.informative_text = text
+
+    def setDetailedText(self, text):
+        pass
+
+    def setIcon(self, icon):
+        pass
+
+    def setStandardButtons(self, buttons):
+        self.buttons = buttons
+
+    def addButton(self, button, *args):
+        self.buttons |= button
+
+    def exec(self):
+        QMessageBox.show_message(self.title, self.text,
+                                 self.informative_text)
+        return self.get_answer(self.buttons)
+
+    exec_ = exec
+
+    @staticmethod
+    def get_answer(buttons):
+        if buttons & QMessageBox.No:
+            return QMessageBox.No
+        if buttons & QMessageBox.Cancel:
+            return QMessageBox.Cancel
+        return QMessageBox.Ok
+
+    @staticmethod
+    def show_message(title, text, informative_text=''):
+        print(f'[{title}] {text} {informative_text}'.rstrip())
+
+    @staticmethod
+    def question(parent, title, text, buttons=Yes | No, *args):
+        QMessageBox.show_message(title, text)
+        return QMessageBox.get_answer(buttons)
+
+    @staticmethod
+    def information(parent, title, text, *args):
+        QMessageBox.show_message(title, text)
+        return QMessageBox.Ok
+
+    warning = information
+    critical = information
+
+
+class MRMLScene(StandIn):
+    """
+    Empty scene: no node is found.
+    """
+    def GetFirstNodeByClass(self, class_name):
+        return None
+
+    def GetNodesByName(self, name):
+        return []
+
+    def GetNumberOfNodesByClass(self, class_name):
+        return 0
+
+    def GetNodeByID(self, node_id):
+        return None
+
+    def RemoveNode(self, node):
+        pass
+
+    def Clear(self, *args):
+        pass
+
+
+def create_module(name, attributes):
+    """
+    Create a stand-in module with the given attributes only.
+    """
+    module = types.ModuleType(name)
+
+    def get_missing_attribute(attribute):
+        if attribute.startswith('__'):
+            raise AttributeError(attribute)
+        raise AttributeError(get_missing_attribute_message(name, attribute))
+
+    module.__getattr__ = get_missing_attribute
+    for attribute, value in attributes.items():
+        setattr(module, attribute, value)
+    return module
+
+
+def create_slicer_modules():
+    # Names exported by "from slicer.ScriptedLoadableModule import *".
+    scripted_loadable_module_classes = {
+        name: create_class(name) for name in
+        ['ScriptedLoadableModule', 'ScriptedLoadableModuleWidget',
+         'ScriptedLoadableModuleLogic', 'ScriptedLoadableModuleTest']}
+    scripted_loadable_module = create_module(
+        'slicer.ScriptedLoadableModule', scripted_loadable_module_classes)
+    scripted_loadable_module.__all__ = list(scripted_loadable_module_classes)
+
+    util = create_module('slicer.util', {
+        'VTKObservationMixin': create_class('VTKObservationMixin'),
+        'mainWindow': lambda *args, **kwargs: None,
+        'getNodesByClass': lambda class_name, *args: [],
+        'getNode': lambda *args, **kwargs: None})
+    slicer = create_module('slicer', {
+        'ScriptedLoadableModule': scripted_loadable_module,
+        'util': util,
+        'mrmlScene': MRMLScene()})
+    return {'slicer': slicer,
+            'slicer.ScriptedLoadableModule': scripted_loadable_module,
+            'slicer.util': util}
+
+
+def create_qt_module():
+    return create_module('qt', {
+        'QMessageBox': QMessageBox,
+        'QWidget': create_class('QWidget'),
+        'QAbstractListModel': create_class('QAbstractListModel'),
+        'QApplication': create_class('QApplication'),
+        'QPalette': create_class('QPalette'),
+        # Values of the Qt enums used in class definitions.
+        'Qt': create_class('Qt', DisplayRole=0, ToolTipRole=3,
+                           ForegroundRole=9, UserRole=0x0100,
+                           AscendingOrder=0, DescendingOrder=1)})
+
+
+def create_vtk_module():
+    return create_module('vtk', {
+        'VTK_UNSIGNED_CHAR': 3,
+        'vtkInteractorStyleImage': create_class('vtkInteractorStyleImage')})
+
+
+def install():
+    """
+    Register the stand-ins of slicer and qt in sys.modules, and the one of
+    vtk if vtk is not installed (vtk can be installed with pip). Must be
+    called before importing SlicerCART; does nothing for modules already
+    imported (e.g. within Slicer).
+    """
+    modules = create_slicer_modules()
+    modules['qt'] = create_qt_module()
+    if importlib.util.find_spec('vtk') is None:
+        modules['vtk'] = create_vtk_module()
+    for name, module in modules.items():
+        sys.modules.setdefault(name, module)
@@ -0,0 +1,240 @@
+"""
+Generator of synthetic BIDS datasets with a SlicerCART output folder, used by
+the benchmarks (see run_benchmarks.py). Can also be used alone to create a
+dataset to try the module on:
+
+    python synthetic_dataset.py /tmp/dataset --subjects 500 --format nifti
+
+The generated folder contains:
+    volumes/sub-XXX[/ses-YY]/anat/sub-XXX[_ses-YY]_T1w.nii.gz (or .nrrd)
+    output/ (same hierarchy as volumes) with, for the segmented cases, the
+        masks of each version (_vNN.nii.gz or _vNN.seg.nrrd), the
+        _SegmentationInformation.csv and _ClassificationInformation.csv files
+    output/working_list.yaml and output/remaining_list.yaml
+"""
+import argparse
+import csv
+import os
+from datetime import datetime
+
+import nibabel as nib
+import nrrd
+import numpy as np
+import yaml
+
+CONFIG_FILE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    'configuration_config.yml')
+
+VOLUME_EXTENSIONS = {'nifti': '.nii.gz', 'nrrd': '.nrrd'}
+MASK_EXTENSIONS = {'nifti': '.nii.gz', 'nrrd': '.seg.nrrd'}
+# Patterns of the input_filetype configuration value for each format.
+INPUT_FILE_EXTENSIONS = {'nifti': '*.nii.gz', 'nrrd': '*.nrrd'}
+
+
+def get_case_relative_paths(number_of_subjects, number_of_sessions):
+    """
+    :return: relative paths (without extension) of the volumes of the
+    dataset, e.g. sub-001/ses-01/anat/sub-001_ses-01_T1w.
+    """
+    relative_paths = []
+    for subject in range(1, number_of_subjects + 1):
+        subject_name = f'sub-{subject:03d}'
+        if number_of_sessions <= 1:
+            relative_paths.append(os.path.join(
+                subject_name, 'anat', f'{subject_name}_T1w'))
+            continue
+        for session in range(1, number_of_sessions + 1):
+            session_name = f'ses-{session:02d}'
+            relative_paths.append(os.path.join(
+                subject_name, session_name, 'anat',
+                f'{subject_name}_{session_name}_T1w'))
+    return relative_paths
+
+
+def write_volume(path, data, file_format):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if file_format == 'nifti':
+        nib.save(nib.Nifti1Image(data, np.eye(4)), path)
+    else:
+        nrrd.write(path, data, header={'space': 'left-posterior-superior',
+                                       'space directions': np.eye(3),
+                                       'space origin': np.zeros(3)})
+
+
+def write_masks(dataset, dtype='float64'):
+    """
+    Write the masks of all versions of the segmented cases, with voxels of
+    the given type (masks saved by previous versions of SlicerCART were not
+    always uint8). Also used by the benchmarks to restore the masks before
+    timing the dtype normalization.
+    """
+    rng = np.random.default_rng(dataset['seed'])
+    mask_extension = MASK_EXTENSIONS[dataset['format']]
+    for relative_path in dataset['segmented_cases']:
+        for version in range(1, dataset['versions'] + 1):
+            path = os.path.join(dataset['output_folder'],
+                                f'{relative_path}_v{version:02d}'
+                                f'{mask_extension}')
+            data = (rng.random(dataset['shape']) < 0.1).astype(dtype)
+            write_volume(path, data, dataset['format'])
+
+
+def get_classification_columns(config):
+    """
+    Columns of the classification labels of the configuration, named as the
+    module names them in _ClassificationInformation.csv files.
+    :return: dictionary of column name: value written.
+    """
+    columns = {}
+    for label in config.get('checkboxes', {}).values():
+        columns[str({label: 'checkboxes'})] = 'No'
+    for name, options in config.get('comboboxes', {}).items():
+        columns[str({name: 'comboboxes'})] = list(options.values())[0]
+    for label in config.get('freetextboxes', {}).values():
+        columns[str({label: 'freetextboxes'})] = ''
+    return columns
+
+
+def write_information_files(dataset, config):
+    """
+    Write the _SegmentationInformation.csv and _ClassificationInformation.csv
+    files of the segmented cases (one row per version, annotators in turn).
+    """
+    label_names = [label['name'] for label in config['labels']]
+    segmentation_header = (['Volume filename', 'Segmentation version',
+                            'Annotator Name', 'Annotator degree',
+                            'Revision step', 'Date and time', 'Duration']
+                           + [f'{name} duration' for name in label_names])
+    classification_columns = get_classification_columns(config)
+    classification_header = (['Volume filename', 'Classification version',
+                              'Annotator Name', 'Annotator degree',
+                              'Revision step', 'Date and time']
+                             + list(classification_columns))
+    date = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+    volume_extension = VOLUME_EXTENSIONS[dataset['format']]
+
+    for relative_path in dataset['segmented_cases']:
+        volume_filename = os.path.basename(relative_path) + volume_extension
+        segmentation_rows = []
+        classification_rows = []
+        for version in range(1, dataset['versions'] + 1):
+            annotator = dataset['annotators'][
+                (version - 1) % len(dataset['annotators'])]
+            common = [annotator, 'Student', 'Initial annotation', date]
+            segmentation_rows.append(
+                [volume_filename, f'v{version:02d}'] + common + ['120.0']
+                + ['10.0'] * len(label_names))
+            classification_rows.append(
+                [volume_filename, f'v{version:02d}'] + common
+                + list(classification_columns.values()))
+
+        output_path = os.path.join(dataset['output_folder'], relative_path)
+        for suffix, header, rows in [
+                ('_SegmentationInformation.csv', segmentation_header,
+                 segmentation_rows),
+                ('_ClassificationInformation.csv', classification_header,
+                 classification_rows)]:
+            with open(output_path + suffix, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(header)
+                writer.writerows(rows)
+
+
+def write_case_lists(dataset, config):
+    volume_extension = VOLUME_EXTENSIONS[dataset['format']]
+    segmented = set(dataset['segmented_cases'])
+    working_list = [os.path.basename(relative_path) + volume_extension
+                    for relative_path in dataset['cases']]
+    remaining_list = [os.path.basename(relative_path) + volume_extension
+                      for relative_path in dataset['cases']
+                      if relative_path not in segmented]
+    for filename, cases in [(config['working_list_filename'], working_list),
+                            (config['remaining_list_filename'],
+                             remaining_list)]:
+        with open(os.path.join(dataset['output_folder'], filename),
+                  'w') as file:
+            yaml.dump({'CASES': cases}, file)
+
+
+def generate_dataset(folder, number_of_subjects=100, number_of_sessions=1,
+                     shape=(32, 32, 16), file_format='nifti', versions=2,
+                     segmented_fraction=0.5, annotators=('annotator_1',
+                                                         'annotator_2'),
+                     mask_dtype='float64', seed=0, config_path=None):
+    """
+    Generate a synthetic dataset.
+    :param folder: folder where volumes/ and output/ are created.
+    :param number_of_subjects: number of sub-XXX folders.
+    :param number_of_sessions: number of ses-YY folders per subject (no
+    session folder if 1).
+    :param shape: shape of the volumes and masks.
+    :param file_format: 'nifti' or 'nrrd'.
+    :param versions: number of mask versions of each segmented case.
+    :param segmented_fraction: fraction of the cases already segmented.
+    :param annotators: annotators of the versions (in turn).
+    :param mask_dtype: voxel type of the masks.
+    :param config_path: configuration file (default: the module one).
+    :return: dictionary describing the dataset (folders, parameters, cases
+    relative paths and volume paths).
+    """
+    with open(config_path or CONFIG_FILE_PATH, 'r') as file:
+        config = yaml.safe_load(file)
+
+    cases = get_case_relative_paths(number_of_subjects, number_of_sessions)
+    volumes_folder = os.path.join(folder, 'volumes')
+    output_folder = os.path.join(folder, 'output')
+    os.makedirs(output_folder, exist_ok=True)
+
+    dataset = {
+        'volumes_folder': volumes_folder,
+        'output_folder': output_folder,
+        'format': file_format,
+        'input_file_extension': INPUT_FILE_EXTENSIONS[file_format],
+        'subjects': number_of_subjects,
+        'sessions': number_of_sessions,
+        'shape': list(shape),
+        'versions': versions,
+        'annotators': list(annotators),
+        'seed': seed,
+        'cases': cases,
+        'segmented_cases': cases[:int(len(cases) * segmented_fraction)],
+        'cases_paths': [os.path.join(volumes_folder, relative_path)
+                        + VOLUME_EXTENSIONS[file_format]
+                        for relative_path in cases]}
+
+    rng = np.random.default_rng(seed)
+    for path in dataset['cases_paths']:
+        data = rng.integers(0, 1000, size=shape, dtype=np.int16)
+        write_volume(path, data, file_format)
+    write_masks(dataset, mask_dtype)
+    write_information_files(dataset, config)
+    write_case_lists(dataset, config)
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic BIDS dataset with a SlicerCART '
+                    'output folder.')
+    parser.add_argument('folder')
+    parser.add_argument('--subjects', type=int, default=100)
+    parser.add_argument('--sessions', type=int, default=1)
+    parser.add_argument('--shape', type=int, nargs=3, default=[32, 32, 16])
+    parser.add_argument('--format', choices=list(VOLUME_EXTENSIONS),
+                        default='nifti')
+    parser.add_argument('--versions', type=int, default=2)
+    parser.add_argument('--segmented-fraction', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    dataset = generate_dataset(args.folder, args.subjects, args.sessions,
+                               tuple(args.shape), args.format, args.versions,
+                               args.segmented_fraction, seed=args.seed)
+    print(f'{len(dataset["cases"])} volumes and '
+          f'{len(dataset["segmented_cases"]) * args.versions} masks written '
+          f'in {args.folder}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+from utils import *
+
+BIDS_VALIDATION_CACHE_FILENAME = 'bids_validation_cache.json'
+
+class BidsValidation():
+    """
+    This class checks that the volumes of the volumes folder follow the BIDS
+    format. Results are cached by relative path and modification time (in
+    the _conf folder of the output folder), so only new or modified files
+    are validated.
+    """
+
+    def __init__(self, volumes_folder, extension):
+        self.volumes_folder = volumes_folder
+        # e.g. '*.nii.gz' -> '.nii.gz'
+        self.file_ending = extension.split('*')[-1]
+        self.validator = bids_validator.BIDSValidator()
+        # Relative path: {'mtime', 'is_valid'}
+        self.cache = {}
+
+    def get_cache_path(self, outputFolder):
+        return os.path.join(outputFolder, CONF_FOLDER_NAME,
+                            BIDS_VALIDATION_CACHE_FILENAME)
+
+    @enter_function
+    def load_cache(self, outputFolder):
+        cache_path = self.get_cache_path(outputFolder)
+        if not os.path.exists(cache_path):
+            return
+        try:
+            with open(cache_path, 'r') as file:
+                content = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f'Ignoring BIDS validation cache {cache_path}: {e}')
+            return
+        if content.get('volumes_folder') == self.volumes_folder:
+            self.cache = content['files']
+
+    @enter_function
+    def save_cache(self, outputFolder):
+        cache_path = self.get_cache_path(outputFolder)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f'{cache_path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump({'volumes_folder': self.volumes_folder,
+                       'files': self.cache}, file)
+        os.replace(temp_path, cache_path)
+
+    def get_bids_path(self, path):
+        """
+        Path given to the BIDS validator: path from the first subject folder
+        (e.g. /sub-01/anat/sub-01_T1w.nii.gz).
+        """
+        return '/sub' + path.replace(os.sep, '/').split('/sub', 1)[1]
+
+    def get_volume_paths(self):
+        volume_paths = []
+        for subdir, dirs, files in os.walk(self.volumes_folder):
+            for file in files:
+                if file.endswith(self.file_ending):
+                    volume_paths.append(os.path.join(subdir, file))
+        return volume_paths
+
+    def validate_file(self, path):
+        """
+        Validate one volume, unless the cached result is still valid.
+        :return: relative path and cache entry of the volume.
+        """
+        relative_path = os.path.relpath(path, self.volumes_folder)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            # e.g. removed or not accessible since listed: validated as a
+            # changed file, and validated again next time (no mtime).
+            mtime = None
+
+        cached = self.cache.get(relative_path)
+        if (cached is not None and mtime is not None
+                and cached['mtime'] == mtime):
+            return relative_path, cached
+
+        try:
+            is_valid = bool(self.validator.is_bids(self.get_bids_path(path)))
+        except Exception:
+            # e.g. no subject folder in the path.
+            is_valid = False
+        return relative_path, {'mtime': mtime, 'is_valid': is_valid}
+
+    @enter_function
+    def validate(self):
+        """
+        Validate all volumes of the volumes folder.
+        :return: sorted list of the relative paths of invalid volumes.
+        """
+        # Files removed since the last validation leave the cache.
+        self.cache = dict(self.validate_file(path)
+                          for path in self.get_volume_paths())
+
+        return sorted(relative_path for relative_path, entry in
+                      self.cache.items() if not entry['is_valid'])
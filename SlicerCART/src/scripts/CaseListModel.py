@@ -0,0 +1,117 @@
+from utils import *
+from scripts.CaseStatusIndex import *
+
+# Roles of the data used to sort and filter the case list (see
+# VolumeHeaderIndex).
+CASE_SIZE_ROLE = qt.Qt.UserRole + 1
+CASE_MODALITY_ROLE = qt.Qt.UserRole + 2
+
+# Orders of the case list view: sort role and order (None for the order of
+# the cases, which is also the navigation order of Previous and Next).
+CASE_LIST_SORT_ORDERS = {
+    'Worklist order': None,
+    'Smallest first': (CASE_SIZE_ROLE, qt.Qt.AscendingOrder),
+    'Largest first': (CASE_SIZE_ROLE, qt.Qt.DescendingOrder),
+    'By modality': (CASE_MODALITY_ROLE, qt.Qt.AscendingOrder)}
+CASE_LIST_ALL_MODALITIES = 'All modalities'
+
+class CaseListModel(qt.QAbstractListModel):
+    """
+    This class is the model of the case list view. Rows are given to the
+    view on demand (only the visible ones are requested), so the list does
+    not create one widget item per case, and only rows whose status changed
+    are repainted when statuses are updated.
+
+    The header information of the volumes (see VolumeHeaderIndex) is shown
+    as tooltip and given to the proxy models with CASE_SIZE_ROLE and
+    CASE_MODALITY_ROLE to sort and filter the cases.
+    """
+
+    def __init__(self, foreground):
+        qt.QAbstractListModel.__init__(self)
+        self.case_ids = []
+        self.statuses = []
+        self.headers = []
+        self.descriptions = []
+        self.colors = {
+            STATUS_NOT_SEGMENTED: qt.QColor(foreground),
+            STATUS_SEGMENTED_BY_OTHER_ANNOTATOR: qt.QColor('orange'),
+            STATUS_SEGMENTED_BY_ANNOTATOR: qt.QColor('green')}
+
+    def rowCount(self, parent=None):
+        if parent is not None and parent.isValid():
+            return 0
+        return len(self.case_ids)
+
+    def data(self, index, role=qt.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.case_ids):
+            return None
+        if role == qt.Qt.DisplayRole:
+            return self.case_ids[index.row()]
+        if role == qt.Qt.ForegroundRole:
+            return self.colors[self.statuses[index.row()]]
+        if role == qt.Qt.ToolTipRole:
+            return self.descriptions[index.row()] or None
+
+        header = self.headers[index.row()] or {}
+        if role == CASE_SIZE_ROLE:
+            # Memory size if known, file size otherwise (-1 if not indexed).
+            return header.get('nbytes', header.get('size', -1))
+        if role == CASE_MODALITY_ROLE:
+            return header.get('modality', '')
+        return None
+
+    def set_cases(self, cases):
+        """
+        Replace the cases of the list (all not segmented).
+        :param cases: list of volume filenames.
+        """
+        self.beginResetModel()
+        self.case_ids = [case.split('.')[0] for case in cases]
+        self.statuses = [STATUS_NOT_SEGMENTED] * len(cases)
+        self.headers = [None] * len(cases)
+        self.descriptions = [''] * len(cases)
+        self.endResetModel()
+
+    def set_statuses(self, statuses):
+        """
+        Update the status of the cases and notify the view of the rows that
+        changed only (consecutive changed rows are notified together).
+        :param statuses: list of statuses, in the same order as the cases.
+        """
+        if len(statuses) != len(self.statuses):
+            self.beginResetModel()
+            self.statuses = list(statuses)
+            self.endResetModel()
+            return
+
+        first_changed = None
+        for row in range(len(self.statuses) + 1):
+            changed = (row < len(self.statuses)
+                       and self.statuses[row] != statuses[row])
+            if changed:
+                self.statuses[row] = statuses[row]
+                if first_changed is None:
+                    first_changed = row
+            elif first_changed is not None:
+                self.dataChanged.emit(self.index(first_changed, 0),
+                                      self.index(row - 1, 0))
+                first_changed = None
+
+    def set_headers(self, headers, descriptions):
+        """
+        Update the header information of the cases.
+        :param headers: list of header dictionaries (None if not indexed), in
+        the same order as the cases.
+        :param descriptions: list of header descriptions (tooltips).
+        """
+        if len(headers) != len(self.case_ids):
+            return
+        self.headers = list(headers)
+        self.descriptions = list(descriptions)
+        if self.case_ids:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(len(self.case_ids) - 1, 0))
+
+    def get_status(self, row):
+        return self.statuses[row]
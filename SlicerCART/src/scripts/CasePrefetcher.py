@@ -0,0 +1,207 @@
+from utils import *
+from scripts.VolumeLoader import *
+
+class CasePrefetcher():
+    """
+    This class reads and decompresses the next cases of the worklist in a
+    background thread, so that a case can be displayed from memory instead of
+    being read from disk when the annotator moves to it.
+
+    Volumes read are kept in a least recently used cache bounded in memory.
+    Compressed volumes that do not fit in the memory budget are only read to
+    add them (or their preview) to the volume disk cache, so they can be
+    displayed progressively the first time they are opened.
+    """
+
+    def __init__(self, number_of_cases, memory_budget_mb):
+        self.number_of_cases = number_of_cases
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+
+        # Ordered from least recently used to most recently used.
+        self.cache = OrderedDict()
+        self.cache_nbytes = 0
+        self.lock = RLock()
+
+        # Paths to prefetch, in order of priority. Replaced at each case
+        # change so that outdated requests are dropped.
+        self.wanted_paths = []
+        # Paths of the cases that do not fit in the memory budget, whose
+        # preview is built in the volume disk cache (see build_preview).
+        self.preview_paths = []
+        self.wake_up = threading.Event()
+        self.stop_requested = False
+
+        self.worker = threading.Thread(target=self.run,
+                                       name='SlicerCARTPrefetcher',
+                                       daemon=True)
+        self.worker.start()
+
+    def set_settings(self, number_of_cases, memory_budget_mb):
+        """
+        Update the number of cases to prefetch and the memory budget.
+        """
+        with self.lock:
+            self.number_of_cases = number_of_cases
+            self.memory_budget = memory_budget_mb * 1024 * 1024
+            self.wanted_paths = self.wanted_paths[:self.number_of_cases]
+            self.preview_paths = self.preview_paths[:self.number_of_cases]
+            self.evict(keep_wanted=False)
+
+    def schedule(self, paths, nbytes=None):
+        """
+        Request the prefetch of the given case paths (in order of priority).
+        Only the first number_of_cases paths are read.
+        :param paths: list of volume paths of the next cases.
+        :param nbytes: dictionary of path: expected size in memory (None if
+        not known, see VolumeHeaderIndex). Cases known not to fit in the
+        memory budget next to the cases of higher priority are not kept in
+        memory: only their preview is built.
+        """
+        nbytes = nbytes or {}
+        with self.lock:
+            wanted_paths = []
+            preview_paths = []
+            wanted_nbytes = 0
+            for path in paths[:self.number_of_cases]:
+                expected_nbytes = nbytes.get(path)
+                if expected_nbytes is not None:
+                    if wanted_nbytes + expected_nbytes > self.memory_budget:
+                        preview_paths.append(path)
+                        continue
+                    wanted_nbytes += expected_nbytes
+                wanted_paths.append(path)
+            self.wanted_paths = wanted_paths
+            self.preview_paths = preview_paths
+        self.wake_up.set()
+
+    def get(self, path):
+        """
+        Get a prefetched volume.
+        :param path: path of the volume.
+        :return: volume dictionary (see VolumeLoader.read_volume) or None if
+        the volume is not in the cache or has changed on disk since read.
+        """
+        with self.lock:
+            volume = self.cache.get(path)
+            if volume is None:
+                return None
+
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if (stat is None or stat.st_size != volume['size']
+                    or stat.st_mtime != volume['mtime']):
+                self.remove(path)
+                return None
+
+            self.cache.move_to_end(path)
+            return volume
+
+    def remove(self, path):
+        """
+        Remove a volume from the cache.
+        """
+        with self.lock:
+            volume = self.cache.pop(path, None)
+            if volume is not None:
+                self.cache_nbytes -= volume['nbytes']
+
+    def evict(self, extra_nbytes=0, keep_wanted=True):
+        """
+        Remove least recently used volumes until the cache (plus extra_nbytes)
+        fits in the memory budget.
+        :param extra_nbytes: size of a volume about to be added.
+        :param keep_wanted: if True, volumes currently wanted are not removed.
+        """
+        with self.lock:
+            for path in list(self.cache):
+                if self.cache_nbytes + extra_nbytes <= self.memory_budget:
+                    return
+                if keep_wanted and path in self.wanted_paths:
+                    continue
+                self.remove(path)
+
+    def get_next_wanted_path(self):
+        """
+        Get the first wanted path that is not already cached.
+        """
+        with self.lock:
+            for path in self.wanted_paths:
+                if path not in self.cache:
+                    return path
+        return None
+
+    def get_next_preview_path(self):
+        """
+        Get (and remove from the list) the next path whose preview is
+        requested.
+        """
+        with self.lock:
+            if self.preview_paths:
+                return self.preview_paths.pop(0)
+        return None
+
+    def build_preview(self, path):
+        """
+        Read a compressed volume that does not fit in the memory budget, so
+        that VolumeLoader.read_volume adds it (or only its preview if too
+        large) to the volume disk cache. The voxels are not kept.
+        """
+        if (not VolumeDiskCache.is_enabled()
+                or VolumeDiskCache.get_entry(path, VOLUME_PREVIEW_SUFFIX)
+                is not None
+                or not VolumeLoader.is_compressed(self, path)):
+            return
+        try:
+            VolumeLoader.read_volume(self, path)
+        except Exception as e:
+            print(f'Preview of {path} failed: {e}')
+
+    def run(self):
+        """
+        Background thread loop: read wanted volumes one at a time, then
+        build the previews of the cases that do not fit in memory.
+        """
+        while not self.stop_requested:
+            path = self.get_next_wanted_path()
+            if path is None:
+                preview_path = self.get_next_preview_path()
+                if preview_path is not None:
+                    self.build_preview(preview_path)
+                    continue
+                self.wake_up.wait()
+                self.wake_up.clear()
+                continue
+
+            try:
+                volume = VolumeLoader.read_volume(self, path)
+            except Exception as e:
+                print(f'Prefetch of {path} failed: {e}')
+                volume = None
+
+            with self.lock:
+                if path not in self.wanted_paths:
+                    # Case list moved on while reading.
+                    continue
+                if volume is not None:
+                    self.evict(extra_nbytes=volume['nbytes'])
+                if (volume is None or self.cache_nbytes + volume['nbytes']
+                        > self.memory_budget):
+                    # Cannot be cached (next to the volumes of higher
+                    # priority): do not try again for this request.
+                    self.wanted_paths.remove(path)
+                    continue
+                self.cache[path] = volume
+                self.cache_nbytes += volume['nbytes']
+
+    def shutdown(self):
+        """
+        Stop the background thread and release cached volumes.
+        """
+        self.stop_requested = True
+        self.wake_up.set()
+        with self.lock:
+            self.preview_paths = []
+            self.cache.clear()
+            self.cache_nbytes = 0
@@ -0,0 +1,205 @@
+from utils import *
+from scripts.SegmentationInformation import *
+
+CASE_STATUS_INDEX_FILENAME = 'case_status.sqlite'
+
+# Segmentation status of a case for an annotator (colors of the case list).
+STATUS_NOT_SEGMENTED = 0
+STATUS_SEGMENTED_BY_OTHER_ANNOTATOR = 1
+STATUS_SEGMENTED_BY_ANNOTATOR = 2
+
+# Kinds of versions counted for each case.
+VERSION_KIND_SEGMENTATION = 'segmentation'
+VERSION_KIND_CLASSIFICATION = 'classification'
+
+class CaseStatusIndex():
+    """
+    This class keeps in the _conf folder of the output folder an index
+    (SQLite database) of the segmentations saved for the whole project, so
+    that the status of all cases is obtained with one query instead of
+    reading the segmentation information of each case.
+
+    The index is built once from the existing segmentation information
+    files, then updated at each save. It also keeps, for each case, the
+    next version to save and the latest version saved, so versions are
+    allocated without listing the output folder. A new connection is opened
+    for each operation so that the index can be updated from the save queue
+    thread.
+    """
+
+    def __init__(self, outputFolder):
+        self.outputFolder = outputFolder
+        self.index_path = os.path.join(outputFolder, CONF_FOLDER_NAME,
+                                       CASE_STATUS_INDEX_FILENAME)
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS segmentations ('
+                    'volume_filename TEXT NOT NULL, '
+                    'annotator_name TEXT NOT NULL, '
+                    'segmentation_version TEXT NOT NULL, '
+                    'PRIMARY KEY (volume_filename, annotator_name, '
+                    'segmentation_version))')
+                # Keyed on the relative path: cases may have the same
+                # filename in different subfolders.
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS versions ('
+                    'case_relative_path TEXT NOT NULL, '
+                    'kind TEXT NOT NULL, '
+                    'next_version INTEGER NOT NULL, '
+                    'latest_version INTEGER NOT NULL, '
+                    'PRIMARY KEY (case_relative_path, kind))')
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS metadata ('
+                    'key TEXT PRIMARY KEY, value TEXT)')
+            is_built = connection.execute(
+                "SELECT value FROM metadata WHERE key = 'built_from_csv'"
+            ).fetchone() is not None
+        finally:
+            connection.close()
+
+        if not is_built:
+            self.build_from_information_files()
+
+    def connect(self):
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    @enter_function
+    def build_from_information_files(self):
+        """
+        Fill the index from the segmentation information files of the output
+        folder (projects created before the index existed): the logs, and
+        the _SegmentationInformation.csv files of cases without log.
+        """
+        rows = []
+        for subdir, dirs, files in os.walk(self.outputFolder):
+            dirs[:] = [d for d in dirs if d != CONF_FOLDER_NAME]
+            for file in files:
+                path = os.path.join(subdir, file)
+                try:
+                    if file.endswith(SEGMENTATION_INFORMATION_LOG_SUFFIX):
+                        information = SegmentationInformation.read_rows(
+                            path)[1]
+                    elif (file.endswith(SEGMENTATION_INFORMATION_CSV_SUFFIX)
+                          and not os.path.exists(path.replace(
+                            SEGMENTATION_INFORMATION_CSV_SUFFIX,
+                            SEGMENTATION_INFORMATION_LOG_SUFFIX))):
+                        with open(path, 'r', newline='') as f:
+                            information = list(csv.DictReader(f))
+                    else:
+                        continue
+                except (OSError, ValueError, KeyError, csv.Error) as e:
+                    print(f'Skipping {file} in case status index: {e}')
+                    continue
+                for row in information:
+                    rows.append((row.get('Volume filename'),
+                                 row.get('Annotator Name'),
+                                 row.get('Segmentation version')))
+
+        rows = [row for row in rows if None not in row]
+
+        connection = self.connect()
+        try:
+            with connection:
+                connection.executemany(
+                    'INSERT OR IGNORE INTO segmentations VALUES (?, ?, ?)',
+                    rows)
+                connection.execute(
+                    "INSERT OR REPLACE INTO metadata VALUES "
+                    "('built_from_csv', ?)",
+                    (datetime.today().strftime('%Y-%m-%d %H:%M:%S'),))
+        finally:
+            connection.close()
+
+    def add_segmentation(self, volume_filename, annotator_name,
+                         segmentation_version):
+        """
+        Record a saved segmentation. Recording the same save twice has no
+        effect (e.g. save queue job resumed after a crash).
+        """
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute(
+                    'INSERT OR IGNORE INTO segmentations VALUES (?, ?, ?)',
+                    (volume_filename, annotator_name, segmentation_version))
+        finally:
+            connection.close()
+
+    def get_versions(self, case_relative_path, kind):
+        """
+        :param case_relative_path: path of the case relative to the output
+        folder, without extension (e.g. sub-01/anat/sub-01_T1w).
+        :param kind: VERSION_KIND_SEGMENTATION or VERSION_KIND_CLASSIFICATION.
+        :return: next version number and latest saved version number (0 if
+        none) of a case, or None if the versions of the case are not in the
+        index yet.
+        """
+        connection = self.connect()
+        try:
+            row = connection.execute(
+                'SELECT next_version, latest_version FROM versions '
+                'WHERE case_relative_path = ? AND kind = ?',
+                (case_relative_path, kind)).fetchone()
+        finally:
+            connection.close()
+        return None if row is None else tuple(row)
+
+    def update_versions(self, case_relative_path, kind, next_version,
+                        latest_version):
+        """
+        Update the versions of a case (atomically). Versions never decrease,
+        so updates from the save queue thread and the widget can be done in
+        any order.
+        """
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute(
+                    'INSERT INTO versions VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (case_relative_path, kind) DO UPDATE SET '
+                    'next_version = MAX(next_version, '
+                    'excluded.next_version), '
+                    'latest_version = MAX(latest_version, '
+                    'excluded.latest_version)',
+                    (case_relative_path, kind, next_version, latest_version))
+        finally:
+            connection.close()
+
+    def reserve_version(self, case_relative_path, kind, version):
+        """
+        Record that a version is taken (e.g. queued in the save queue) but
+        not saved yet.
+        """
+        self.update_versions(case_relative_path, kind, version + 1, 0)
+
+    def add_version(self, case_relative_path, kind, version):
+        """
+        Record that a version has been saved.
+        """
+        self.update_versions(case_relative_path, kind, version + 1, version)
+
+    def get_statuses(self, annotator_name):
+        """
+        Get the segmentation status of all segmented cases.
+        :param annotator_name: current annotator.
+        :return: dictionary of volume filename: status
+        (STATUS_SEGMENTED_BY_ANNOTATOR or
+        STATUS_SEGMENTED_BY_OTHER_ANNOTATOR). Cases not in the dictionary are
+        not segmented.
+        """
+        connection = self.connect()
+        try:
+            rows = connection.execute(
+                'SELECT volume_filename, MAX(annotator_name = ?) '
+                'FROM segmentations GROUP BY volume_filename',
+                (annotator_name,)).fetchall()
+        finally:
+            connection.close()
+
+        return {volume_filename: (STATUS_SEGMENTED_BY_ANNOTATOR if by_annotator
+                                  else STATUS_SEGMENTED_BY_OTHER_ANNOTATOR)
+                for volume_filename, by_annotator in rows}
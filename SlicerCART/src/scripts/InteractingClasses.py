@@ -739,7 +739,7 @@ class SlicerCARTConfigurationInitialWindow(qt.QWidget):
             # Ensure there is a config file in the output folder
             ConfigPath.set_output_folder(self.outputFolder)
             ConfigPath.check_existing_configuration()
-            ConfigPath.delete_temp_file()
+            ConfigPath.set_output_folder_selected()
 
             # self.segmenter corresponds to SlicerCART UI in Slicer.
             self.segmenter.onSelectVolumesFolderButton()
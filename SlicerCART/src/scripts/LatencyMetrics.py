@@ -0,0 +1,163 @@
+from utils import *
+
+LATENCY_METRICS_FILENAME = 'latency_metrics.jsonl'
+
+# Number of most recent durations of each phase used for the percentiles.
+LATENCY_METRICS_WINDOW = 500
+# Maximum number of durations kept until written (oldest durations are
+# dropped, e.g. when no output folder is set).
+LATENCY_METRICS_MAX_PENDING_RECORDS = 10000
+
+def measure_latency(phase):
+    """
+    Decorator that times a method of the widget as a phase of its
+    LatencyMetrics (sub-phases are timed with LatencyMetrics.measure).
+    Usage: @measure_latency('loadPatient'), below @enter_function.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.LatencyMetrics.measure(phase):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+class LatencyMetrics():
+    """
+    This class times named phases of the module (e.g. 'loadPatient/
+    new_segmentation') and keeps, for the current session, rolling
+    percentiles (p50, p95) of the most recent durations and the maximum
+    duration of each phase.
+
+    Durations are appended to a metrics file in the _conf folder of the
+    output folder (one json line per duration, with the session and the
+    host), so sessions of different sites and storage backends can be
+    compared. Lines are written by write_pending_records, outside of the
+    measured phases.
+    """
+
+    def __init__(self, window=LATENCY_METRICS_WINDOW):
+        self.session = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+        self.host = platform.node()
+        self.window = window
+        # Phase: recent durations (seconds).
+        self.durations = {}
+        self.counts = {}
+        self.maximums = {}
+        self.pending_records = deque(
+            maxlen=LATENCY_METRICS_MAX_PENDING_RECORDS)
+        self.metrics_path = None
+        self.is_modified = False
+        self.lock = threading.Lock()
+
+    def set_output_folder(self, outputFolder):
+        """
+        Write the durations in the metrics file of this output folder from
+        now (pending durations included).
+        """
+        self.metrics_path = os.path.join(outputFolder, CONF_FOLDER_NAME,
+                                         LATENCY_METRICS_FILENAME)
+
+    @contextmanager
+    def measure(self, phase):
+        """
+        Time the code of a with block.
+        Usage: with self.LatencyMetrics.measure('loadPatient'): ...
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def add(self, phase, duration):
+        with self.lock:
+            if phase not in self.durations:
+                self.durations[phase] = deque(maxlen=self.window)
+                self.counts[phase] = 0
+                self.maximums[phase] = 0
+            self.durations[phase].append(duration)
+            self.counts[phase] += 1
+            self.maximums[phase] = max(self.maximums[phase], duration)
+            self.pending_records.append(
+                {'session': self.session, 'host': self.host,
+                 'time': datetime.today().strftime('%Y-%m-%d %H:%M:%S'),
+                 'phase': phase, 'duration': duration})
+            self.is_modified = True
+
+    def get_percentile(self, sorted_durations, percentile):
+        # Nearest-rank percentile.
+        rank = math.ceil(percentile / 100 * len(sorted_durations))
+        return sorted_durations[max(rank, 1) - 1]
+
+    def get_summary(self):
+        """
+        :return: dictionary of phase: {'count', 'p50', 'p95', 'max'} for the
+        current session (durations in seconds).
+        """
+        with self.lock:
+            durations = {phase: sorted(values)
+                         for phase, values in self.durations.items()}
+            counts = dict(self.counts)
+            maximums = dict(self.maximums)
+
+        return {phase: {'count': counts[phase],
+                        'p50': self.get_percentile(values, 50),
+                        'p95': self.get_percentile(values, 95),
+                        'max': maximums[phase]}
+                for phase, values in durations.items()}
+
+    def format_summary(self):
+        """
+        :return: text of the summary, one phase per line (in milliseconds).
+        """
+        summary = self.get_summary()
+        if not summary:
+            return 'No phase measured yet.'
+        lines = [f'{"Phase":<45} {"n":>5} {"p50":>8} {"p95":>8} {"max":>8}']
+        for phase in sorted(summary):
+            metrics = summary[phase]
+            lines.append(f'{phase:<45} {metrics["count"]:>5} '
+                         f'{metrics["p50"] * 1000:>8.1f} '
+                         f'{metrics["p95"] * 1000:>8.1f} '
+                         f'{metrics["max"] * 1000:>8.1f}')
+        return '\n'.join(lines)
+
+    def write_pending_records(self):
+        """
+        Append the durations measured since the last call to the metrics
+        file (kept in memory until an output folder is set, up to
+        LATENCY_METRICS_MAX_PENDING_RECORDS durations).
+        """
+        if self.metrics_path is None:
+            return
+        with self.lock:
+            records = list(self.pending_records)
+            self.pending_records.clear()
+        if not records:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.metrics_path), exist_ok=True)
+            with open(self.metrics_path, 'a') as file:
+                for record in records:
+                    file.write(json.dumps(record) + '\n')
+        except OSError as e:
+            print(f'Cannot write latency metrics {self.metrics_path}: {e}')
+
+    def write_session_summary(self):
+        """
+        Append the summary of the session to the metrics file (called when
+        the module is closed).
+        """
+        self.write_pending_records()
+        summary = self.get_summary()
+        if self.metrics_path is None or not summary:
+            return
+        try:
+            with open(self.metrics_path, 'a') as file:
+                file.write(json.dumps({'session': self.session,
+                                       'host': self.host,
+                                       'summary': summary}) + '\n')
+        except OSError as e:
+            print(f'Cannot write latency metrics {self.metrics_path}: {e}')
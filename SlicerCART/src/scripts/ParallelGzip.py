@@ -0,0 +1,85 @@
+from utils import *
+
+# Size of the blocks of data compressed in parallel.
+PARALLEL_GZIP_BLOCK_SIZE = 1024 * 1024
+# Each block is compressed with the end of the previous one as dictionary
+# (as pigz does), so the compression ratio stays close to the one of a
+# single stream.
+PARALLEL_GZIP_DICTIONARY_SIZE = 32 * 1024
+
+class ParallelGzip():
+    """
+    This class writes gzip compressed data using several threads, as pigz
+    does: the data is split in blocks compressed in parallel (zlib releases
+    the GIL) into raw deflate streams ending on a byte boundary, which are
+    concatenated in a single gzip member. The output is a standard gzip
+    stream, read by any gzip reader (nibabel, pynrrd, ITK, Slicer...).
+
+    Usage: ParallelGzip.function_name(self, *args, **kwargs)
+    """
+
+    def __init__(self):
+        pass
+
+    def get_number_of_threads(self, threads):
+        """
+        :param threads: number of threads requested (0 for all cores).
+        """
+        if threads > 0:
+            return threads
+        return os.cpu_count() or 1
+
+    def compress_block(self, data, start, level):
+        """
+        Compress the block of data starting at start (can be called from any
+        thread).
+        :return: raw deflate data of the block, ending on a byte boundary
+        (or ending the deflate stream for the last block).
+        """
+        end = min(start + PARALLEL_GZIP_BLOCK_SIZE, len(data))
+        if start > 0:
+            compressor = zlib.compressobj(
+                level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                zdict=data[max(start - PARALLEL_GZIP_DICTIONARY_SIZE, 0):
+                           start])
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                          -zlib.MAX_WBITS)
+
+        block = compressor.compress(data[start:end])
+        if end == len(data):
+            return block + compressor.flush(zlib.Z_FINISH)
+        return block + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    @enter_function
+    def write(self, file, data, level=6, threads=0):
+        """
+        Write data in gzip format.
+        :param file: file object opened in binary mode.
+        :param data: bytes-like object (bytes, memoryview...).
+        :param level: zlib compression level (1 fastest to 9 smallest).
+        :param threads: number of threads compressing (0 for all cores).
+        """
+        data = memoryview(data).cast('B')
+        threads = ParallelGzip.get_number_of_threads(self, threads)
+
+        # Maximum compression and fastest compression flags, as gzip does.
+        extra_flags = 2 if level == 9 else 4 if level == 1 else 0
+        file.write(struct.pack('<BBBBIBB', 0x1f, 0x8b, zlib.DEFLATED, 0, 0,
+                               extra_flags, 255))
+
+        crc = 0
+        starts = range(0, max(len(data), 1), PARALLEL_GZIP_BLOCK_SIZE)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            blocks = executor.map(
+                partial(ParallelGzip.compress_block, self, data,
+                        level=level), starts)
+            # Blocks are written in order, the checksum being computed while
+            # the next blocks are compressed.
+            for start, block in zip(starts, blocks):
+                crc = zlib.crc32(
+                    data[start:start + PARALLEL_GZIP_BLOCK_SIZE], crc)
+                file.write(block)
+
+        file.write(struct.pack('<II', crc & 0xffffffff,
+                               len(data) & 0xffffffff))
@@ -0,0 +1,343 @@
+from utils import *
+from scripts.CaseStatusIndex import *
+from scripts.SegmentationInformation import *
+from scripts.SegmentationMasks import *
+
+SAVE_QUEUE_FOLDER_NAME = 'save_queue'
+
+class SaveQueue():
+    """
+    This class writes segmentation saves in a background thread so that the
+    annotator can move to the next case without waiting for compression and
+    disk writes.
+
+    Each save is a job written in the _conf folder of the output folder (a
+    .json file with the save information and a .npy file with the labelmap
+    voxels) when queued, so pending saves are resumed if Slicer crashes.
+    The annotator does not wait for these files to reach the disk: they are
+    flushed (fsync) by the background thread before the job is processed.
+    Jobs are processed one at a time in the order they were queued, and a
+    job never runs before an earlier failed job of the same case has been
+    retried successfully.
+    """
+
+    def __init__(self, outputFolder, case_status_index=None):
+        self.outputFolder = outputFolder
+        self.case_status_index = case_status_index
+        self.queue_folder = os.path.join(outputFolder, CONF_FOLDER_NAME,
+                                         SAVE_QUEUE_FOLDER_NAME)
+        os.makedirs(self.queue_folder, exist_ok=True)
+
+        self.lock = RLock()
+        # Held while job files are flushed to the disk (by the worker, or at
+        # shutdown).
+        self.sync_lock = RLock()
+        self.wake_up = threading.Event()
+        self.stop_requested = False
+        self.retry_requested = False
+        self.completed_count = 0
+
+        # Jobs found in the queue folder are resumed (e.g. after a crash).
+        self.jobs = {}
+        self.failed_jobs = {}
+        # Sequence: voxels of the jobs queued in this session (until
+        # written), and sequences of the jobs not flushed to the disk yet.
+        self.arrays = {}
+        self.unsynced_sequences = deque()
+        for filename in os.listdir(self.queue_folder):
+            if not filename.endswith('.json'):
+                continue
+            job = SaveQueue.read_json(self, os.path.join(self.queue_folder,
+                                                         filename))
+            if job.get('error') is None:
+                self.jobs[job['sequence']] = job
+            else:
+                self.failed_jobs[job['sequence']] = job
+
+        sequences = list(self.jobs) + list(self.failed_jobs)
+        self.next_sequence = max(sequences) + 1 if sequences else 1
+
+        self.worker = threading.Thread(target=self.run,
+                                       name='SlicerCARTSaveQueue',
+                                       daemon=True)
+        self.worker.start()
+
+    def get_job_path(self, sequence, extension):
+        return os.path.join(self.queue_folder, f'{sequence:08d}{extension}')
+
+    def read_json(self, path):
+        with open(path, 'r') as file:
+            return json.load(file)
+
+    def write_json(self, path, content, sync=True):
+        """
+        Write a json file atomically (and durably if sync) so a crash never
+        leaves a partially written job.
+        """
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(content, file)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+    @enter_function
+    def enqueue(self, job, array):
+        """
+        Write a save job in the queue folder and hand it to the background
+        worker. The files are not flushed to the disk here (see sync_jobs):
+        they survive a crash of Slicer, not of the system.
+        :param job: dictionary describing the save (see
+        SlicerCARTWidget.enqueue_segmentation_save).
+        :param array: labelmap voxels (numpy array in KJI order), not
+        modified afterwards by the caller.
+        """
+        with self.lock:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+
+        job = dict(job)
+        job['sequence'] = sequence
+        job['error'] = None
+        try:
+            SaveQueue.persist_job(self, job, array, sync=False)
+        except OSError as e:
+            # Written again by the worker (see sync_jobs).
+            print(f'Cannot persist the save of {job["mask_path"]}: {e}')
+
+        with self.lock:
+            self.arrays[sequence] = array
+            self.unsynced_sequences.append(sequence)
+            self.jobs[sequence] = job
+
+        self.wake_up.set()
+
+    def sync_jobs(self):
+        """
+        Flush to the disk the files of the jobs queued since the last call,
+        in order (files that could not be written when queued are written).
+        A job that cannot be written is still processed from memory.
+        """
+        with self.sync_lock:
+            while True:
+                with self.lock:
+                    if not self.unsynced_sequences:
+                        return
+                    sequence = self.unsynced_sequences[0]
+                    job = dict(self.jobs.get(sequence)
+                               or self.failed_jobs[sequence])
+                    array = self.arrays[sequence]
+
+                try:
+                    SaveQueue.sync_job(self, job, array)
+                except OSError as e:
+                    print(f'Cannot persist the save of {job["mask_path"]}: '
+                          f'{e}')
+
+                with self.lock:
+                    self.unsynced_sequences.popleft()
+
+    def persist_job(self, job, array, sync=True):
+        """
+        Write the voxels then the json file of a job (the job exists only
+        once its json file is written).
+        :param sync: if True, the files are flushed to the disk.
+        """
+        voxels_path = SaveQueue.get_job_path(self, job['sequence'], '.npy')
+        with open(f'{voxels_path}.tmp', 'wb') as file:
+            np.save(file, array)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(f'{voxels_path}.tmp', voxels_path)
+
+        SaveQueue.write_json(self, SaveQueue.get_job_path(
+            self, job['sequence'], '.json'), job, sync)
+
+    def sync_job(self, job, array):
+        """
+        Flush to the disk the files of a job written when queued, or write
+        them if they are missing.
+        """
+        paths = [SaveQueue.get_job_path(self, job['sequence'], extension)
+                 for extension in ['.npy', '.json']]
+        if not all(os.path.exists(path) for path in paths):
+            SaveQueue.persist_job(self, job, array)
+            return
+        for path in paths:
+            with open(path, 'r+b') as file:
+                os.fsync(file.fileno())
+
+    def get_next_job(self):
+        """
+        Get the oldest job that can be processed (flushed to the disk, and
+        no earlier failed job for the same case).
+        """
+        with self.lock:
+            blocked_cases = {job['case_path'] for job in
+                             self.failed_jobs.values()}
+            for sequence in sorted(self.jobs):
+                job = self.jobs[sequence]
+                if (job['case_path'] in blocked_cases
+                        or sequence in self.unsynced_sequences):
+                    continue
+                return job
+        return None
+
+    def run(self):
+        """
+        Background thread loop: process the jobs one at a time, in order.
+        """
+        while not self.stop_requested:
+            if self.retry_requested:
+                SaveQueue.requeue_failed_jobs(self)
+            SaveQueue.sync_jobs(self)
+            job = SaveQueue.get_next_job(self)
+            if job is None:
+                self.wake_up.wait()
+                self.wake_up.clear()
+                continue
+
+            try:
+                SaveQueue.process(self, job)
+            except Exception as e:
+                print(f'Save of {job["mask_path"]} failed: {e}')
+                with self.lock:
+                    job['error'] = str(e)
+                    try:
+                        SaveQueue.write_json(self, SaveQueue.get_job_path(
+                            self, job['sequence'], '.json'), job)
+                    except OSError as write_error:
+                        print(f'Cannot record the failure of the save of '
+                              f'{job["mask_path"]}: {write_error}')
+                    self.jobs.pop(job['sequence'], None)
+                    self.failed_jobs[job['sequence']] = job
+                    # Voxels stay in memory only if they are not on disk.
+                    if os.path.exists(SaveQueue.get_job_path(
+                            self, job['sequence'], '.npy')):
+                        self.arrays.pop(job['sequence'], None)
+                continue
+
+            with self.lock:
+                for extension in ['.json', '.npy']:
+                    path = SaveQueue.get_job_path(self, job['sequence'],
+                                                  extension)
+                    if os.path.exists(path):
+                        os.remove(path)
+                self.jobs.pop(job['sequence'], None)
+                self.arrays.pop(job['sequence'], None)
+                self.completed_count += 1
+
+    def process(self, job):
+        """
+        Write the mask and the segmentation information of a job and record
+        it in the case status index. Each step is recorded in the job file so
+        that a job resumed after a crash does not write the information
+        twice.
+        """
+        job_path = SaveQueue.get_job_path(self, job['sequence'], '.json')
+        os.makedirs(os.path.dirname(job['mask_path']), exist_ok=True)
+
+        if not job.get('mask_written'):
+            with self.lock:
+                array = self.arrays.get(job['sequence'])
+            if array is None:
+                # Job resumed from the queue folder.
+                array = np.load(SaveQueue.get_job_path(self, job['sequence'],
+                                                       '.npy'))
+            ijk_to_ras = np.array(job['ijk_to_ras'])
+            if job['mask_format'] == 'nrrd':
+                SegmentationMasks.write_seg_nrrd(self, job['mask_path'], array,
+                                                 ijk_to_ras, job['segments'])
+            else:
+                SegmentationMasks.write_nifti(self, job['mask_path'], array,
+                                              ijk_to_ras)
+            job['mask_written'] = True
+            SaveQueue.write_json(self, job_path, job)
+
+        if not job.get('information_written'):
+            SegmentationInformation.append(job['information_path'],
+                                           job['information_columns'],
+                                           job['information_values'])
+            job['information_written'] = True
+            SaveQueue.write_json(self, job_path, job)
+
+        if self.case_status_index is not None:
+            self.case_status_index.add_segmentation(
+                job['volume_filename'], job['annotator_name'],
+                job['segmentation_version'])
+            self.case_status_index.add_version(
+                job['case_relative_path'], VERSION_KIND_SEGMENTATION,
+                int(job['segmentation_version'][1:]))
+
+    @enter_function
+    def retry_failed_jobs(self):
+        """
+        Queue again the jobs that failed (in their original order). Done by
+        the background worker, see requeue_failed_jobs.
+        """
+        self.retry_requested = True
+        self.wake_up.set()
+
+    def requeue_failed_jobs(self):
+        """
+        Background thread: clear the error of the failed jobs in their files,
+        then queue them again.
+        """
+        with self.lock:
+            self.retry_requested = False
+            failed_jobs = {sequence: dict(job, error=None) for sequence, job
+                           in self.failed_jobs.items()}
+
+        for sequence, job in failed_jobs.items():
+            try:
+                SaveQueue.write_json(self, SaveQueue.get_job_path(
+                    self, sequence, '.json'), job)
+            except OSError as e:
+                print(f'Cannot record the retry of the save of '
+                      f'{job["mask_path"]}: {e}')
+
+        with self.lock:
+            for sequence in failed_jobs:
+                job = self.failed_jobs.pop(sequence)
+                job['error'] = None
+                self.jobs[sequence] = job
+
+    def get_status(self):
+        """
+        :return: number of pending jobs, number of failed jobs and number of
+        jobs completed since the queue was created.
+        """
+        with self.lock:
+            return (len(self.jobs), len(self.failed_jobs),
+                    self.completed_count)
+
+    def get_failed_errors(self):
+        """
+        :return: dictionary of mask path: error message of failed jobs.
+        """
+        with self.lock:
+            return {job['mask_path']: job['error'] for job in
+                    self.failed_jobs.values()}
+
+    def get_queued_mask_paths(self):
+        """
+        :return: paths of masks not written yet (pending or failed), so
+        versions are not allocated twice.
+        """
+        with self.lock:
+            return [job['mask_path'] for job in
+                    list(self.jobs.values()) + list(self.failed_jobs.values())
+                    if not job.get('mask_written')]
+
+    def shutdown(self, timeout=30):
+        """
+        Stop the background thread after the job in progress. Pending jobs
+        stay on disk and are resumed next time the output folder is used.
+        """
+        self.stop_requested = True
+        self.wake_up.set()
+        self.worker.join(timeout)
+        # Jobs queued just before closing are flushed for the next session.
+        SaveQueue.sync_jobs(self)
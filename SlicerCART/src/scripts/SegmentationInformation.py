@@ -0,0 +1,231 @@
+from utils import *
+
+SEGMENTATION_INFORMATION_LOG_SUFFIX = '_SegmentationInformation.jsonl'
+SEGMENTATION_INFORMATION_CSV_SUFFIX = '_SegmentationInformation.csv'
+
+class SegmentationInformation():
+    """
+    This class keeps the information of the segmentations saved for a case
+    (annotator, revision step, durations, measurement lines...) in an
+    append-only log next to the masks of the case
+    (<volume>_SegmentationInformation.jsonl), one json line per event:
+    - {"event": "schema", "schema_version": n, "columns": [...]} when the
+      columns change (labels or measurement lines configured);
+    - {"event": "row", "schema_version": n, "values": [...]} for each save.
+
+    A save is a single append (flushed to disk) instead of rewriting the
+    whole file, and each row keeps the columns it was saved with, so rows
+    saved with other labels stay aligned. The _SegmentationInformation.csv
+    files are views of the logs, written on demand (export_csv); existing
+    csv files are imported the first time the log of a case is used.
+    """
+
+    def __init__(self):
+        # Log path: (stamp, schema version, columns) of the last schema.
+        self.schemas = {}
+        self.lock = RLock()
+
+    def get_log_path(self, folder, volume_filename):
+        return os.path.join(folder,
+                            f'{volume_filename}'
+                            f'{SEGMENTATION_INFORMATION_LOG_SUFFIX}')
+
+    def get_csv_path(self, path):
+        """
+        :return: path of the csv view of a log.
+        """
+        return (path[:-len(SEGMENTATION_INFORMATION_LOG_SUFFIX)]
+                + SEGMENTATION_INFORMATION_CSV_SUFFIX)
+
+    def get_stamp(self, path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @enter_function
+    def append(self, path, columns, values):
+        """
+        Append the information of a save to the log of a case (and the new
+        schema first if the columns changed).
+        :param path: path of the log (see get_log_path).
+        :param columns: column names.
+        :param values: values of the save (same order as the columns).
+        """
+        columns = list(columns)
+        with self.lock:
+            schema_version, schema_columns = self.get_schema(path)
+
+            records = []
+            if columns != schema_columns:
+                schema_version += 1
+                records.append({'event': 'schema',
+                                'schema_version': schema_version,
+                                'columns': columns})
+            records.append({'event': 'row',
+                            'schema_version': schema_version,
+                            'values': list(values)})
+            data = ''.join(json.dumps(record) + '\n' for record in records)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab+') as file:
+                # A line left incomplete by a crash is ended so the new
+                # records stay readable.
+                if file.seek(0, os.SEEK_END) > 0:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b'\n':
+                        data = '\n' + data
+                file.write(data.encode('utf-8'))
+                file.flush()
+                os.fsync(file.fileno())
+
+            self.schemas[path] = (self.get_stamp(path), schema_version,
+                                  columns)
+
+    def get_schema(self, path):
+        """
+        :return: version and columns of the last schema of a log (0 and an
+        empty list if there is no log yet).
+        """
+        with self.lock:
+            if not os.path.exists(path):
+                self.import_csv_file(path)
+            if not os.path.exists(path):
+                return 0, []
+
+            stamp = self.get_stamp(path)
+            schema = self.schemas.get(path)
+            if schema is not None and schema[0] == stamp:
+                return schema[1], schema[2]
+
+            schema_version, columns = 0, []
+            for record in self.read_records(path):
+                if record.get('event') == 'schema':
+                    schema_version = record['schema_version']
+                    columns = record['columns']
+            self.schemas[path] = (stamp, schema_version, columns)
+            return schema_version, columns
+
+    def read_records(self, path):
+        """
+        :return: events of a log (lines that cannot be read, e.g. left
+        incomplete by a crash, are skipped).
+        """
+        records = []
+        with open(path, 'r', encoding='utf-8') as file:
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    print(f'Skipping line {line_number} of {path}: not '
+                          f'valid json.')
+        return records
+
+    @enter_function
+    def read_rows(self, path):
+        """
+        Read the saves of a case.
+        :param path: path of the log.
+        :return: all columns (in the order they first appeared) and the rows
+        (dictionaries of column: value, only with the columns of the schema
+        the row was saved with).
+        """
+        with self.lock:
+            if not os.path.exists(path):
+                self.import_csv_file(path)
+            if not os.path.exists(path):
+                return [], []
+            records = self.read_records(path)
+
+        schemas = {}
+        all_columns = OrderedDict()
+        rows = []
+        for record in records:
+            if record.get('event') == 'schema':
+                schemas[record['schema_version']] = record['columns']
+                for column in record['columns']:
+                    all_columns[column] = None
+            elif record.get('event') == 'row':
+                columns = schemas.get(record['schema_version'], [])
+                rows.append(dict(zip(columns, record['values'])))
+        return list(all_columns), rows
+
+    def read_dataframe(self, path):
+        """
+        :return: saves of a case (pandas DataFrame), or None if no
+        segmentation has been saved for the case.
+        """
+        columns, rows = self.read_rows(path)
+        if not rows:
+            return None
+        return pd.DataFrame(rows, columns=columns)
+
+    @enter_function
+    def export_csv(self, path):
+        """
+        Write the csv view of a log (<volume>_SegmentationInformation.csv).
+        :return: path of the csv file.
+        """
+        columns, rows = self.read_rows(path)
+        csv_path = self.get_csv_path(path)
+        temp_path = f'{csv_path}.tmp'
+        with open(temp_path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(temp_path, csv_path)
+        return csv_path
+
+    @enter_function
+    def export_csv_files(self, folder):
+        """
+        Write the csv views of all logs of an output folder.
+        :return: paths of the csv files written, and dictionary of log path:
+        error message for the logs that could not be exported.
+        """
+        exported = []
+        failed = {}
+        for subdir, dirs, files in os.walk(folder):
+            dirs[:] = [d for d in dirs if d != CONF_FOLDER_NAME]
+            for file in files:
+                if not file.endswith(SEGMENTATION_INFORMATION_LOG_SUFFIX):
+                    continue
+                path = os.path.join(subdir, file)
+                try:
+                    exported.append(self.export_csv(path))
+                except (OSError, ValueError, KeyError) as e:
+                    failed[path] = str(e)
+        return exported, failed
+
+    def import_csv_file(self, path):
+        """
+        Create the log of a case from its _SegmentationInformation.csv file
+        (saved by previous versions), if any. The header of the csv file is
+        used as the schema of all its rows.
+        """
+        csv_path = self.get_csv_path(path)
+        if not os.path.exists(csv_path):
+            return
+
+        with open(csv_path, 'r', newline='') as file:
+            lines = list(csv.reader(file))
+        if not lines:
+            return
+
+        records = [{'event': 'schema', 'schema_version': 1,
+                    'columns': lines[0]}]
+        records += [{'event': 'row', 'schema_version': 1, 'values': values}
+                    for values in lines[1:] if values]
+
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+
+# Creating an instance of SegmentationInformation, shared by the widget and
+# the save queue thread (as for ConfigCache).
+SegmentationInformation = SegmentationInformation()
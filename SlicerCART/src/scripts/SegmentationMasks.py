@@ -0,0 +1,216 @@
+from utils import *
+from scripts.ParallelGzip import *
+
+# Saved segmentation masks are named {volume filename}_v{version}{extension}
+SEGMENTATION_MASK_PATTERN = re.compile(r'_v\d+(\.nii|\.nii\.gz|\.seg\.nrrd)$')
+
+class SegmentationMasks():
+    """
+    This class gathers operations on segmentation mask files saved in the
+    output folder (e.g. writing outside of the MRML scene, data type
+    normalization).
+
+    Usage: SegmentationMasks.function_name(self, *args, **kwargs)
+    """
+
+    def __init__(self):
+        pass
+
+    def is_file_uint8(self, path):
+        """
+        Check the data type of a mask file by reading its header only.
+        :param path: path of a .nii, .nii.gz or .seg.nrrd mask.
+        :return: True if voxels are stored as uint8.
+        """
+        if path.endswith('.nii') or path.endswith('.nii.gz'):
+            return nib.load(path).get_data_dtype() == np.uint8
+        elif path.endswith('.nrrd'):
+            return nrrd.read_header(path)['type'] in ['uchar',
+                                                      'unsigned char',
+                                                      'uint8', 'uint8_t']
+        else:
+            raise ValueError('The input segmentation file must be in nii, '
+                             'nii.gz or nrrd format.')
+
+    def cast_file_to_uint8(self, path):
+        """
+        Rewrite a mask file with uint8 voxels if it is not already the case.
+        :param path: path of a .nii, .nii.gz or .seg.nrrd mask.
+        :return: True if the file has been converted.
+        """
+        if SegmentationMasks.is_file_uint8(self, path):
+            return False
+
+        if path.endswith('.nii') or path.endswith('.nii.gz'):
+            segm = nib.load(path)
+            segm_data = np.asanyarray(segm.dataobj).astype(np.uint8)
+            segm.header.set_data_dtype(np.uint8)
+            segm_nii = nib.Nifti1Image(segm_data, segm.affine, segm.header)
+            nib.save(segm_nii, path)
+        else:
+            segm_data, header = nrrd.read(path)
+            segm_data = segm_data.astype(np.uint8)
+            header['type'] = 'unsigned char'
+            nrrd.write(path, segm_data, header=header)
+
+        print(f'converted file {os.path.basename(path)} to uint8')
+        return True
+
+    def get_temp_path(self, path):
+        """
+        Path used to write a mask before moving it to its final path, so a
+        mask is never seen partially written. Same extension as the mask so
+        that readers/writers recognize the format.
+        """
+        folder, filename = os.path.split(path)
+        return os.path.join(folder, f'.tmp_{filename}')
+
+    def write_nifti(self, path, array, ijk_to_ras):
+        """
+        Write a labelmap as a uint8 .nii.gz mask without Slicer (can be called
+        from any thread). Compressed with the level and number of threads of
+        the configuration (see ParallelGzip).
+        :param path: path of the mask.
+        :param array: labelmap voxels (numpy array in KJI order).
+        :param ijk_to_ras: 4x4 IJK to RAS matrix.
+        """
+        image = nib.Nifti1Image(np.asarray(array, dtype=np.uint8).transpose(),
+                                ijk_to_ras)
+        image.header.set_qform(ijk_to_ras, code=1)
+        image.header.set_sform(ijk_to_ras, code=1)
+        image.header.set_xyzt_units('mm', 'sec')
+
+        temp_path = SegmentationMasks.get_temp_path(self, path)
+        if path.endswith('.gz'):
+            with open(temp_path, 'wb') as file:
+                ParallelGzip.write(self, file, image.to_bytes(),
+                                   level=ConfigPath.COMPRESSION_LEVEL,
+                                   threads=ConfigPath.COMPRESSION_THREADS)
+        else:
+            nib.save(image, temp_path)
+        os.replace(temp_path, path)
+
+    def write_seg_nrrd(self, path, array, ijk_to_ras, segments):
+        """
+        Write a labelmap as a uint8 .seg.nrrd mask with the segment metadata
+        Slicer writes, without Slicer (can be called from any thread).
+        Compressed with the level and number of threads of the configuration
+        (see ParallelGzip).
+        :param path: path of the mask.
+        :param array: labelmap voxels (numpy array in KJI order).
+        :param ijk_to_ras: 4x4 IJK to RAS matrix.
+        :param segments: list of dictionaries with 'id', 'name', 'color'
+        (r, g, b between 0 and 1) and 'label_value' of each segment.
+        """
+        array = np.asarray(array, dtype=np.uint8)
+
+        # Slicer writes segmentations in LPS.
+        ijk_to_lps = np.array(ijk_to_ras, dtype=np.float64)
+        ijk_to_lps[0, :] *= -1
+        ijk_to_lps[1, :] *= -1
+
+        header = {
+            'type': 'unsigned char',
+            'dimension': 3,
+            'space': 'left-posterior-superior',
+            'space directions': ijk_to_lps[:3, :3].T,
+            'space origin': ijk_to_lps[:3, 3],
+            'kinds': ['domain', 'domain', 'domain'],
+            # The voxels are compressed after pynrrd writes them (see below).
+            'encoding': 'raw',
+            'Segmentation_ContainedRepresentationNames': 'Binary labelmap|',
+            'Segmentation_MasterRepresentation': 'Binary labelmap',
+            'Segmentation_ReferenceImageExtentOffset': '0 0 0',
+        }
+
+        for index, segment in enumerate(segments):
+            key = f'Segment{index}_'
+            extent = SegmentationMasks.get_label_extent(
+                self, array, segment['label_value'])
+            header[key + 'Color'] = ' '.join(str(c) for c in segment['color'])
+            header[key + 'ColorAutoGenerated'] = '0'
+            header[key + 'Extent'] = ' '.join(str(e) for e in extent)
+            header[key + 'ID'] = segment['id']
+            header[key + 'LabelValue'] = str(segment['label_value'])
+            header[key + 'Layer'] = '0'
+            header[key + 'Name'] = segment['name']
+            header[key + 'NameAutoGenerated'] = '0'
+            header[key + 'Tags'] = '|'
+
+        # pynrrd writes the header then the raw voxels, which are compressed
+        # here instead of by pynrrd (single thread).
+        buffer = io.BytesIO()
+        nrrd.write(buffer, array, header=header, index_order='C')
+        content = buffer.getbuffer()
+        header_size = len(content) - array.nbytes
+        header_bytes = bytes(content[:header_size]).replace(
+            b'encoding: raw\n', b'encoding: gzip\n', 1)
+
+        temp_path = SegmentationMasks.get_temp_path(self, path)
+        with open(temp_path, 'wb') as file:
+            file.write(header_bytes)
+            ParallelGzip.write(self, file, content[header_size:],
+                               level=ConfigPath.COMPRESSION_LEVEL,
+                               threads=ConfigPath.COMPRESSION_THREADS)
+        os.replace(temp_path, path)
+
+    def get_label_extent(self, array, label_value):
+        """
+        Bounding box of a label, in the format of Slicer segment extents.
+        :param array: labelmap voxels (numpy array in KJI order).
+        :return: [i min, i max, j min, j max, k min, k max], or an empty
+        extent if the label is not present.
+        """
+        mask = array == label_value
+        extent = []
+        # Axes of the KJI array are reversed to get the extent in IJK order.
+        for axis in [2, 1, 0]:
+            other_axes = tuple(a for a in range(3) if a != axis)
+            indices = np.nonzero(np.any(mask, axis=other_axes))[0]
+            if indices.size == 0:
+                return [0, -1, 0, -1, 0, -1]
+            extent += [int(indices[0]), int(indices[-1])]
+        return extent
+
+    def get_mask_paths(self, folder):
+        """
+        Get all saved segmentation masks of an output folder (recursively).
+        """
+        mask_paths = []
+        for subdir, dirs, files in os.walk(folder):
+            dirs[:] = [d for d in dirs if d != CONF_FOLDER_NAME]
+            for file in files:
+                if (SEGMENTATION_MASK_PATTERN.search(file)
+                        and not file.startswith('.')):
+                    mask_paths.append(os.path.join(subdir, file))
+        return sorted(mask_paths)
+
+    @enter_function
+    def normalize_dtypes(self, folder, max_workers=None):
+        """
+        One-off conversion of all masks of an output folder to uint8 (e.g.
+        for folders created by previous versions of SlicerCART). Files are
+        processed in parallel and only rewritten if needed.
+        :param folder: output folder.
+        :param max_workers: number of threads (default: number of cores).
+        :return: list of converted paths and dictionary of failed paths
+        (path: error message).
+        """
+        mask_paths = SegmentationMasks.get_mask_paths(self, folder)
+        converted = []
+        failed = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(SegmentationMasks.cast_file_to_uint8,
+                                self, path): path
+                for path in mask_paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    if future.result():
+                        converted.append(path)
+                except Exception as e:
+                    failed[path] = str(e)
+
+        return sorted(converted), failed
@@ -1,4 +1,6 @@
 from utils import *
+from scripts.LatencyMetrics import *
+from scripts.VolumeLoader import *
 class SlicerCARTTest(ScriptedLoadableModuleTest):
   """
   This is the test case for your scripted module.
@@ -16,6 +18,8 @@ class SlicerCARTTest(ScriptedLoadableModuleTest):
     """
     self.setUp()
     self.test_SlicerCART1()
+    self.setUp()
+    self.test_overlapping_full_resolution_reads()
 
   def test_SlicerCART1(self):
     """ Ideally you should have several levels of tests.  At the lowest level
@@ -61,4 +65,66 @@ class SlicerCARTTest(ScriptedLoadableModuleTest):
     self.assertEqual(outputScalarRange[0], inputScalarRange[0])
     self.assertEqual(outputScalarRange[1], inputScalarRange[1])
 
-    self.delayDisplay('Test passed')
\ No newline at end of file
+    self.delayDisplay('Test passed')
+
+  def test_overlapping_full_resolution_reads(self):
+    """ Progressive loading: the full resolution read of a case left before
+    the end of its read must not stop the read of the case displayed next,
+    nor replace its preview.
+    """
+    from SlicerCART import SlicerCARTWidget
+
+    # Reads wait until released, to finish in a chosen order.
+    released = {'A': threading.Event(), 'B': threading.Event()}
+    swapped_paths = []
+    finished_paths = []
+
+    def read_volume(widget, path, memory_map=False):
+      released[path].wait(10)
+      return {'path': path}
+
+    def update_volume_node(widget, volume_node, volume):
+      swapped_paths.append(volume['path'])
+
+    widget = SlicerCARTWidget.__new__(SlicerCARTWidget)
+    widget.fullResolutionReadThread = None
+    widget.fullResolutionVolumes = deque()
+    widget.fullResolutionTimer = qt.QTimer()
+    widget.LatencyMetrics = LatencyMetrics()
+    widget.VolumeNode = None
+    widget.set_volume_display = lambda: None
+    widget.enableSegmentAndPaintButtons = lambda: None
+    widget.finish_load_patient = lambda: finished_paths.append(
+      widget.currentCasePath)
+
+    original_read_volume = VolumeLoader.read_volume
+    original_update_volume_node = VolumeLoader.update_volume_node
+    VolumeLoader.read_volume = read_volume
+    VolumeLoader.update_volume_node = update_volume_node
+    try:
+      widget.currentCasePath = 'A'
+      widget.start_full_resolution_read()
+      read_a = widget.fullResolutionReadThread
+
+      # Case B is displayed (its preview) before the end of the read of A.
+      widget.currentCasePath = 'B'
+      widget.stop_full_resolution_read()
+      widget.start_full_resolution_read()
+      read_b = widget.fullResolutionReadThread
+
+      released['A'].set()
+      read_a.join(10)
+      widget.swap_full_resolution_volume()
+      self.assertEqual(swapped_paths, [])
+      self.assertTrue(widget.is_full_resolution_pending())
+
+      released['B'].set()
+      read_b.join(10)
+      widget.swap_full_resolution_volume()
+      self.assertEqual(swapped_paths, ['B'])
+      self.assertEqual(finished_paths, ['B'])
+      self.assertFalse(widget.is_full_resolution_pending())
+    finally:
+      VolumeLoader.read_volume = original_read_volume
+      VolumeLoader.update_volume_node = original_update_volume_node
+      widget.fullResolutionTimer.stop()
@@ -0,0 +1,264 @@
+from utils import *
+
+# Default folder of the cache (on the local disk of the user).
+VOLUME_DISK_CACHE_DEFAULT_DIRECTORY = os.path.join(
+    os.path.expanduser('~'), '.hslicercart', 'volume_cache')
+
+# Previews keep one voxel out of VOLUME_PREVIEW_STRIDE along each axis.
+VOLUME_PREVIEW_STRIDE = 4
+VOLUME_PREVIEW_SUFFIX = '.preview'
+
+class VolumeDiskCache():
+    """
+    This class keeps on the local disk an uncompressed copy (.npy file) of
+    the compressed volumes recently opened (e.g. .nii.gz), so a volume opened
+    again is read at disk speed instead of being decompressed again.
+
+    Each entry is a .npy file with the voxels and a .json file with the
+    geometry. Entries are named from the path, size and modification time
+    of the source file when it was read, so a file modified or replaced at
+    the same path never gets the entry of its previous content. Entries are
+    removed in least recently used order (last use is the modification time
+    of the .json file) to keep the cache within its size budget.
+
+    A downsampled preview of each volume is kept as a separate entry (also
+    for volumes too large for the budget), to be displayed while the full
+    resolution volume is read (progressive loading).
+    """
+
+    def __init__(self):
+        self.directory = VOLUME_DISK_CACHE_DEFAULT_DIRECTORY
+        self.budget = 0
+        self.lock = RLock()
+        self.writer = None
+
+    def set_settings(self, directory, budget_mb):
+        """
+        :param directory: folder of the cache (default folder if empty).
+        :param budget_mb: maximum size of the cache (0 to disable it).
+        """
+        directory = directory or VOLUME_DISK_CACHE_DEFAULT_DIRECTORY
+        budget = max(budget_mb, 0) * 1024 * 1024
+        with self.lock:
+            if directory == self.directory and budget == self.budget:
+                return
+            self.directory = directory
+            self.budget = budget
+            if self.budget > 0:
+                self.evict()
+
+    def is_enabled(self):
+        return self.budget > 0
+
+    def get_entry_path(self, path, stat, extension):
+        """
+        :param stat: stat of the source file (entries of other contents of
+        the file have other paths).
+        """
+        key = hashlib.sha1(
+            f'{os.path.realpath(path)}|{stat.st_size}|{stat.st_mtime_ns}'
+            .encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{key}{extension}')
+
+    def get_entry(self, path, suffix=''):
+        """
+        :param suffix: '' for the volume, VOLUME_PREVIEW_SUFFIX for its
+        preview.
+        :return: content of the .json file of the entry of the current
+        content of the source file and stat of the source file, or None if
+        there is no such entry.
+        """
+        if not self.is_enabled():
+            return None
+
+        try:
+            stat = os.stat(path)
+            with open(self.get_entry_path(path, stat, f'{suffix}.json'),
+                      'r') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return entry, stat
+
+    def contains(self, path):
+        """
+        Check if the cache has a valid entry for a volume (without reading
+        it).
+        """
+        return self.get_entry(path) is not None
+
+    @enter_function
+    def load(self, path, memory_map=False, preview=False):
+        """
+        Get a volume from the cache.
+        :param path: path of the source volume file.
+        :param memory_map: if True, the voxels are memory mapped (copy on
+        write) instead of being read.
+        :param preview: if True, get the preview of the volume (one voxel
+        out of VOLUME_PREVIEW_STRIDE along each axis).
+        :return: volume dictionary (see VolumeLoader.read_volume) or None if
+        the volume is not in the cache or the source file has changed.
+        """
+        suffix = VOLUME_PREVIEW_SUFFIX if preview else ''
+        entry = self.get_entry(path, suffix)
+        if entry is None:
+            return None
+        entry, stat = entry
+
+        try:
+            array = np.load(self.get_entry_path(path, stat, f'{suffix}.npy'),
+                            mmap_mode='c' if memory_map else None)
+            # Mark the entry as recently used.
+            os.utime(self.get_entry_path(path, stat, f'{suffix}.json'))
+        except (OSError, ValueError) as e:
+            print(f'Cannot read {path} from the volume cache: {e}')
+            self.remove(path, stat, suffix)
+            return None
+
+        return {'path': path,
+                'array': array,
+                'ijk_to_ras': np.array(entry['ijk_to_ras'],
+                                       dtype=np.float64),
+                'nbytes': array.nbytes,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime}
+
+    def get_preview(self, array, ijk_to_ras):
+        """
+        Downsample a volume for its preview: one voxel out of
+        VOLUME_PREVIEW_STRIDE along each axis (same origin, larger spacing).
+        :return: voxels and 4x4 IJK to RAS matrix of the preview.
+        """
+        stride = VOLUME_PREVIEW_STRIDE
+        preview_array = np.ascontiguousarray(
+            array[::stride, ::stride, ::stride])
+        preview_ijk_to_ras = (np.asarray(ijk_to_ras, dtype=np.float64)
+                              @ np.diag([stride, stride, stride, 1]))
+        return preview_array, preview_ijk_to_ras
+
+    @enter_function
+    def store(self, path, stat, array, ijk_to_ras):
+        """
+        Add a volume and its preview to the cache (the volume is not added
+        if it does not fit in the budget, but its preview is). Can be called
+        from any thread.
+        :param path: path of the source volume file.
+        :param stat: stat of the source file taken before it was read.
+        :param array: voxels (numpy array in KJI order).
+        :param ijk_to_ras: 4x4 numpy matrix.
+        """
+        if not self.is_enabled():
+            return
+
+        preview_array, preview_ijk_to_ras = self.get_preview(array,
+                                                             ijk_to_ras)
+        try:
+            with self.lock:
+                os.makedirs(self.directory, exist_ok=True)
+                self.write_entry(path, stat, VOLUME_PREVIEW_SUFFIX,
+                                 preview_array, preview_ijk_to_ras)
+                self.write_entry(path, stat, '', array, ijk_to_ras)
+        except OSError as e:
+            print(f'Cannot write {path} in the volume cache: {e}')
+
+    def write_entry(self, path, stat, suffix, array, ijk_to_ras):
+        """
+        Write an entry of the cache (if it fits in the budget).
+        """
+        if array.nbytes > self.budget:
+            return
+        self.evict(extra_nbytes=array.nbytes)
+
+        # The entry exists only once its .json file is written.
+        npy_path = self.get_entry_path(path, stat, f'{suffix}.npy')
+        temp_path = (f'{npy_path}.{os.getpid()}.'
+                     f'{threading.get_ident()}.tmp')
+        with open(temp_path, 'wb') as file:
+            np.save(file, np.ascontiguousarray(array))
+        os.replace(temp_path, npy_path)
+
+        json_path = self.get_entry_path(path, stat, f'{suffix}.json')
+        with open(f'{json_path}.tmp', 'w') as file:
+            json.dump({'source': os.path.realpath(path),
+                       'size': stat.st_size,
+                       'mtime_ns': stat.st_mtime_ns,
+                       'nbytes': int(array.nbytes),
+                       'ijk_to_ras': np.asarray(ijk_to_ras).tolist()}, file)
+        os.replace(f'{json_path}.tmp', json_path)
+
+    def store_in_background(self, path, stat, array, ijk_to_ras):
+        """
+        Add a volume (or only its preview if the volume does not fit in the
+        budget) to the cache in a background thread. The voxels are not
+        copied: the thread keeps a read only view of them until written, so
+        the caller must not modify them in place (it can release them).
+        """
+        if not self.is_enabled():
+            return
+
+        array = array.view()
+        array.flags.writeable = False
+        self.writer = threading.Thread(
+            target=self.store, args=(path, stat, array, ijk_to_ras),
+            name='SlicerCARTVolumeDiskCache', daemon=True)
+        self.writer.start()
+
+    def remove(self, path, stat, suffix=''):
+        """
+        Remove the entry of a content of a volume (or of its preview) from
+        the cache.
+        """
+        with self.lock:
+            for extension in ['.json', '.npy']:
+                try:
+                    os.remove(self.get_entry_path(path, stat,
+                                                  suffix + extension))
+                except OSError:
+                    pass
+
+    def get_entries(self):
+        """
+        :return: list of (last use, .json path, .npy path, size of the .npy
+        file) of the entries of the cache, least recently used first.
+        """
+        entries = []
+        try:
+            filenames = os.listdir(self.directory)
+        except OSError:
+            return entries
+
+        for filename in filenames:
+            if not filename.endswith('.json'):
+                continue
+            json_path = os.path.join(self.directory, filename)
+            npy_path = json_path[:-len('.json')] + '.npy'
+            try:
+                entries.append((os.stat(json_path).st_mtime, json_path,
+                                npy_path, os.stat(npy_path).st_size))
+            except OSError:
+                continue
+        return sorted(entries)
+
+    def evict(self, extra_nbytes=0):
+        """
+        Remove least recently used entries until the cache (plus
+        extra_nbytes) fits in the budget.
+        :param extra_nbytes: size of a volume about to be added.
+        """
+        with self.lock:
+            entries = self.get_entries()
+            total = sum(entry[3] for entry in entries)
+            for last_use, json_path, npy_path, size in entries:
+                if total + extra_nbytes <= self.budget:
+                    return
+                for entry_path in [json_path, npy_path]:
+                    try:
+                        os.remove(entry_path)
+                    except OSError:
+                        pass
+                total -= size
+
+
+# Creating an instance of VolumeDiskCache, shared by the widget and the
+# prefetch thread (as for ConfigCache).
+VolumeDiskCache = VolumeDiskCache()
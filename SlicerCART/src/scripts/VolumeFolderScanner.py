@@ -0,0 +1,163 @@
+from utils import *
+
+VOLUME_FOLDER_MANIFEST_FILENAME = 'volume_folder_manifest.json'
+VOLUME_FOLDER_MANIFEST_VERSION = 1
+
+class VolumeFolderScanner():
+    """
+    This class finds the volumes of the volumes folder matching the input file
+    extension. The listing of each directory is kept with its modification
+    time in a manifest (in the _conf folder of the output folder), so a scan
+    only lists again the directories that changed since the previous one.
+    Directories are listed concurrently (network file systems are mostly
+    waiting on round-trips) and excluded folders are pruned during the walk.
+
+    One scan result is shared by the case list and WorkFiles.
+    """
+
+    def __init__(self, volumes_folder, pattern):
+        self.volumes_folder = volumes_folder
+        self.pattern = pattern
+        # Relative directory path: {'mtime', 'files', 'subdirs'}
+        self.directories = {}
+        self.cases_paths = None
+        # Output folder where the manifest of the last scan has been saved.
+        self.saved_in_folder = None
+        self.stop_requested = False
+
+    def get_manifest_path(self, outputFolder):
+        return os.path.join(outputFolder, CONF_FOLDER_NAME,
+                            VOLUME_FOLDER_MANIFEST_FILENAME)
+
+    @enter_function
+    def load_manifest(self, outputFolder):
+        """
+        Load the directories listed at a previous scan. The manifest is
+        ignored if it was built for another volumes folder or extension.
+        """
+        manifest_path = self.get_manifest_path(outputFolder)
+        if not os.path.exists(manifest_path):
+            return
+        try:
+            with open(manifest_path, 'r') as file:
+                manifest = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f'Ignoring volume folder manifest {manifest_path}: {e}')
+            return
+
+        if (manifest.get('version') == VOLUME_FOLDER_MANIFEST_VERSION
+                and manifest.get('volumes_folder') == self.volumes_folder
+                and manifest.get('pattern') == self.pattern):
+            self.directories = manifest['directories']
+
+    @enter_function
+    def save_manifest(self, outputFolder):
+        if self.saved_in_folder == outputFolder:
+            return
+        manifest_path = self.get_manifest_path(outputFolder)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        manifest = {'version': VOLUME_FOLDER_MANIFEST_VERSION,
+                    'volumes_folder': self.volumes_folder,
+                    'pattern': self.pattern,
+                    'directories': self.directories}
+        temp_path = f'{manifest_path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(manifest, file)
+        os.replace(temp_path, manifest_path)
+        self.saved_in_folder = outputFolder
+
+    @enter_function
+    def scan(self, max_workers=8, excluded_folder_names=(),
+             on_paths_found=None):
+        """
+        Find all volumes matching the pattern in the volumes folder
+        (recursively, hidden files and folders excluded as glob does).
+        Can be called from a background thread.
+        :param max_workers: number of directories listed at the same time.
+        :param excluded_folder_names: names of folders not walked into (e.g.
+        derivatives).
+        :param on_paths_found: function called (from the scanning thread)
+        with the list of volume paths found in each directory, as soon as the
+        directory is listed.
+        :return: sorted list of volume paths (None if the scan is stopped).
+        """
+        directories = {}
+        cases_paths = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.list_directory, ''): ''}
+            while futures:
+                if self.stop_requested:
+                    for future in futures:
+                        future.cancel()
+                    return None
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relative_path = futures.pop(future)
+                    listing = future.result()
+                    if listing is None:
+                        continue
+                    directories[relative_path] = listing
+
+                    folder = os.path.join(self.volumes_folder, relative_path)
+                    paths = [os.path.join(folder, filename)
+                             for filename in listing['files']]
+                    if paths:
+                        cases_paths += paths
+                        if on_paths_found is not None:
+                            on_paths_found(paths)
+
+                    for subdir in listing['subdirs']:
+                        if subdir in excluded_folder_names:
+                            continue
+                        subdir_path = os.path.join(relative_path, subdir)
+                        futures[executor.submit(
+                            self.list_directory, subdir_path)] = subdir_path
+
+        self.directories = directories
+        self.cases_paths = sorted(cases_paths)
+        self.saved_in_folder = None
+        return self.cases_paths
+
+    def stop(self):
+        """
+        Stop a scan running in another thread.
+        """
+        self.stop_requested = True
+
+    def list_directory(self, relative_path):
+        """
+        Get the matching files and the subdirectories of a directory, from the
+        manifest if the directory has not been modified since.
+        :return: dictionary with 'mtime', 'files' and 'subdirs', or None if
+        the directory cannot be read.
+        """
+        folder = os.path.join(self.volumes_folder, relative_path)
+        try:
+            mtime = os.stat(folder).st_mtime
+        except OSError:
+            return None
+
+        listing = self.directories.get(relative_path)
+        if listing is not None and listing['mtime'] == mtime:
+            return listing
+
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                    elif fnmatch.fnmatch(entry.name, self.pattern):
+                        files.append(entry.name)
+        except OSError as e:
+            print(f'Cannot list {folder}: {e}')
+            return None
+
+        if time.time() - mtime < UNSTABLE_MTIME_DELAY:
+            mtime = None
+        return {'mtime': mtime, 'files': sorted(files),
+                'subdirs': sorted(subdirs)}
@@ -0,0 +1,242 @@
+from utils import *
+from scripts.VolumeLoader import *
+
+VOLUME_HEADER_INDEX_FILENAME = 'volume_header_index.json'
+VOLUME_HEADER_INDEX_VERSION = 1
+
+class VolumeHeaderIndex():
+    """
+    This class keeps the header information of the volumes of the case list
+    (dimensions, spacing, data type, size in memory, file size and
+    modality), read from the NIfTI/NRRD headers only (the voxels are not
+    read or decompressed). Headers are read concurrently in a background
+    thread and the index is kept in the _conf folder of the output folder, so
+    only new or modified volumes are read at the next session.
+
+    The index is used to sort and filter the case list by size or modality,
+    and to know the memory needed by a case before reading it (prefetch).
+    """
+
+    def __init__(self):
+        # Volume path: header dictionary (see read_header).
+        self.headers = {}
+        self.lock = RLock()
+        # Output folder the index has been loaded from (and saved in).
+        self.loaded_from_folder = None
+        self.stop_requested = False
+
+    def get_index_path(self, outputFolder):
+        return os.path.join(outputFolder, CONF_FOLDER_NAME,
+                            VOLUME_HEADER_INDEX_FILENAME)
+
+    @enter_function
+    def load(self, outputFolder):
+        """
+        Load the headers indexed at a previous session (headers already read
+        in this session are kept).
+        """
+        if self.loaded_from_folder == outputFolder:
+            return
+        self.loaded_from_folder = outputFolder
+
+        index_path = self.get_index_path(outputFolder)
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path, 'r') as file:
+                index = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f'Ignoring volume header index {index_path}: {e}')
+            return
+
+        if index.get('version') != VOLUME_HEADER_INDEX_VERSION:
+            return
+        with self.lock:
+            for path, header in index['headers'].items():
+                self.headers.setdefault(path, header)
+
+    @enter_function
+    def save(self, outputFolder):
+        index_path = self.get_index_path(outputFolder)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with self.lock:
+            index = {'version': VOLUME_HEADER_INDEX_VERSION,
+                     'headers': dict(self.headers)}
+        temp_path = f'{index_path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(index, file)
+        os.replace(temp_path, index_path)
+
+    @enter_function
+    def index(self, paths, max_workers=8, on_headers_read=None):
+        """
+        Read the headers of the volumes that are not indexed yet or have
+        changed since indexed. Can be called from a background thread.
+        :param paths: volume paths.
+        :param max_workers: number of headers read at the same time.
+        :param on_headers_read: function called (from the indexing thread)
+        with the list of paths whose header has been read, by batches.
+        :return: False if the indexing is stopped, True otherwise.
+        """
+        self.stop_requested = False
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.update_header, path): path
+                       for path in paths}
+            while futures:
+                if self.stop_requested:
+                    for future in futures:
+                        future.cancel()
+                    return False
+
+                done, _ = wait(futures, timeout=0.5,
+                               return_when=FIRST_COMPLETED)
+                updated_paths = []
+                for future in done:
+                    path = futures.pop(future)
+                    if future.result():
+                        updated_paths.append(path)
+                if updated_paths and on_headers_read is not None:
+                    on_headers_read(updated_paths)
+        return True
+
+    def stop(self):
+        """
+        Stop an indexing running in another thread.
+        """
+        self.stop_requested = True
+
+    def update_header(self, path):
+        """
+        Read the header of a volume if it is not indexed or if the file has
+        changed since indexed.
+        :return: True if the header has been read.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+
+        with self.lock:
+            header = self.headers.get(path)
+        if (header is not None and header['size'] == stat.st_size
+                and header['mtime_ns'] == stat.st_mtime_ns):
+            return False
+
+        try:
+            header = self.read_header(path)
+        except Exception as e:
+            print(f'Cannot read the header of {path}: {e}')
+            header = {}
+        header['size'] = stat.st_size
+        header['mtime_ns'] = stat.st_mtime_ns
+        header['modality'] = self.get_modality(path)
+
+        with self.lock:
+            self.headers[path] = header
+        return True
+
+    def read_header(self, path):
+        """
+        Read the header of a .nii, .nii.gz or .nrrd volume.
+        :return: dictionary with 'shape' (i, j, k...), 'spacing', 'dtype',
+        'nbytes' (size of the voxels in memory, as read by
+        VolumeLoader.read_volume) and 'compressed'; empty for other formats.
+        """
+        if path.endswith('.nii') or path.endswith('.nii.gz'):
+            # nibabel only reads the header here (voxels are read on
+            # access).
+            header = nib.load(path).header
+            shape = [int(size) for size in header.get_data_shape()]
+            spacing = [float(zoom) for zoom in header.get_zooms()]
+            dtype = header.get_data_dtype()
+            slope, inter = header.get_slope_inter()
+            if slope not in [None, 1.0] or inter not in [None, 0.0]:
+                # Scaled voxels are read as floats.
+                dtype = np.dtype(np.float64)
+            compressed = path.endswith('.gz')
+
+        elif path.endswith('.nrrd'):
+            header = nrrd.read_header(path)
+            shape = [int(size) for size in header['sizes']]
+            if 'space directions' in header:
+                directions = np.array(header['space directions'],
+                                      dtype=np.float64)
+                spacing = [float(norm) for norm in
+                           np.linalg.norm(directions, axis=1)]
+            else:
+                spacing = [float(size) for size in
+                           header.get('spacings', [1.0] * len(shape))]
+            dtype = np.dtype(NRRD_NUMPY_TYPES[header['type']])
+            compressed = (header.get('encoding')
+                          in NRRD_COMPRESSED_ENCODINGS)
+
+        else:
+            return {}
+
+        return {'shape': shape,
+                'spacing': spacing,
+                'dtype': dtype.name,
+                'nbytes': int(np.prod(shape)) * dtype.itemsize,
+                'compressed': compressed}
+
+    def get_modality(self, path):
+        """
+        :return: modality of a volume from its filename, i.e. the BIDS
+        suffix (e.g. 'T1w' for sub-01_T1w.nii.gz); '' if there is none.
+        """
+        name = os.path.split(path)[-1].split('.')[0]
+        if '_' not in name:
+            return ''
+        suffix = name.split('_')[-1]
+        # Key-value entities (e.g. run-1) are not suffixes.
+        return '' if '-' in suffix else suffix
+
+    def get(self, path):
+        """
+        :return: header dictionary of a volume (see read_header), or None if
+        the volume is not indexed yet.
+        """
+        with self.lock:
+            return self.headers.get(path)
+
+    def get_nbytes(self, path):
+        """
+        :return: size of the voxels of a volume in memory, or None if not
+        known.
+        """
+        header = self.get(path)
+        if header is None:
+            return None
+        return header.get('nbytes')
+
+    def get_modalities(self, paths):
+        """
+        :return: sorted list of the modalities of the given volumes.
+        """
+        with self.lock:
+            modalities = {self.headers[path]['modality'] for path in paths
+                          if path in self.headers}
+        return sorted(modality for modality in modalities if modality)
+
+    def describe(self, path):
+        """
+        :return: one line description of the header of a volume (tooltip of
+        the case list), '' if not known.
+        """
+        header = self.get(path)
+        if not header:
+            return ''
+
+        description = []
+        if 'shape' in header:
+            description.append(' x '.join(str(size)
+                                          for size in header['shape']))
+            description.append(' x '.join(f'{spacing:g}' for spacing
+                                          in header['spacing'][:3]) + ' mm')
+            description.append(header['dtype'])
+            description.append(
+                f'{header["nbytes"] / 1024 / 1024:.1f} MB in memory')
+        description.append(f'{header["size"] / 1024 / 1024:.1f} MB on disk')
+        if header['modality']:
+            description.append(header['modality'])
+        return ', '.join(description)
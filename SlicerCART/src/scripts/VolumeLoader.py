@@ -0,0 +1,298 @@
+from utils import *
+from scripts.VolumeDiskCache import *
+
+# Encodings of compressed nrrd files.
+NRRD_COMPRESSED_ENCODINGS = ['gzip', 'gz', 'bzip2', 'bz2']
+
+# Numpy types of the nrrd types (for memory mapping).
+NRRD_NUMPY_TYPES = {
+    'signed char': 'i1', 'int8': 'i1', 'int8_t': 'i1',
+    'uchar': 'u1', 'unsigned char': 'u1', 'uint8': 'u1', 'uint8_t': 'u1',
+    'short': 'i2', 'short int': 'i2', 'signed short': 'i2',
+    'signed short int': 'i2', 'int16': 'i2', 'int16_t': 'i2',
+    'ushort': 'u2', 'unsigned short': 'u2', 'unsigned short int': 'u2',
+    'uint16': 'u2', 'uint16_t': 'u2',
+    'int': 'i4', 'signed int': 'i4', 'int32': 'i4', 'int32_t': 'i4',
+    'uint': 'u4', 'unsigned int': 'u4', 'uint32': 'u4', 'uint32_t': 'u4',
+    'longlong': 'i8', 'long long': 'i8', 'long long int': 'i8',
+    'signed long long': 'i8', 'signed long long int': 'i8', 'int64': 'i8',
+    'int64_t': 'i8',
+    'ulonglong': 'u8', 'unsigned long long': 'u8',
+    'unsigned long long int': 'u8', 'uint64': 'u8', 'uint64_t': 'u8',
+    'float': 'f4', 'double': 'f8'}
+
+class VolumeLoader():
+    """
+    This class reads volumes (voxels and geometry) outside of the MRML scene
+    so the reading can be done in a background thread, then builds volume
+    nodes from the data that has been read.
+
+    Usage: VolumeLoader.function_name(self, *args, **kwargs)
+    """
+
+    def __init__(self):
+        pass
+
+    def read_volume(self, path, memory_map=False):
+        """
+        Read a volume file and return its voxels and geometry.
+        Can be called from any thread (no MRML scene access).
+        :param path: path of a .nii, .nii.gz or .nrrd volume.
+        :param memory_map: if True, the voxels of uncompressed files (and of
+        the volume disk cache) are memory mapped: they are read from disk
+        when used instead of being read here. Copy on write mapping, so the
+        files are never modified.
+        :return: dictionary with 'path', 'array' (numpy array in KJI order,
+        as used by slicer.util), 'ijk_to_ras' (4x4 numpy matrix) and
+        'nbytes'; None if the file cannot be represented as a scalar volume
+        (then the volume should be loaded from disk by Slicer).
+        Compressed volumes are read from the volume disk cache if possible,
+        and added to it otherwise.
+        """
+        volume = VolumeDiskCache.load(path, memory_map=memory_map)
+        if volume is not None:
+            return volume
+
+        # Taken before reading: a file replaced meanwhile is not cached
+        # under the size and modification time of its new content.
+        stat = os.stat(path)
+
+        is_compressed = False
+        if path.endswith('.nii') or path.endswith('.nii.gz'):
+            is_compressed = path.endswith('.gz')
+            image = nib.load(path, mmap='c' if memory_map else False)
+            # nibabel gives (i, j, k) Fortran ordered arrays: the transpose
+            # is already C contiguous in KJI order, so no copy happens here
+            # (nor with memory mapping, unless the voxels are scaled).
+            array = np.asanyarray(image.dataobj).transpose()
+            ijk_to_ras = np.array(image.affine, dtype=np.float64)
+
+        elif path.endswith('.nrrd'):
+            array, header = None, None
+            if memory_map:
+                array, header = VolumeLoader.map_nrrd(self, path)
+            if array is None:
+                array, header = nrrd.read(path, index_order='C')
+            is_compressed = (header.get('encoding')
+                             in NRRD_COMPRESSED_ENCODINGS)
+            ijk_to_ras = VolumeLoader.get_nrrd_ijk_to_ras(self, header)
+            if ijk_to_ras is None:
+                return None
+
+        else:
+            return None
+
+        if array.ndim != 3:
+            # Vector or time series volumes are left to Slicer readers.
+            return None
+
+        # Single copy if the voxels cannot be used as they are (e.g. other
+        # byte order): VTK image data use them without copy.
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('='))
+
+        if is_compressed:
+            VolumeDiskCache.store(path, stat, array, ijk_to_ras)
+
+        return {'path': path,
+                'array': array,
+                'ijk_to_ras': ijk_to_ras,
+                'nbytes': array.nbytes,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime}
+
+    def map_nrrd(self, path):
+        """
+        Memory map the voxels of a nrrd file with raw encoding (copy on
+        write).
+        :return: numpy array in KJI order and header, or None and the header
+        if the voxels cannot be mapped (compressed, detached data, ...).
+        """
+        with open(path, 'rb') as file:
+            header = nrrd.read_header(file)
+            # Same as pynrrd: the data follows the header.
+            offset = file.tell()
+
+        dtype = NRRD_NUMPY_TYPES.get(header.get('type'))
+        if (header.get('encoding') != 'raw' or dtype is None
+                or 'data file' in header or 'datafile' in header
+                or header.get('line skip', header.get('lineskip', 0)) != 0):
+            return None, header
+
+        dtype = np.dtype(dtype)
+        if dtype.itemsize > 1:
+            dtype = dtype.newbyteorder(
+                '>' if header.get('endian') == 'big' else '<')
+        shape = tuple(int(size) for size in reversed(header['sizes']))
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+
+        byte_skip = header.get('byte skip', header.get('byteskip', 0))
+        if byte_skip == -1:
+            offset = os.path.getsize(path) - nbytes
+        else:
+            offset += byte_skip
+        if offset < 0 or offset + nbytes > os.path.getsize(path):
+            return None, header
+
+        return np.memmap(path, dtype=dtype, mode='c', offset=offset,
+                         shape=shape), header
+
+    def can_memory_map(self, path):
+        """
+        Check if the voxels of a volume file can be memory mapped
+        (uncompressed .nii or raw .nrrd file).
+        """
+        if path.endswith('.nii'):
+            return True
+        if path.endswith('.nrrd'):
+            try:
+                header = nrrd.read_header(path)
+            except Exception:
+                return False
+            return header.get('encoding') == 'raw'
+        return False
+
+    def is_compressed(self, path):
+        """
+        Check if a volume file is compressed (decompressing it again is
+        slower than reading an uncompressed copy).
+        """
+        if path.endswith('.gz'):
+            return True
+        if path.endswith('.nrrd'):
+            try:
+                header = nrrd.read_header(path)
+            except Exception:
+                return False
+            return header.get('encoding') in NRRD_COMPRESSED_ENCODINGS
+        return False
+
+    def get_nrrd_ijk_to_ras(self, header):
+        """
+        Compute the IJK to RAS matrix from a nrrd header.
+        :param header: header dictionary returned by pynrrd.
+        :return: 4x4 numpy matrix, or None if the geometry is not defined.
+        """
+        if ('space directions' not in header
+                or 'space origin' not in header):
+            return None
+
+        directions = np.array(header['space directions'], dtype=np.float64)
+        origin = np.array(header['space origin'], dtype=np.float64)
+        if directions.shape != (3, 3) or np.isnan(directions).any():
+            return None
+
+        ijk_to_ras = np.eye(4)
+        # Each row of space directions is the direction of one index axis.
+        ijk_to_ras[:3, :3] = directions.T
+        ijk_to_ras[:3, 3] = origin
+
+        space = header.get('space', 'left-posterior-superior')
+        if space in ['left-posterior-superior', 'LPS']:
+            ijk_to_ras[0, :] *= -1
+            ijk_to_ras[1, :] *= -1
+        elif space not in ['right-anterior-superior', 'RAS']:
+            return None
+
+        return ijk_to_ras
+
+    def get_volume_node_name(self, path):
+        """
+        Name given to a volume node, same as slicer.util.loadVolume does.
+        """
+        return os.path.split(path)[1].split('.')[0]
+
+    def create_image_data(self, array):
+        """
+        Create VTK image data using the voxels of a numpy array without copy
+        (the image data keeps a reference to the array). Arrays that VTK
+        cannot use as they are (e.g. not C contiguous) are copied once.
+        :param array: numpy array in KJI order.
+        :return: vtkImageData.
+        """
+        from vtk.util.numpy_support import numpy_to_vtk
+
+        array = np.ascontiguousarray(array)
+        image_data = vtk.vtkImageData()
+        image_data.SetDimensions(array.shape[::-1])
+        image_data.GetPointData().SetScalars(
+            numpy_to_vtk(array.reshape(-1), deep=False))
+        return image_data
+
+    @enter_function
+    def create_volume_node(self, volume):
+        """
+        Create a scalar volume node in the MRML scene from a volume returned
+        by read_volume, using its voxels without copy. Must be called from
+        the main thread.
+        :param volume: dictionary returned by VolumeLoader.read_volume.
+        :return: the created vtkMRMLScalarVolumeNode.
+        """
+        name = VolumeLoader.get_volume_node_name(self, volume['path'])
+        volume_node = slicer.mrmlScene.AddNewNodeByClass(
+            'vtkMRMLScalarVolumeNode', name)
+        volume_node.SetIJKToRASMatrix(
+            slicer.util.vtkMatrixFromArray(volume['ijk_to_ras']))
+        volume_node.SetAndObserveImageData(
+            VolumeLoader.create_image_data(self, volume['array']))
+        volume_node.CreateDefaultDisplayNodes()
+        # Same as slicer.util.loadVolume: show the volume in the slice views.
+        slicer.util.setSliceViewerLayers(background=volume_node, fit=True)
+        return volume_node
+
+    @enter_function
+    def update_volume_node(self, volume_node, volume):
+        """
+        Replace in place the voxels and geometry of an existing volume node
+        by a volume returned by read_volume (scene recycling mode), using its
+        voxels without copy. Must be called from the main thread.
+        :param volume_node: vtkMRMLScalarVolumeNode to update.
+        :param volume: dictionary returned by VolumeLoader.read_volume.
+        """
+        was_modifying = volume_node.StartModify()
+        VolumeLoader.prepare_display_for_new_data(self, volume_node)
+        volume_node.SetIJKToRASMatrix(
+            slicer.util.vtkMatrixFromArray(volume['ijk_to_ras']))
+        volume_node.SetAndObserveImageData(
+            VolumeLoader.create_image_data(self, volume['array']))
+        volume_node.SetName(
+            VolumeLoader.get_volume_node_name(self, volume['path']))
+        VolumeLoader.set_storage_file_name(self, volume_node, volume['path'])
+        volume_node.EndModify(was_modifying)
+
+    @enter_function
+    def copy_volume_node(self, source_node, target_node, path):
+        """
+        Replace in place the voxels and geometry of target_node by the ones
+        of source_node (scene recycling mode, when the volume has been loaded
+        by Slicer readers).
+        :param source_node: volume node just loaded.
+        :param target_node: persistent volume node to update.
+        :param path: path of the volume file loaded in source_node.
+        """
+        ijk_to_ras = vtk.vtkMatrix4x4()
+        source_node.GetIJKToRASMatrix(ijk_to_ras)
+
+        was_modifying = target_node.StartModify()
+        VolumeLoader.prepare_display_for_new_data(self, target_node)
+        target_node.SetIJKToRASMatrix(ijk_to_ras)
+        target_node.SetAndObserveImageData(source_node.GetImageData())
+        target_node.SetName(source_node.GetName())
+        VolumeLoader.set_storage_file_name(self, target_node, path)
+        target_node.EndModify(was_modifying)
+
+    def prepare_display_for_new_data(self, volume_node):
+        """
+        Let the display node compute the window/level of the new voxels, as
+        it is done when a volume is loaded.
+        """
+        display_node = volume_node.GetDisplayNode()
+        if display_node is not None:
+            display_node.AutoWindowLevelOn()
+
+    def set_storage_file_name(self, volume_node, path):
+        """
+        Keep the storage node (if any) pointing to the displayed file.
+        """
+        storage_node = volume_node.GetStorageNode()
+        if storage_node is not None:
+            storage_node.SetFileName(path)
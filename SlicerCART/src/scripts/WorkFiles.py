@@ -1,13 +1,23 @@
 from utils import *
 
+REMAINING_LIST_JOURNAL_FILENAME = 'remaining_list_journal.jsonl'
+# Number of cases completed before the remaining list file is rewritten.
+REMAINING_LIST_JOURNAL_MAX_EVENTS = 100
+
 class WorkFiles():
     """
     This class is intended to manipulate different cases list in order to
     continue/facilitate the workflow from, for example when continuing from
     previous work sessions.
+
+    Working and remaining lists are kept in memory with filename to
+    position(s) dictionaries. Completed cases are appended to a journal (in the _conf
+    folder) instead of rewriting the remaining list file at each save; the
+    journal is merged in the remaining list file when the output folder is
+    opened and every REMAINING_LIST_JOURNAL_MAX_EVENTS completed cases.
     """
 
-    def __init__(self, currentFolder, outputFolder):
+    def __init__(self, currentFolder, outputFolder, cases_paths=None):
         self.CurrentFolder = currentFolder
         self.outputFolder = outputFolder
         self.working_list_filepath = os.path.join(self.outputFolder,
@@ -15,15 +25,50 @@ class WorkFiles():
         self.remaining_list_filepath = os.path.join(self.outputFolder,
                                                ConfigPath.REMAINING_LIST_FILENAME)
 
+        self.remaining_list_journal_filepath = os.path.join(
+            self.outputFolder, CONF_FOLDER_NAME,
+            REMAINING_LIST_JOURNAL_FILENAME)
+
+        # Loaded from the list files when first needed.
+        self.working_list_filenames = None
+        self.working_list_indexes = None
+        self.remaining_list_filenames = None
+        self.remaining_list_positions = None
+        # Positions in remaining_list_filenames of the cases completed since
+        # the list was loaded (removed lazily). Positions are used rather
+        # than filenames since a filename appears several times in the list
+        # when several volumes have this filename.
+        self.completed_positions = set()
+        self.journal_events_count = 0
+
+        # Completed cases of the previous session are merged in the
+        # remaining list file before it is checked.
+        WorkFiles.compact_remaining_list_journal(self)
+
         self.output_folder_files = os.listdir(self.outputFolder)
 
-        self.all_cases_path = WorkFiles.get_working_list(self)
+        if cases_paths is None:
+            self.all_cases_path = WorkFiles.get_working_list(self)
+        else:
+            # Result of the scan of the volumes folder already done by the
+            # widget (see VolumeFolderScanner).
+            self.all_cases_path = list(cases_paths)
         self.all_cases_path = WorkFiles.filter_working_list(self,
                                                             self.all_cases_path)
 
         self.all_cases_filenames = (
             self.get_filenames_in_working_list(self.all_cases_path))
 
+        # Filename: sorted list of the paths having this filename (more than
+        # one path if several volumes have the same filename).
+        self.paths_by_filename = {}
+        for path in sorted(self.all_cases_path):
+            self.paths_by_filename.setdefault(os.path.split(path)[-1],
+                                              []).append(path)
+        self.duplicate_filenames = {
+            filename: paths for filename, paths in
+            self.paths_by_filename.items() if len(paths) > 1}
+
     @enter_function
     def check_working_list(self):
         """
@@ -138,7 +183,11 @@ class WorkFiles():
         # ToDo: see issue 118
         filtered_list = []
         for element in working_list:
-            if 'derivatives' in element:
+            # Volumes in excluded folders (e.g. derivatives) are not cases.
+            folders = os.path.relpath(os.path.dirname(element),
+                                      self.CurrentFolder).split(os.sep)
+            if any(folder in ConfigPath.EXCLUDED_FOLDER_NAMES
+                   for folder in folders):
                 continue
             else:
                 filtered_list.append(element)
@@ -188,10 +237,12 @@ class WorkFiles():
 
         else:
             # Find differing elements
+            working_list_set = set(working_list_filenames)
+            all_cases_set = set(all_cases_filenames)
             missing_in_elements = [f for f in all_cases_filenames if
-                                   f not in working_list_filenames]
+                                   f not in working_list_set]
             missing_in_all_cases = [f for f in working_list_filenames if
-                                    f not in all_cases_filenames]
+                                    f not in all_cases_set]
 
             def print_message(elements):
                 """
@@ -319,8 +370,110 @@ class WorkFiles():
         all_cases_data = {
             'CASES': filenames
         }
-        with open(filepath, 'w') as file:
+        temp_filepath = f'{filepath}.tmp'
+        with open(temp_filepath, 'w') as file:
             yaml.dump(all_cases_data, file)
+        os.replace(temp_filepath, filepath)
+
+        # Keep the lists in memory consistent with the files.
+        if filepath == self.working_list_filepath:
+            WorkFiles.set_working_list(self, filenames)
+        elif filepath == self.remaining_list_filepath:
+            WorkFiles.set_remaining_list(self, filenames)
+            WorkFiles.start_remaining_list_journal(self)
+
+    def set_working_list(self, filenames):
+        filenames = list(filenames or [])
+        self.working_list_filenames = filenames
+        self.working_list_indexes = {}
+        for index, filename in enumerate(filenames):
+            self.working_list_indexes.setdefault(filename, index)
+
+    def set_remaining_list(self, filenames):
+        filenames = list(filenames or [])
+        self.remaining_list_filenames = filenames
+        # Filename: positions of the filename in the list.
+        self.remaining_list_positions = {}
+        for index, filename in enumerate(filenames):
+            self.remaining_list_positions.setdefault(filename, []).append(
+                index)
+        self.completed_positions = set()
+
+    def read_file_list(self, filepath):
+        with open(filepath, 'r') as file:
+            return yaml.safe_load(file)['CASES']
+
+    def get_remaining_list_stamp(self):
+        """
+        Identify the content of the remaining list file a journal applies
+        to (the journal is ignored if the file was modified by other means).
+        """
+        stat = os.stat(self.remaining_list_filepath)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def start_remaining_list_journal(self):
+        """
+        Start an empty journal for the current remaining list file.
+        """
+        os.makedirs(os.path.dirname(self.remaining_list_journal_filepath),
+                    exist_ok=True)
+        with open(self.remaining_list_journal_filepath, 'w') as file:
+            file.write(json.dumps(
+                {'remaining_list': WorkFiles.get_remaining_list_stamp(self)})
+                       + '\n')
+        self.journal_events_count = 0
+
+    def read_remaining_list_journal(self):
+        """
+        Get the cases completed according to the journal.
+        :return: list of filenames (empty if the journal does not apply to
+        the current remaining list file).
+        """
+        if (not os.path.exists(self.remaining_list_journal_filepath)
+                or not os.path.exists(self.remaining_list_filepath)):
+            return []
+
+        with open(self.remaining_list_journal_filepath, 'r') as file:
+            lines = file.read().splitlines()
+        if not lines:
+            return []
+
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return []
+        if (header.get('remaining_list')
+                != WorkFiles.get_remaining_list_stamp(self)):
+            Debug.print(self, 'Remaining list journal ignored: remaining '
+                              'list file modified.')
+            return []
+
+        completed = []
+        for line in lines[1:]:
+            try:
+                completed.append(json.loads(line)['completed'])
+            except (ValueError, KeyError):
+                # Last line partially written (e.g. crash).
+                continue
+        return completed
+
+    @enter_function
+    def compact_remaining_list_journal(self):
+        """
+        Write the remaining list file without the cases completed in the
+        journal, and start a new journal.
+        """
+        if not os.path.exists(self.remaining_list_filepath):
+            return
+
+        WorkFiles.load_remaining_list(self)
+        if self.completed_positions:
+            # Also starts a new journal.
+            WorkFiles.write_file_list(
+                self, self.remaining_list_filepath,
+                WorkFiles.get_remaining_list_filenames(self))
+        else:
+            WorkFiles.start_remaining_list_journal(self)
 
     @enter_function
     def check_working_list_in_volumes(self, all_cases_filenames):
@@ -350,47 +503,129 @@ class WorkFiles():
 
         Debug.print(self, 'Old versions created.')
 
+    def load_working_list(self):
+        if self.working_list_filenames is None:
+            WorkFiles.set_working_list(self, WorkFiles.read_file_list(
+                self, self.working_list_filepath))
+
+    def load_remaining_list(self):
+        if self.remaining_list_filenames is None:
+            WorkFiles.set_remaining_list(self, WorkFiles.read_file_list(
+                self, self.remaining_list_filepath))
+            # Cases completed since the file was written (each journal
+            # entry completes one occurrence of the filename).
+            for filename in WorkFiles.read_remaining_list_journal(self):
+                position = WorkFiles.get_remaining_list_position(self,
+                                                                 filename)
+                if position is not None:
+                    self.completed_positions.add(position)
+
+    def get_remaining_list_position(self, filename):
+        """
+        Position in the remaining list of the first occurrence of a filename
+        not completed yet (None if there is none).
+        """
+        for position in self.remaining_list_positions.get(filename, []):
+            if position not in self.completed_positions:
+                return position
+        return None
+
     @enter_function
     def get_working_list_filenames(self):
         """
         Get all filenames from the working list.
         """
-        with open(self.working_list_filepath, 'r') as file:
-            working_list_filenames = yaml.safe_load(file)['CASES']
-            return working_list_filenames
+        WorkFiles.load_working_list(self)
+        return list(self.working_list_filenames)
 
     @enter_function
     def get_remaining_list_filenames(self):
         """
         Get all filenames from the remaining list.
         """
-        with open(self.remaining_list_filepath, 'r') as file:
-            remaining_list_filenames = yaml.safe_load(file)['CASES']
-            return remaining_list_filenames
+        WorkFiles.load_remaining_list(self)
+        return [filename for index, filename
+                in enumerate(self.remaining_list_filenames)
+                if index not in self.completed_positions]
+
+    def get_working_list_length(self):
+        WorkFiles.load_working_list(self)
+        return len(self.working_list_filenames)
+
+    def get_working_list_filename(self, index):
+        WorkFiles.load_working_list(self)
+        return self.working_list_filenames[index]
+
+    def get_working_list_index(self, filename):
+        """
+        Index of a filename in the working list (None if not in the list).
+        """
+        WorkFiles.load_working_list(self)
+        return self.working_list_indexes.get(filename)
+
+    def get_remaining_list_length(self):
+        WorkFiles.load_remaining_list(self)
+        return (len(self.remaining_list_filenames)
+                - len(self.completed_positions))
+
+    def is_in_remaining_list(self, filename):
+        WorkFiles.load_remaining_list(self)
+        return (WorkFiles.get_remaining_list_position(self, filename)
+                is not None)
+
+    def get_next_remaining_filenames(self, filename, count):
+        """
+        Get the cases following a case in the remaining list.
+        :param filename: current case (if not in the remaining list, the
+        first cases of the remaining list are returned).
+        :param count: maximum number of filenames returned.
+        """
+        WorkFiles.load_remaining_list(self)
+        position = WorkFiles.get_remaining_list_position(self, filename)
+        index = 0 if position is None else position + 1
+
+        next_filenames = []
+        while (len(next_filenames) < count
+               and index < len(self.remaining_list_filenames)):
+            if index not in self.completed_positions:
+                next_filenames.append(self.remaining_list_filenames[index])
+            index += 1
+        return next_filenames
 
     @enter_function
     def get_working_list_filepaths(self, working_list_filenames):
         """
         Get all working list filepaths.
         """
-        filenames_path = []
-        for element in working_list_filenames:
-            for path in self.all_cases_path:
-                if element in path:
-                    filenames_path.append(path)
-        return filenames_path
+        return WorkFiles.get_filepaths_from_filenames(self,
+                                                      working_list_filenames)
 
     @enter_function
     def get_remaining_list_filepaths(self, remaining_list_filenames):
         """
         Get all remaining list filepaths.
         """
-        filenames_path = []
-        for element in remaining_list_filenames:
-            for path in self.all_cases_path:
-                if element in path:
-                    filenames_path.append(path)
-        return filenames_path
+        return WorkFiles.get_filepaths_from_filenames(
+            self, remaining_list_filenames)
+
+    def get_filepaths_from_filenames(self, filenames):
+        """
+        Get the paths of a list of filenames (exact filename match). When
+        several volumes have the same filename, the nth occurrence of the
+        filename in the list gets the nth path (sorted), so each volume
+        appears once. Filenames not found in the volumes folder are skipped.
+        """
+        filepaths = []
+        occurrences = {}
+        for filename in filenames:
+            paths = self.paths_by_filename.get(filename)
+            if not paths:
+                continue
+            occurrence = occurrences.get(filename, 0)
+            occurrences[filename] = occurrence + 1
+            if occurrence < len(paths):
+                filepaths.append(paths[occurrence])
+        return filepaths
 
     @enter_function
     def check_remaining_first_element(self, remaining_list):
@@ -423,19 +658,32 @@ class WorkFiles():
     @enter_function
     def find_path_from_filename(self, filename):
         """
-        Find path from a filename.
+        Find path from a filename (the first one, sorted, if several volumes
+        have this filename).
         """
-        for filepath in self.all_cases_path:
-            if filename in filepath:
-                return filepath
+        paths = self.paths_by_filename.get(filename)
+        if paths:
+            return paths[0]
 
     @enter_function
     def adjust_remaining_list(self, filename):
         """
-        Adjust the remaining list by removing a specific filename.
-        """
-        remaining_list_filenames = WorkFiles.get_remaining_list_filenames(self)
-        remaining_list_filenames.remove(filename)
-
-        WorkFiles.write_file_list(self, self.remaining_list_filepath,
-                                  remaining_list_filenames)
+        Adjust the remaining list by removing a specific filename. The removal
+        is appended to the journal; the remaining list file is rewritten only
+        every REMAINING_LIST_JOURNAL_MAX_EVENTS removals.
+        """
+        WorkFiles.load_remaining_list(self)
+        position = WorkFiles.get_remaining_list_position(self, filename)
+        if position is None:
+            raise ValueError(f'{filename} is not in the remaining list.')
+
+        # Only one occurrence of the filename is completed.
+        self.completed_positions.add(position)
+        with open(self.remaining_list_journal_filepath, 'a') as file:
+            file.write(json.dumps({'completed': filename}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self.journal_events_count += 1
+
+        if self.journal_events_count >= REMAINING_LIST_JOURNAL_MAX_EVENTS:
+            WorkFiles.compact_remaining_list_journal(self)
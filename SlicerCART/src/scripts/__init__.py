@@ -1,11 +1,24 @@
 from .InteractingClasses import *
+from .BidsValidation import *
+from .CaseListModel import *
+from .CasePrefetcher import *
+from .CaseStatusIndex import *
 from .CompareSegmentVersionsWindow import *
 from .CustomInteractorStyle import *
+from .LatencyMetrics import *
 from .LoadClassificationWindow import *
 from .LoadSegmentationWindow import *
 from .OptionalMethods import *
+from .ParallelGzip import *
+from .SaveQueue import *
+from .SegmentationInformation import *
+from .SegmentationMasks import *
 from .ShowSegmentVersionLegendWindow import *
 from .SlicerCARTLogic import *
 from .SlicerCARTTest import *
 from .Timer import *
+from .VolumeDiskCache import *
+from .VolumeFolderScanner import *
+from .VolumeHeaderIndex import *
+from .VolumeLoader import *
 from .WorkFiles import *
\ No newline at end of file
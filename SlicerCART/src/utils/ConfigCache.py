@@ -0,0 +1,90 @@
+from utils.requirements import *
+from utils.constants import *
+from utils.debugging_helpers import *
+
+class ConfigCache():
+    """
+    This class keeps the parsed content of the configuration files, so a
+    configuration file is only parsed again when its modification time or
+    size changed.
+
+    The cached content is never given to callers: they get a copy that they
+    can modify. Functions registered with subscribe are called when the
+    content of a configuration file changes (written with dump, or modified
+    by other means and read again), instead of re-reading the file to check.
+    """
+
+    def __init__(self):
+        # Path: (stamp, content)
+        self.snapshots = {}
+        self.subscribers = []
+        self.lock = RLock()
+
+    def get_stamp(self, path):
+        """
+        :return: modification time and size of a file, or None if the file
+        has just been modified (to read again at next access).
+        """
+        stat = os.stat(path)
+        if time.time() - stat.st_mtime < UNSTABLE_MTIME_DELAY:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @enter_function
+    def load(self, path):
+        """
+        Get the content of a yaml configuration file.
+        :return: copy of the content (dictionary).
+        """
+        stamp = self.get_stamp(path)
+        with self.lock:
+            snapshot = self.snapshots.get(path)
+            if (snapshot is not None and stamp is not None
+                    and snapshot[0] == stamp):
+                return copy.deepcopy(snapshot[1])
+
+            with open(path, 'r') as file:
+                content = yaml.load(file, Loader=YAML_LOADER)
+            self.snapshots[path] = (stamp, content)
+            is_changed = snapshot is not None and snapshot[1] != content
+
+        if is_changed:
+            self.notify(path, content)
+        return copy.deepcopy(content)
+
+    @enter_function
+    def dump(self, path, content):
+        """
+        Write the content of a yaml configuration file.
+        """
+        content = copy.deepcopy(content)
+        with self.lock:
+            snapshot = self.snapshots.get(path)
+            with open(path, 'w') as file:
+                yaml.dump(content, file, Dumper=YAML_DUMPER)
+            self.snapshots[path] = (self.get_stamp(path), content)
+            is_changed = snapshot is None or snapshot[1] != content
+
+        if is_changed:
+            self.notify(path, content)
+
+    def subscribe(self, callback):
+        """
+        :param callback: function called with the path and a copy of the new
+        content of a configuration file when it changes.
+        """
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def notify(self, path, content):
+        for callback in list(self.subscribers):
+            callback(path, copy.deepcopy(content))
+
+
+# Creating an instance of ConfigCache, shared by all the modules (as for
+# ConfigPath).
+ConfigCache = ConfigCache()
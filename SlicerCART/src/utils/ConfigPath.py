@@ -1,14 +1,26 @@
 from utils.requirements import *
 from utils.constants import *
 from utils.debugging_helpers import *
-
-OUTPUT_CONFIG_PATH = 'output_path.txt' # Name of the temp file where the path
-# of the config file to use (from selected output folder). To use here only.
+from utils.development_helpers import *
+from utils.ConfigCache import *
+from utils.ProjectLock import *
 
 class ConfigPath():
     @enter_function
     def __init__(self):
         self.set_config_values(INITIAL_CONFIG_FILE)
+        # State of the session (kept in memory so that each Slicer instance
+        # has its own): is the output folder selected, path of the
+        # configuration file of the output folder, and lock of the output
+        # folder.
+        self.is_output_folder_selected = False
+        self.project_config_file_path = None
+        self.project_lock = None
+        # Content of the configuration file in use (see
+        # open_project_config_file).
+        self.config_yaml = None
+        # Config values follow the changes of the configuration file in use.
+        ConfigCache.subscribe(self.on_config_file_changed)
 
     @enter_function
     def check_existing_configuration(self):
@@ -28,33 +40,40 @@ class ConfigPath():
             self.path_to_config_copy = path_to_config_copy
             self.config_yaml.clear()
             self.config_yaml = ConfigPath.open_project_config_file()
-            ConfigPath.create_temp_file(name=OUTPUT_CONFIG_PATH,
-                                        text=self.path_to_config_copy)
+            ConfigPath.set_project_config_file_path(self.path_to_config_copy)
+
+    @enter_function
+    def get_config_file_path(self):
+        """
+        Path of the configuration file in use: the initial configuration file
+        of the module, or the one of the output folder if selected.
+        """
+        if (not self.is_output_folder_selected
+                or self.project_config_file_path is None):
+            return CONFIG_FILE_PATH
+        return self.project_config_file_path
 
     @enter_function
     def open_project_config_file(self):
         """
         Load the appropriate configuration template from module or project if
-        exists.
+        exists. The file is only parsed again if it has been modified (see
+        ConfigCache); the content returned can be modified by the caller.
         """
-
-        temp_file_exist = ConfigPath.get_temp_file()
-
-        if temp_file_exist:
-            with open(CONFIG_FILE_PATH, 'r') as file:
-                self.config_yaml = yaml.safe_load(file)
-        else:
-            temp_dir = tempfile.gettempdir()
-            temp_file_path = os.path.join(temp_dir, OUTPUT_CONFIG_PATH)
-            # Read data of the temp file
-            with open(temp_file_path, "r") as temp_file:
-                output_path = temp_file.read()
-            with open(output_path, 'r') as file:
-                self.config_yaml = {}
-                self.config_yaml = yaml.safe_load(file)
-
+        self.config_yaml = ConfigCache.load(ConfigPath.get_config_file_path())
         return self.config_yaml
 
+    def on_config_file_changed(self, path, content):
+        """
+        Called by ConfigCache when the content of a configuration file has
+        changed.
+        """
+        if path == ConfigPath.get_config_file_path():
+            # Kept if unchanged: callers modify it before write_config_file.
+            if content != self.config_yaml:
+                self.config_yaml = content
+            ConfigPath.set_config_values(content)
+
     @enter_function
     # Was in the initial code. Kept here for further usage if needed.
     def verify_empty(self):
@@ -79,69 +98,67 @@ class ConfigPath():
                 self.check_existing_configuration()
 
     @enter_function
-    def create_temp_file(self, name='output_folder_not_selected.txt',
-                         text="Output folder not yet selected.\n"):
+    def reset_output_folder_selection(self):
         """
-        Create a temporary file for 1) using as a flag to check if output
-        folder has een selected or not 2) saving the path of the config file
-        in the selected output folder if selected (so it can be used).
+        Use the initial configuration file of the module until an output
+        folder is selected (and release the lock of the previous output
+        folder if any).
         """
-
-        # Create a temporary file
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, name)
-        # Write some initial data to the file
-        with open(temp_file_path, "w") as temp_file:
-            temp_file.write(text)
+        config_file_path = ConfigPath.get_config_file_path()
+        self.is_output_folder_selected = False
+        if self.project_lock is not None:
+            self.project_lock.release()
+            self.project_lock = None
+        ConfigPath.notify_config_file_path_changed(config_file_path)
 
     @enter_function
-    def get_temp_file(self, name='output_folder_not_selected.txt'):
+    def set_output_folder_selected(self):
         """
-        Verify if a specific temp file exists or not. By default, allows to
-        detect if output folder has een selected or not.
+        Use the configuration file of the selected output folder from now,
+        and take the lock of the output folder. If another session is using
+        the output folder, the user is warned.
         """
-
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, name)
-
-        try:
-            # Write some initial data to the file
-            with open(temp_file_path, "r") as temp_file:
-                content = temp_file.read()
-        except FileNotFoundError:
-            return False
-
-        return True
+        config_file_path = ConfigPath.get_config_file_path()
+        self.is_output_folder_selected = True
+        ConfigPath.notify_config_file_path_changed(config_file_path)
+
+        if self.project_lock is not None:
+            if (self.project_lock.lock_path == os.path.join(
+                    self.outputFolder, CONF_FOLDER_NAME,
+                    PROJECT_LOCK_FILENAME)
+                    and self.project_lock.is_acquired):
+                return
+            self.project_lock.release()
+
+        self.project_lock = ProjectLock(self.outputFolder)
+        owner = self.project_lock.acquire()
+        if owner is not None:
+            Dev.show_message_box(
+                self,
+                f'The output folder {self.outputFolder} is already used by '
+                f'another session (host {owner.get("host")}, process '
+                f'{owner.get("pid")}, since {owner.get("started")}).\n\n'
+                'Segmentations saved from both sessions may conflict.',
+                box_title='ATTENTION!')
 
     @enter_function
-    def delete_temp_file(self, name='output_folder_not_selected.txt'):
+    def set_project_config_file_path(self, path):
         """
-        Delete a specific temp file if it exists.
+        Set the path of the configuration file of the output folder.
         """
+        config_file_path = ConfigPath.get_config_file_path()
+        self.project_config_file_path = path
+        ConfigPath.notify_config_file_path_changed(config_file_path)
 
-        # Get the path to the temporary file
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, name)
-
-        # Check if the file exists
-        if os.path.exists(temp_file_path):
-            # Delete the file
-            os.remove(temp_file_path)
-
-    @enter_function
-    def read_temp_file(self, name='output_folder_not_selected.txt'):
+    def notify_config_file_path_changed(self, previous_path):
         """
-        Read a specific temp file and return the contents.
+        If the configuration file in use is not previous_path anymore (e.g.
+        output folder selected), send its content to the subscribers of
+        ConfigCache, as when the content of the file changes.
         """
-
-        # Get the path to the temporary file
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, name)
-
-        # Open the file and read its contents
-        with open(temp_file_path, "r") as file:
-            content = file.read()
-            return content
+        path = ConfigPath.get_config_file_path()
+        if path != previous_path and os.path.exists(path):
+            ConfigCache.notify(path, ConfigCache.load(path))
 
     @enter_function
     def write_config_file(self):
@@ -150,15 +167,7 @@ class ConfigPath():
         in the output folder configuration file).
         """
 
-        temp_file_exist = ConfigPath.get_temp_file()
-
-        if temp_file_exist:
-            with open(CONFIG_FILE_PATH, 'w') as file:
-                yaml.safe_dump(self.config_yaml, file)
-        else:
-            output_path = ConfigPath.read_temp_file(name=OUTPUT_CONFIG_PATH)
-            with open(output_path, 'w') as file:
-                yaml.safe_dump(self.config_yaml, file)
+        ConfigCache.dump(ConfigPath.get_config_file_path(), self.config_yaml)
 
         # Ensure to get the latest config values
         ConfigPath.set_config_values(self.config_yaml)
@@ -166,7 +175,7 @@ class ConfigPath():
     @enter_function
     def write_correct_path(self):
         """
-        Ensure the temp file has the appropriate config file path,
+        Ensure the appropriate config file path is used,
         """
 
         path_to_saved_config_files = \
@@ -174,8 +183,7 @@ class ConfigPath():
         path_to_config_copy = \
             f'{path_to_saved_config_files}{os.sep}{CONFIG_COPY_FILENAME}'
 
-        ConfigPath.create_temp_file(name=OUTPUT_CONFIG_PATH,
-                                    text=path_to_config_copy)
+        ConfigPath.set_project_config_file_path(path_to_config_copy)
 
     @enter_function
     def set_config_values(self, config):
@@ -210,6 +218,10 @@ class ConfigPath():
         self.INTERPOLATE_VALUE = config["interpolate_value"]
         self.REQUIRE_EMPTY = config["require_empty"]
         self.ENABLE_DEBUG = config["enable_debug"]
+        self.ENABLE_TRACING = config.get("enable_tracing", False)
+        # Tracing is read from the initial configuration file at import:
+        # apply the value of the configuration loaded (e.g. of the project).
+        Debug.enable_tracing(self, self.ENABLE_TRACING)
 
         self.WORKING_LIST_FILENAME = config["working_list_filename"]
         self.REMAINING_LIST_FILENAME = config["remaining_list_filename"]
@@ -222,6 +234,46 @@ class ConfigPath():
 
         self.KEEP_WORKING_LIST = config["keep_working_list"]
 
+        # Background prefetch of the next cases. Use get since configuration
+        # files of existing projects may not define those values.
+        self.PREFETCH_NUMBER_OF_CASES = config.get(
+            "prefetch_number_of_cases", 2)
+        self.PREFETCH_MEMORY_BUDGET_MB = config.get(
+            "prefetch_memory_budget_mb", 2048)
+
+        # Uncompressed copies of the volumes opened, kept on the local disk
+        # (empty directory: default folder, budget 0: disabled).
+        self.VOLUME_CACHE_DIRECTORY = config.get("volume_cache_directory",
+                                                 "")
+        self.VOLUME_CACHE_BUDGET_MB = config.get("volume_cache_budget_mb",
+                                                 10240)
+
+        # Keep the same volume and segmentation nodes from case to case
+        # instead of clearing the scene.
+        self.IS_SCENE_RECYCLING_REQUESTED = config.get(
+            "is_scene_recycling_requested", True)
+
+        # Display the preview of a volume (from the volume disk cache) while
+        # the full resolution volume is read.
+        self.IS_PROGRESSIVE_LOADING_REQUESTED = config.get(
+            "is_progressive_loading_requested", True)
+
+        # Compression of the saved masks: zlib level (1 fastest to 9
+        # smallest) and number of threads compressing in parallel (0: all
+        # cores).
+        self.COMPRESSION_LEVEL = config.get("compression_level", 6)
+        self.COMPRESSION_THREADS = config.get("compression_threads", 0)
+
+        # Write segmentation saves in a background thread.
+        self.IS_ASYNCHRONOUS_SAVE_REQUESTED = config.get(
+            "is_asynchronous_save_requested", True)
+
+        # Folders not walked into when looking for volumes, and number of
+        # directories listed at the same time.
+        self.EXCLUDED_FOLDER_NAMES = config.get("excluded_folder_names",
+                                                ["derivatives"])
+        self.SCAN_THREADS = config.get("scan_threads", 8)
+
         if self.MODALITY == 'CT':
             # then BIDS not mandatory because it is not yet supported
             # therefore, either .nrrd or .nii.gz accepted
@@ -251,10 +303,7 @@ class ConfigPath():
         Configuration Set Up Window has been modified.
         :return: content of the initial configuration file (dictionary)
         """
-        # Read at startup the initial config file
-        with open(CONFIG_FILE_PATH, 'r') as file:
-            content = yaml.safe_load(file)
-        return content
+        return ConfigCache.load(CONFIG_FILE_PATH)
 
     @enter_function
     def extract_config_classification(self, content):
@@ -0,0 +1,118 @@
+from utils.requirements import *
+from utils.constants import *
+from utils.debugging_helpers import *
+
+PROJECT_LOCK_FILENAME = 'session.lock'
+
+# The lock file of a session is refreshed at this interval (seconds). A lock
+# file not refreshed for PROJECT_LOCK_LEASE seconds belongs to a session that
+# stopped without releasing it (e.g. Slicer crashed on another host).
+PROJECT_LOCK_REFRESH_INTERVAL = 60
+PROJECT_LOCK_LEASE = 300
+
+class ProjectLock():
+    """
+    This class marks an output folder as used by the current session with a
+    lock file in its _conf folder, so that another session selecting the same
+    output folder (e.g. a second Slicer instance on a shared annotation
+    server) knows it is in use.
+
+    The lock is a lease: while it is held, a background thread refreshes the
+    modification time of the lock file. A lock file that is not refreshed
+    anymore, or whose process has stopped on this host, is taken over.
+    """
+
+    def __init__(self, outputFolder):
+        self.lock_path = os.path.join(outputFolder, CONF_FOLDER_NAME,
+                                      PROJECT_LOCK_FILENAME)
+        self.owner = {'host': platform.node(),
+                      'pid': os.getpid(),
+                      'started': datetime.today().strftime(
+                          '%Y-%m-%d %H:%M:%S')}
+        self.is_acquired = False
+        self.stop_event = threading.Event()
+        self.refresh_thread = None
+
+    def get_owner(self):
+        """
+        :return: dictionary with the host, pid and start date of the session
+        holding the lock, or None if there is no (readable) lock file.
+        """
+        try:
+            with open(self.lock_path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def is_owned(self, owner):
+        return (owner is not None and owner.get('host') == self.owner['host']
+                and owner.get('pid') == self.owner['pid'])
+
+    def is_abandoned(self, owner):
+        """
+        Check if a lock file belongs to a session that is not running.
+        """
+        if owner is None or self.is_owned(owner):
+            return True
+
+        if owner.get('host') == self.owner['host'] and os.name == 'posix':
+            try:
+                os.kill(owner.get('pid'), 0)
+            except ProcessLookupError:
+                return True
+            except (PermissionError, TypeError):
+                pass
+
+        try:
+            return (time.time() - os.stat(self.lock_path).st_mtime
+                    > PROJECT_LOCK_LEASE)
+        except OSError:
+            return True
+
+    @enter_function
+    def acquire(self):
+        """
+        Take the lock of the output folder.
+        :return: None if the lock has been taken, otherwise the owner of the
+        lock (see get_owner).
+        """
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        try:
+            with open(self.lock_path, 'x') as file:
+                json.dump(self.owner, file)
+        except FileExistsError:
+            owner = self.get_owner()
+            if not self.is_abandoned(owner):
+                return owner
+            temp_path = f'{self.lock_path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as file:
+                json.dump(self.owner, file)
+            os.replace(temp_path, self.lock_path)
+
+        self.is_acquired = True
+        self.stop_event.clear()
+        self.refresh_thread = threading.Thread(target=self.refresh_lock,
+                                               daemon=True)
+        self.refresh_thread.start()
+        return None
+
+    def refresh_lock(self):
+        while not self.stop_event.wait(PROJECT_LOCK_REFRESH_INTERVAL):
+            if not self.is_owned(self.get_owner()):
+                # Taken over by another session.
+                self.is_acquired = False
+                return
+            try:
+                os.utime(self.lock_path)
+            except OSError as e:
+                print(f'Cannot refresh {self.lock_path}: {e}')
+
+    @enter_function
+    def release(self):
+        self.stop_event.set()
+        if self.is_acquired and self.is_owned(self.get_owner()):
+            try:
+                os.remove(self.lock_path)
+            except OSError as e:
+                print(f'Cannot remove {self.lock_path}: {e}')
+        self.is_acquired = False
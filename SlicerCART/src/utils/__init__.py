@@ -3,6 +3,9 @@ from .install_python_packages import *
 from .requirements import *
 from .debugging_helpers import *
 from .development_helpers import *
+from .ConfigCache import *
+from .ProjectLock import *
 from .ConfigPath import *
 from .UserPath import *
-from .UITheme import *
\ No newline at end of file
+from .UITheme import *
+record_startup_step('import utils')
\ No newline at end of file
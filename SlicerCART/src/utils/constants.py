@@ -12,6 +12,12 @@ CONFIG_FILENAME = "configuration_config.yml"
 CONFIG_COPY_FILENAME = CONFIG_FILENAME.split('.')[0] + '--do-not-modify.yml'
 CONF_FOLDER_NAME = '_conf'
 
+# Files and directories modified less than this number of seconds before
+# being read are read again at next access (file systems with coarse mtime
+# resolution could hide a modification done in the same second). Used by
+# ConfigCache and VolumeFolderScanner.
+UNSTABLE_MTIME_DELAY = 2
+
 TIMER_MUTEX = RLock()
 
 # From constants.py, CONFIG_FILE_PATH required the use of
@@ -23,10 +29,16 @@ print('SCRIPT_PATH from file constants.py: ', SCRIPT_PATH)
 CONFIG_FILE_PATH = os.path.join(SCRIPT_PATH, 'configuration_config.yml')
 print('CONFIG_FILE_PATH from file constants.py: ', CONFIG_FILE_PATH)
 
-# Read at startup the initial config file
+# C implementation of the yaml loader/dumper (from libyaml) if available.
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# Read at startup the initial config file (only once: also used by
+# debugging_helpers.py and ConfigPath.py).
 with open(CONFIG_FILE_PATH, 'r') as file:
-    content = yaml.safe_load(file)
+    content = yaml.load(file, Loader=YAML_LOADER)
 INITIAL_CONFIG_FILE = content
+record_startup_step('read configuration')
 
 # Configuration sections names for classification labels
 CLASSIFICATION_BOXES_LIST = ["checkboxes", "comboboxes", "freetextboxes"]
\ No newline at end of file
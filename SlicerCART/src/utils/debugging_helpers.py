@@ -1,19 +1,31 @@
 import functools
 import inspect
-import yaml
 import os
-import pandas as pd
+import json
+import threading
+import time
+from collections import deque
 
-# Import initial configuration filepath associated with SlicerCART module.
-from utils.constants import CONFIG_FILE_PATH
+# Initial configuration associated with SlicerCART module.
+from utils.constants import INITIAL_CONFIG_FILE
 # Extracts ENABLE_DEBUG value from the initial configuration file. Can be set
 # and unset as the user wants to use it in different configurations by using
 # set_debug (described below).
-with open (CONFIG_FILE_PATH, 'r') as file:
-    # This variable enables/disables easier debug mode (with print)
-    # in the python console (e.g. Debug.set_debug(self, True) or
-    # Debug.set_debug(self, False)
-    ENABLE_DEBUG = yaml.safe_load(file)['enable_debug']
+# This variable enables/disables easier debug mode (with print)
+# in the python console (e.g. Debug.set_debug(self, True) or
+# Debug.set_debug(self, False)
+ENABLE_DEBUG = INITIAL_CONFIG_FILE['enable_debug']
+# This variable enables/disables the recording of the functions
+# decorated with enter_function (e.g. Debug.set_tracing(self, True)).
+ENABLE_TRACING = INITIAL_CONFIG_FILE.get('enable_tracing', False)
+
+# Maximum number of calls kept in the trace (oldest calls are dropped).
+TRACE_BUFFER_SIZE = 100000
+# Calls recorded when tracing is enabled: (function, class, start time
+# (perf_counter), wall time, duration in seconds, nesting depth, thread id).
+TRACE_EVENTS = deque(maxlen=TRACE_BUFFER_SIZE)
+# Nesting depth of decorated calls, per thread.
+TRACE_STATE = threading.local()
 
 
 class Debug:
@@ -37,6 +49,60 @@ class Debug:
         global ENABLE_DEBUG
         ENABLE_DEBUG = enable
 
+    def set_tracing(self, enable):
+        """
+        Allows to activate or deactivate the recording of the functions
+        decorated with enter_function (see dump_trace).
+        """
+        print('set_tracing: ENABLE_TRACING =', enable)
+        Debug.enable_tracing(self, enable)
+
+    def enable_tracing(self, enable):
+        """
+        Same as set_tracing, without printing (e.g. when a configuration
+        file is loaded).
+        """
+        global ENABLE_TRACING
+        ENABLE_TRACING = enable
+
+    def get_trace_events(self):
+        """
+        Get the calls recorded since tracing is enabled, as dictionaries.
+        """
+        return [{'function': function, 'class': class_name,
+                 'wall_time': wall_time, 'duration': duration,
+                 'depth': depth, 'thread': thread}
+                for (function, class_name, start, wall_time, duration, depth,
+                     thread) in list(TRACE_EVENTS)]
+
+    def clear_trace(self):
+        TRACE_EVENTS.clear()
+
+    def dump_trace(self, filepath):
+        """
+        Write the calls recorded in the Chrome trace event format (can be
+        opened in chrome://tracing or https://ui.perfetto.dev).
+        Usage: Debug.dump_trace(self, '/tmp/slicercart_trace.json')
+        """
+        pid = os.getpid()
+        trace_events = []
+        for (function, class_name, start, wall_time, duration, depth,
+             thread) in list(TRACE_EVENTS):
+            trace_events.append({
+                'name': function,
+                'cat': class_name,
+                'ph': 'X',
+                'ts': start * 1e6,
+                'dur': duration * 1e6,
+                'pid': pid,
+                'tid': thread,
+                'args': {'depth': depth, 'wall_time': wall_time}})
+
+        with open(filepath, 'w') as file:
+            json.dump({'traceEvents': trace_events,
+                       'displayTimeUnit': 'ms'}, file)
+        print(f'Trace of {len(trace_events)} calls written in {filepath}')
+
     def print_dictionary(self, dictionary, name=None):
         """
         Prints out a dictionary with keys as keys and values as values on
@@ -66,34 +132,55 @@ class Debug:
 def enter_function(func):
     """
     Decorator that enables to print the function name in the python console
-    and the name of the class that the function is associated with.
-    """
+    and the name of the class that the function is associated with (if
+    debugging is enabled), and to record the call (if tracing is enabled).
 
-    @functools.wraps(func)
-    def wrapper(self, *args, **kwargs):
-        def print_enter_function(self_of_cls, *args, **kwargs):
-            # This function should not return the func, but rather print the
-            # message
-            if ENABLE_DEBUG:
-                print('\n *** enter_function ***:', func.__name__,
-                      '*** from class ***:', self_of_cls.__class__.__name__,
-                      '\n')
-
-        print_enter_function(self, *args, **kwargs)
-
-        # Use inspect module to get argument names in the original function
-        sig = inspect.signature(func)
-        args_list = list(sig.parameters)
-
-        # Call the original function with the provided arguments and return
-        # its result. Calling method depends on the method signature.
-        if len(args_list) == 1:
-            # Mean that the original function has only self (no other parameter)
-            result = func(self)
-        else:
-            # Mean that the original function uses arguments
-            result = func(self, *args, **kwargs)
-
-        return result
+    The signature is inspected once, when decorating: functions that have
+    only self as parameter are called without the other arguments given
+    (e.g. the checked state sent by Qt clicked signals). When debugging and
+    tracing are disabled, the original function is called directly.
+    """
+    takes_only_self = len(inspect.signature(func).parameters) == 1
+
+    if takes_only_self:
+        # Mean that the original function has only self (no other parameter)
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not (ENABLE_DEBUG or ENABLE_TRACING):
+                return func(self)
+            return call_with_debugging(func, self, (), {})
+    else:
+        # Mean that the original function uses arguments
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not (ENABLE_DEBUG or ENABLE_TRACING):
+                return func(self, *args, **kwargs)
+            return call_with_debugging(func, self, args, kwargs)
 
     return wrapper
+
+def call_with_debugging(func, self, args, kwargs):
+    """
+    Call a function decorated with enter_function when debugging or tracing
+    is enabled.
+    """
+    if ENABLE_DEBUG:
+        print('\n *** enter_function ***:', func.__name__,
+              '*** from class ***:', self.__class__.__name__,
+              '\n')
+
+    if not ENABLE_TRACING:
+        return func(self, *args, **kwargs)
+
+    depth = getattr(TRACE_STATE, 'depth', 0)
+    TRACE_STATE.depth = depth + 1
+    wall_time = time.time()
+    start = time.perf_counter()
+    try:
+        return func(self, *args, **kwargs)
+    finally:
+        duration = time.perf_counter() - start
+        TRACE_STATE.depth = depth
+        TRACE_EVENTS.append((func.__qualname__, self.__class__.__name__,
+                             start, wall_time, duration, depth,
+                             threading.get_ident()))
@@ -75,9 +75,5 @@ class Dev:
 
     @enter_function
     def check_list_in_another(self, list1, list2):
-        for element in list1:
-            if element in list2:
-                continue
-            else:
-                return False
-        return True
+        # Set lookups keep the check linear for large case lists.
+        return set(list1).issubset(list2)
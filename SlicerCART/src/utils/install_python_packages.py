@@ -1,3 +1,6 @@
+import json
+import os
+import sys
 
 # TODO: There is probably a more elegant way to install pacakages through the
 #  extension manager when the user installs the extension.
@@ -13,8 +16,49 @@ REQUIRED_PYTHON_PACKAGES = {
     "bids_validator": "bids_validator"
 }
 
+# Stamp file written when all required packages have been imported once with
+# a given Slicer and python version: the check (which imports all packages)
+# is skipped at next startups with the same versions.
+PYTHON_PACKAGES_STAMP_PATH = os.path.join(os.path.expanduser('~'),
+                                          '.hslicercart',
+                                          'python_packages_stamp.json')
+
+
+def get_python_packages_stamp():
+    import slicer
+    return {'slicer_version': getattr(getattr(slicer, 'app', None),
+                                      'applicationVersion', None),
+            'python_version': sys.version,
+            'python_executable': sys.executable,
+            'packages': sorted(REQUIRED_PYTHON_PACKAGES)}
+
+
+def is_python_packages_stamp_valid(stamp):
+    try:
+        with open(PYTHON_PACKAGES_STAMP_PATH, 'r') as file:
+            return json.load(file) == stamp
+    except (OSError, ValueError):
+        return False
+
+
+def write_python_packages_stamp(stamp):
+    try:
+        os.makedirs(os.path.dirname(PYTHON_PACKAGES_STAMP_PATH),
+                    exist_ok=True)
+        with open(PYTHON_PACKAGES_STAMP_PATH, 'w') as file:
+            json.dump(stamp, file)
+    except OSError as e:
+        print(f'Cannot write {PYTHON_PACKAGES_STAMP_PATH}: {e}')
+
 
 def check_and_install_python_packages():
+    import slicer
+    import qt
+
+    stamp = get_python_packages_stamp()
+    if is_python_packages_stamp_valid(stamp):
+        return
+
     missing_packages = []
 
     for pip_name, import_name in REQUIRED_PYTHON_PACKAGES.items():
@@ -47,3 +91,5 @@ def check_and_install_python_packages():
                                    'Missing Extensions',
                                    'The SlicerCART module cannot be loaded '
                                    'without the required extensions.')
+    else:
+        write_python_packages_stamp(stamp)
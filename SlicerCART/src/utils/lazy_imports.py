@@ -0,0 +1,24 @@
+"""
+Packages that are not needed to open the module (e.g. pandas, nibabel) are
+only imported when first used, to keep the module startup fast.
+"""
+import importlib
+
+
+class LazyModule():
+    """
+    Stand-in of a module that imports it at the first access to one of its
+    attributes (e.g. pd.read_csv). The attributes of the module are then
+    copied in the stand-in, so later accesses cost as much as with the module.
+    """
+
+    def __init__(self, name):
+        self.__dict__['lazy_module_name'] = name
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self.lazy_module_name)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        return f'<lazy module {self.lazy_module_name}>'
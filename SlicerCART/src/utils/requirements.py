@@ -1,36 +1,58 @@
 # To install a package in slicer python environment, use the following command:
 # pip install --user package_name
+from utils.startup_times import *
 import os
 import logging
+
 import slicer
 import qt
 from slicer.ScriptedLoadableModule import *
 from slicer.util import VTKObservationMixin
+import vtk
+record_startup_step('import slicer, qt and vtk')
 from glob import glob
 import re
 import time
 from pathlib import Path
+import threading
 from threading import RLock
+from collections import OrderedDict, deque
+from concurrent.futures import (ThreadPoolExecutor, as_completed, wait,
+                                FIRST_COMPLETED)
 from datetime import datetime
 import filecmp
 import shutil
 import numpy as np
-import vtk
 import random
 import colorsys
-import sys
+import functools
 from functools import partial
 import copy
+import json
+import fnmatch
+import csv
+import sqlite3
+import platform
+import math
+from contextlib import contextmanager
+import hashlib
+import io
+import struct
+import zlib
+record_startup_step('import standard library and numpy')
 
 # Check if python packages are missing due to issue with some module imports
 from utils.install_python_packages import *
 check_and_install_python_packages()
+record_startup_step('check python packages')
 
-from bids_validator import BIDSValidator
-import nibabel as nib
-import nrrd
-import pandas as pd
-import slicerio
+# Imported at first use (see utils/lazy_imports.py).
+from utils.lazy_imports import LazyModule
+bids_validator = LazyModule('bids_validator')
+nib = LazyModule('nibabel')
+nrrd = LazyModule('nrrd')
+pd = LazyModule('pandas')
+slicerio = LazyModule('slicerio')
 import yaml
 
 import tempfile
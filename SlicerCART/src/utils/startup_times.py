@@ -0,0 +1,32 @@
+"""
+Durations of the steps of the module startup (imports, package check,
+configuration, widget setup), reported in the python console and in the
+Latency metrics panel when the widget is set up.
+"""
+import time
+from collections import OrderedDict
+
+# Step name: duration (seconds), in the order of the steps.
+STARTUP_TIMES = OrderedDict()
+STARTUP_START = time.perf_counter()
+startup_step_end = STARTUP_START
+
+
+def record_startup_step(name, start=None):
+    """
+    Record the duration of a startup step.
+    :param start: time.perf_counter() value at the start of the step
+    (default: end of the previous step).
+    """
+    global startup_step_end
+    now = time.perf_counter()
+    STARTUP_TIMES[name] = now - (startup_step_end if start is None
+                                 else start)
+    startup_step_end = now
+
+
+def format_startup_times():
+    total = sum(STARTUP_TIMES.values())
+    return (f'SlicerCART startup: {total:.2f} s ('
+            + ', '.join(f'{name} {duration:.2f} s'
+                        for name, duration in STARTUP_TIMES.items()) + ')')